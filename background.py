@@ -0,0 +1,357 @@
+'''
+The TFT's background, five ways, and picking one that fits in the RAM we've got.
+
+adafruit_imageload puts the whole picture in a Bitmap in RAM: for a 24-bit BMP that's
+16 bits a pixel, 32 KB for 128x128 - a lot, on an RP2040 that's also running the USB
+host and MIDI. So:
+
+  IMAGE     the picture, in RAM, as it is - redraws the quickest, and costs the most;
+  PALETTE   a copy of it cut down to 16 colors (make it on a PC; see below) - 4 bits
+            a pixel, 8 KB, and still in RAM;
+  FLASH     the picture, streamed from the file with displayio.OnDiskBitmap - next to no
+            RAM, but every redraw reads (and converts) the pixels again;
+  GRADIENT  no file: a few bands of color, made up on the spot - a few hundred bytes;
+  SOLID     one color.
+
+choose() takes the one that uses the least heap and still redraws quickly enough: of
+the ones with the picture, there's a file for, and fit - their cost from the BMP's
+header, without loading it, leaving at least 'reserve' bytes of what gc.mem_free() says
+now - in order of heap (FLASH, PALETTE, IMAGE), the first that redraws the screen in
+REDRAW_BUDGET_MS. So IMAGE only if nothing cheaper is quick enough. If none of them is,
+the quickest that fits; if there's no picture, GRADIENT. The redraw times are
+REDRAW_MS's, or better, benchmark()'s on the device - pass them in (see redraw_times()).
+
+To make the 16-color copy, on a PC:
+
+    python background.py background.bmp [--out background16.bmp] [--colors 16]
+
+benchmark() measures each one: heap, load time, and the time for a full redraw.
+'''
+
+import gc
+import struct
+import sys
+
+try:
+    import displayio
+except ImportError:
+    # Making a palette image on a PC.
+    displayio = None
+
+
+SOLID = "solid"
+GRADIENT = "gradient"
+FLASH = "flash"
+PALETTE = "palette"
+IMAGE = "image"
+
+# For choose(): the ones with the picture, least heap first.
+AUTO_ORDER = (FLASH, PALETTE, IMAGE)
+
+# A full redraw, in ms, about, on the RP2040 at 24 MHz SPI; benchmark() measures them.
+# Streaming from flash is the slow one: reading and converting every pixel again.
+REDRAW_MS = {SOLID: 20, GRADIENT: 25, IMAGE: 30, PALETTE: 35, FLASH: 250}
+
+# What's quick enough: well inside a frame (5 a second).
+REDRAW_BUDGET_MS = 100
+
+IMAGE_PATH = "background.bmp"
+PALETTE_PATH = "background16.bmp"
+
+# Heap to leave for everything else, in bytes.
+HEAP_RESERVE = 32_000
+
+# What an OnDiskBitmap and its open file come to, and a gradient: about.
+FLASH_BYTES = 1_000
+GRADIENT_BYTES = 300
+
+# The gradient's bands; it's drawn at 8x.
+BANDS = 16
+
+
+def bitmap_bytes(width, height, value_count):
+    """What displayio.Bitmap(width, height, value_count) takes: rows of 32-bit words."""
+    bits = 1
+    while (1 << bits) < value_count:
+        bits *= 2
+    return (width * bits + 31) // 32 * 4 * height
+
+def bmp_info(path):
+    """(width, height, bits per pixel, colors in its palette) from the header, or None if it's not there."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(54)
+    except OSError:
+        return None
+    if len(header) < 54 or header[:2] != b"BM":
+        return None
+    width, height, planes, bpp, compression, size, xres, yres, colors = struct.unpack_from("<iiHHIIiiI", header, 18)
+    if bpp <= 8 and colors == 0:
+        colors = 1 << bpp
+    return width, abs(height), bpp, colors
+
+def heap_cost(strategy, image_path=IMAGE_PATH, palette_path=PALETTE_PATH):
+    """About how much heap it'll take, in bytes; None if there's no file for it."""
+    if strategy in (SOLID, GRADIENT):
+        return GRADIENT_BYTES
+    info = bmp_info(palette_path if strategy == PALETTE else image_path)
+    if info is None:
+        return None
+    if strategy == FLASH:
+        return FLASH_BYTES
+    width, height, bpp, colors = info
+    if bpp > 8:
+        # 16-bit color, through a ColorConverter.
+        return bitmap_bytes(width, height, 65536)
+    return bitmap_bytes(width, height, colors) + colors * 4
+
+def choose(free=None, reserve=HEAP_RESERVE, image_path=IMAGE_PATH, palette_path=PALETTE_PATH,
+           redraw_ms=None, budget_ms=REDRAW_BUDGET_MS):
+    """The one with the least heap, of AUTO_ORDER, that's got its file, fits in 'free' (by
+    default, gc.mem_free() now) leaving 'reserve', and redraws within budget_ms. redraw_ms
+    is {strategy: ms}, measured; anything not in it is REDRAW_MS's guess."""
+    if free is None and hasattr(gc, "mem_free"):
+        gc.collect()
+        free = gc.mem_free()
+    times = dict(REDRAW_MS)
+    if redraw_ms:
+        times.update(redraw_ms)
+
+    fits = []
+    for strategy in AUTO_ORDER:
+        cost = heap_cost(strategy, image_path, palette_path)
+        # (On a PC there's no gc.mem_free(), and no shortage.)
+        if cost is not None and (free is None or cost + reserve <= free):
+            fits.append((strategy, cost))
+    if not fits:
+        strategy = GRADIENT if free is None or GRADIENT_BYTES + reserve <= free else SOLID
+        print(f"background: {strategy}, no picture that fits")
+        return strategy
+
+    quick = [f for f in fits if times[f[0]] <= budget_ms]
+    strategy, cost = quick[0] if quick else min(fits, key=lambda f: times[f[0]])
+    print(f"background: {strategy}, about {cost} bytes, {times[strategy]} ms a redraw"
+          + ("" if free is None else f", of {free} free"))
+    return strategy
+
+def redraw_times(results):
+    """benchmark()'s results as choose()'s redraw_ms."""
+    return {r["name"][len("background_"):]: r["redraw_us"] // 1000
+            for r in results if r["name"].startswith("background_")}
+
+def make(strategy, width, height, color, image_path=IMAGE_PATH, palette_path=PALETTE_PATH):
+    """A layer to put at the bottom of the display's root group. color is for SOLID and
+    GRADIENT (the gradient goes from it down to darker)."""
+    if strategy in (IMAGE, PALETTE):
+        import adafruit_imageload
+        bitmap, palette = adafruit_imageload.load(palette_path if strategy == PALETTE else image_path,
+                                                bitmap=displayio.Bitmap,
+                                                palette=displayio.Palette)
+        return displayio.TileGrid(bitmap, pixel_shader=palette)
+    if strategy == FLASH:
+        bitmap = displayio.OnDiskBitmap(image_path)
+        return displayio.TileGrid(bitmap, pixel_shader=bitmap.pixel_shader)
+    return _bands(width, height, color, _darker(color) if strategy == GRADIENT else color)
+
+def _darker(color):
+    return (color >> 1) & 0x7F_7F_7F
+
+def _bands(width, height, top, bottom):
+    """A 1-pixel-wide column of BANDS colors, tiled across and scaled up."""
+    bitmap = displayio.Bitmap(1, BANDS, BANDS)
+    palette = displayio.Palette(BANDS)
+    for i in range(BANDS):
+        bitmap[0, i] = i
+        color = 0
+        for shift in (16, 8, 0):
+            a = (top >> shift) & 0xFF
+            b = (bottom >> shift) & 0xFF
+            color |= (a + (b - a) * i // (BANDS - 1)) << shift
+        palette[i] = color
+    scale = height // BANDS
+    tiles = displayio.TileGrid(bitmap, pixel_shader=palette, width=width // scale, height=1,
+                               tile_width=1, tile_height=BANDS)
+    group = displayio.Group(scale=scale)
+    group.append(tiles)
+    return group
+
+
+# ------------------------------------------------------------------------------
+
+def benchmark(display, strategies=(IMAGE, PALETTE, FLASH, GRADIENT, SOLID)):
+    """Each one on the display (a TFT144Display): heap it takes (measured on the device;
+    on a PC, heap_cost()'s estimate, since the simulator's Bitmaps aren't the real size),
+    time to load it, and time for the full redraw after. The redraw time is only real on
+    the device; on a PC there's no SPI."""
+    import time
+
+    mem_free = getattr(gc, "mem_free", None)
+    results = []
+    for strategy in strategies:
+        cost = heap_cost(strategy)
+        if cost is None:
+            print(f"{strategy:24} (no file)")
+            continue
+        display.set_background(SOLID)
+        display.refresh()
+        gc.collect()
+        before = mem_free() if mem_free else 0
+        start = time.monotonic_ns()
+        display.set_background(strategy)
+        loaded = time.monotonic_ns()
+        display.refresh()
+        drawn = time.monotonic_ns()
+        gc.collect()
+        heap = before - mem_free() if mem_free else cost
+        load_us = (loaded - start) // 1000
+        redraw_us = (drawn - loaded) // 1000
+        print(f"{strategy:24} {heap:10} bytes  {load_us:8} us load  {redraw_us:8} us redraw")
+        results.append({"name": "background_" + strategy, "heap_bytes": heap, "load_us": load_us, "redraw_us": redraw_us})
+    return results
+
+def test():
+    assert bitmap_bytes(128, 128, 65536) == 32768
+    assert bitmap_bytes(128, 128, 16) == 8192
+    assert bitmap_bytes(3, 1, 2) == 4
+    assert heap_cost(IMAGE, "no such file") is None
+    assert choose(100_000, image_path="no such file", palette_path="nor this") == GRADIENT
+    assert choose(1_000, image_path="no such file", palette_path="nor this") == SOLID
+
+    import os
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        image = os.path.join(directory, "image.bmp")
+        reduced = os.path.join(directory, "image16.bmp")
+        pixels = [((x * 2) & 0xFF, (y * 2) & 0xFF, (x ^ y) & 0xFF) for y in range(128) for x in range(128)]
+        write_bmp24(image, 128, 128, pixels)
+        assert bmp_info(image) == (128, 128, 24, 0)
+        reduce_colors(image, reduced, 16)
+        assert bmp_info(reduced) == (128, 128, 4, 16)
+        assert heap_cost(IMAGE, image, reduced) == 32768
+        assert heap_cost(PALETTE, image, reduced) == 8192 + 64
+        # A usual RP2040 heap, with plenty free: the 16-color copy, not the 32 KB one.
+        assert choose(120_000, image_path=image, palette_path=reduced) == PALETTE
+        # Without the copy, flash is too slow, so then it's the picture in RAM.
+        assert choose(120_000, image_path=image, palette_path="no such file") == IMAGE
+        # ... unless it's been measured quick enough; or we're short of RAM.
+        assert choose(120_000, image_path=image, palette_path=reduced, redraw_ms={FLASH: 80}) == FLASH
+        assert choose(8000 + HEAP_RESERVE, image_path=image, palette_path=reduced) == FLASH
+        # Nothing quick enough: the quickest.
+        assert choose(120_000, image_path=image, palette_path=reduced, budget_ms=10) == IMAGE
+        assert redraw_times([{"name": "background_flash", "redraw_us": 80_000}]) == {FLASH: 80}
+        width, height, reduced_pixels = read_bmp(reduced)
+        assert len(set(reduced_pixels)) <= 16 and len(reduced_pixels) == len(pixels)
+    print("background OK")
+
+# test()
+
+
+# ------------------------------------------------------------------------------
+# Making the 16-color copy: on a PC.
+
+def read_bmp(path):
+    """An uncompressed 24-bit or 4-bit BMP: (width, height, [(r, g, b), ...] top row first)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = struct.unpack_from("<I", data, 10)[0]
+    header_size, width, height, planes, bpp = struct.unpack_from("<IiiHH", data, 14)
+    palette = []
+    if bpp == 4:
+        for i in range(16):
+            b, g, r = data[14 + header_size + i * 4:14 + header_size + i * 4 + 3]
+            palette.append((r, g, b))
+    elif bpp != 24:
+        raise ValueError(f"{path}: {bpp} bits a pixel; only 24 or 4")
+    stride = (width * bpp + 31) // 32 * 4
+    rows = range(abs(height) - 1, -1, -1) if height > 0 else range(abs(height))
+    pixels = []
+    for row in rows:
+        start = offset + row * stride
+        for x in range(width):
+            if bpp == 24:
+                b, g, r = data[start + x * 3:start + x * 3 + 3]
+                pixels.append((r, g, b))
+            else:
+                pixels.append(palette[(data[start + x // 2] >> (0 if x & 1 else 4)) & 0x0F])
+    return width, abs(height), pixels
+
+def write_bmp24(path, width, height, pixels):
+    stride = (width * 3 + 3) // 4 * 4
+    body = bytearray()
+    for y in range(height - 1, -1, -1):
+        row = bytearray()
+        for r, g, b in pixels[y * width:(y + 1) * width]:
+            row += bytes((b, g, r))
+        body += row + bytes(stride - len(row))
+    _write_bmp(path, width, height, 24, b"", body)
+
+def _write_bmp(path, width, height, bpp, palette, body):
+    offset = 14 + 40 + len(palette)
+    with open(path, "wb") as f:
+        f.write(b"BM" + struct.pack("<IHHI", offset + len(body), 0, 0, offset))
+        f.write(struct.pack("<IiiHHIIiiII", 40, width, height, 1, bpp, 0, len(body), 2835, 2835, len(palette) // 4, 0))
+        f.write(palette)
+        f.write(body)
+
+def median_cut(colors, count):
+    """count colors that stand in for all of these (a list of (r, g, b)), well enough."""
+    boxes = [list(colors)]
+    while len(boxes) < count:
+        # Split the box with the widest spread in any channel, at the median.
+        best = None
+        for i, box in enumerate(boxes):
+            if len(box) < 2:
+                continue
+            for channel in range(3):
+                values = [c[channel] for c in box]
+                spread = max(values) - min(values)
+                if best is None or spread > best[0]:
+                    best = (spread, i, channel)
+        if best is None or best[0] == 0:
+            break
+        spread, i, channel = best
+        box = sorted(boxes.pop(i), key=lambda c: c[channel])
+        boxes += [box[:len(box) // 2], box[len(box) // 2:]]
+    return [tuple(sum(c[channel] for c in box) // len(box) for channel in range(3)) for box in boxes]
+
+def reduce_colors(in_path, out_path, count=16):
+    """Write a 4-bit copy of the BMP, in 'count' colors (16 at most)."""
+    width, height, pixels = read_bmp(in_path)
+    palette = median_cut(pixels, count)
+    nearest = {}
+    def index(color):
+        i = nearest.get(color)
+        if i is None:
+            i = min(range(len(palette)), key=lambda p: sum((a - b) ** 2 for a, b in zip(color, palette[p])))
+            nearest[color] = i
+        return i
+
+    stride = (width * 4 + 31) // 32 * 4
+    body = bytearray()
+    for y in range(height - 1, -1, -1):
+        row = bytearray(stride)
+        for x in range(width):
+            row[x // 2] |= index(pixels[y * width + x]) << (0 if x & 1 else 4)
+        body += row
+    entries = bytearray()
+    for r, g, b in palette + [(0, 0, 0)] * (16 - len(palette)):
+        entries += bytes((b, g, r, 0))
+    _write_bmp(out_path, width, height, 4, bytes(entries), body)
+    return len(palette)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Make a 16-color copy of the background, for the PALETTE way.")
+    parser.add_argument("bmp", nargs="?", default=IMAGE_PATH, help="a 24-bit BMP")
+    parser.add_argument("--out", default=PALETTE_PATH)
+    parser.add_argument("--colors", type=int, default=16, help="how many; 16 at most")
+    args = parser.parse_args()
+    count = reduce_colors(args.bmp, args.out, min(args.colors, 16))
+    print(f"{args.out}: {count} colors, {bitmap_bytes(*bmp_info(args.out)[:2], 16)} bytes in RAM "
+          f"(was {heap_cost(IMAGE, args.bmp)})")
+
+
+if __name__ == "__main__" and sys.implementation.name != "circuitpython":
+    main()
@@ -0,0 +1,56 @@
+'''
+Little helpers for timing things and counting heap allocations.
+
+Works on CircuitPython (uses gc.mem_free) and on desktop Python (uses tracemalloc),
+so the same benchmark code can run on the Feather or on a PC.
+'''
+
+import gc
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def time_per_call(fn, iterations):
+    """Call fn() iterations times; return average nanoseconds per call."""
+    gc.collect()
+    start = time.monotonic_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.monotonic_ns() - start) // iterations
+
+def bytes_allocated(fn, iterations):
+    """Call fn() iterations times; return total bytes allocated (roughly)."""
+    gc.collect()
+    if tracemalloc is not None:
+        # Desktop Python frees temporaries right away, so add up each call's peak instead.
+        total = 0
+        tracemalloc.start()
+        for _ in range(iterations):
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn()
+            total += tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        return total
+
+    # CircuitPython: turn off the collector so nothing gets reclaimed while we measure.
+    gc.disable()
+    try:
+        before = gc.mem_free()
+        for _ in range(iterations):
+            fn()
+        after = gc.mem_free()
+    finally:
+        gc.enable()
+    return before - after
+
+def report(name, count, elapsed_ns, allocated):
+    """Print one line of results; return them as a dict."""
+    per_sec = 0 if elapsed_ns == 0 else int(count * 1_000_000_000 / elapsed_ns)
+    per_item = allocated / count if count else 0
+    print(f"{name:24} {per_sec:10} /sec   {per_item:8.1f} bytes/item")
+    return {"name": name, "per_second": per_sec, "bytes_per_item": per_item}
@@ -0,0 +1,281 @@
+'''
+All the benchmarks, in one go, with a machine-readable report so we can see if
+something got slower between releases.
+
+What gets timed:
+  - ingest: NoteOn packets through midi_reader, and notes through PracticeTracker.on_note();
+  - matching: notes through command_matcher (and the old state machines);
+  - formatting: as_hms / HMSCounter, per update of the totals;
+  - rendering: a label update on the TFT display, with and without the refresh; and each
+    of background.py's backgrounds - heap, load time, full redraw;
+  - fonts: loading the big font, from the BDF and from the glyph atlas;
+  - persistence: a save, old settings file vs. the journal, and the NVM store;
+  - on a PC, the whole thing end to end: an hour of midibit_2 on the simulator.
+
+On a PC:
+
+    python benchmark.py [--quick] [--out bench.json] [--compare old.json]
+
+On the device, from the REPL (in RUN mode, so the journal can write):
+
+    import benchmark; benchmark.run()
+
+which prints the report as one line starting with "BENCHMARK-JSON ". Save the serial
+console to a file and this gets the report out of it, to compare or keep:
+
+    python benchmark.py --from-log capture.txt --out device.json --compare old-device.json
+'''
+
+import gc
+import sys
+
+REPORT_VERSION = 1
+LOG_PREFIX = "BENCHMARK-JSON "
+
+# Worse than this (a fraction) counts as a regression in compare().
+REGRESSION = 0.10
+
+ON_DEVICE = sys.implementation.name == "circuitpython"
+
+
+def _add(report, results, prefix=None):
+    """Put a benchmark's list of result dicts into the report, by name."""
+    for result in results:
+        result = dict(result)
+        name = result.pop("name")
+        if prefix:
+            name = prefix + "." + name
+        report["results"][name] = result
+
+def _skip(report, name, why):
+    print(f"{name}: skipped ({why})")
+    report["skipped"][name] = str(why)
+
+
+# ------------------------------------------------------------------------------
+
+def display_benchmark(updates=200):
+    """Label updates on the TFT display: set_text_1 alone, and set_text_1 plus the refresh.
+    On the device that's the real SPI transfer; on a PC it's the simulator's headless display,
+    so only the Python side of it (label layout and bookkeeping) gets timed."""
+    import time
+
+    if ON_DEVICE:
+        import board
+        import tft_144_display
+        display = tft_144_display.TFT144Display(board.D5, board.D6, board.D9)
+    else:
+        import sim
+        sim.install(None, patch_time=False)
+        for name in ("tft_144_display", "hms_format", "background", "glyph_atlas"):
+            sys.modules.pop(name, None)
+        import board
+        import tft_144_display
+        display = tft_144_display.TFT144Display(board.D5, board.D6, board.D9)
+        print()
+
+    from hms_format import HMSCounter
+
+    counter = HMSCounter(3599)
+    display.set_auto_refresh(False)
+
+    results = []
+    for name, refresh in (("label_update", False), ("label_update+refresh", True)):
+        gc.collect()
+        start = time.monotonic_ns()
+        for _ in range(updates):
+            counter.set(counter.seconds + 1)
+            display.set_text_1(counter.text())
+            if refresh:
+                display.refresh()
+        elapsed = time.monotonic_ns() - start
+        per_second = updates * 1_000_000_000 // max(1, elapsed)
+        print(f"{name:24} {per_second:10} /sec   {elapsed // updates // 1000:8} us/update")
+        results.append({"name": name, "per_second": per_second, "us": elapsed // updates // 1000})
+
+    # Each way of doing the background: heap, load, and a full redraw.
+    import background
+    results += background.benchmark(display)
+    return results
+
+def font_benchmark(iterations=10):
+    """The big font, BDF vs. glyph atlas; see glyph_atlas.benchmark()."""
+    if ON_DEVICE:
+        import glyph_atlas
+        return glyph_atlas.benchmark(iterations)
+
+    import os
+    import sim
+    sim.install(None, patch_time=False)
+    sys.modules.pop("glyph_atlas", None)
+    import glyph_atlas
+    here = os.path.dirname(os.path.abspath(__file__))
+    return glyph_atlas.benchmark(iterations, os.path.join(here, glyph_atlas.BDF_PATH),
+                                 os.path.join(here, glyph_atlas.ATLAS_PATH))
+
+def simulator_benchmark(hours=1):
+    """An hour (or so) of midibit_2 on the simulator, in its own process, since the
+    simulator takes over the time module."""
+    import json
+    import os
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run([sys.executable, "-m", "sim.run", "--hours", str(hours), "--json"],
+                         cwd=here, capture_output=True, text=True, check=True).stdout
+    results = json.loads(out.strip().splitlines()[-1])
+    print(f"{'sim midibit_2':24} {results['events_per_wall_second']:10} events/sec   {results['speedup']:8}x real time")
+    return [{"name": "sim_midibit_2",
+             "events_per_second": results["events_per_wall_second"],
+             "speedup": results["speedup"],
+             "display_refreshes": results["display_refreshes"],
+             "usb_reads": results["usb_reads"]}]
+
+
+# ------------------------------------------------------------------------------
+
+def run(quick=False):
+    """Run everything there's hardware (or a simulator) for. Print the report and return it."""
+    import json
+    import command_matcher
+    import hms_format
+    import midi_reader
+    import nvm_store
+    import practice_journal
+    import practice_tracker
+
+    # Smaller counts on the device, and when we're in a hurry.
+    small = ON_DEVICE or quick
+    report = {
+        "version": REPORT_VERSION,
+        "platform": sys.platform,
+        "implementation": sys.implementation.name + " " + ".".join(str(v) for v in sys.implementation.version[:3]),
+        "quick": small,
+        "results": {},
+        "skipped": {},
+    }
+
+    print("\n--- ingest")
+    _add(report, midi_reader.benchmark(200 if small else 2000), "ingest")
+    _add(report, practice_tracker.benchmark(5_000 if small else 100_000), "ingest")
+
+    print("\n--- matching")
+    _add(report, command_matcher.benchmark(20_000 if small else 1_000_000), "matching")
+
+    print("\n--- formatting")
+    _add(report, hms_format.benchmark(500 if small else 5000), "formatting")
+
+    print("\n--- persistence")
+    try:
+        if ON_DEVICE:
+            _add(report, practice_journal.benchmark("", 20), "persistence")
+        else:
+            import tempfile
+            with tempfile.TemporaryDirectory() as directory:
+                _add(report, practice_journal.benchmark(directory, 20 if small else 200), "persistence")
+    except OSError as e:
+        # Read-only in DEV mode.
+        _skip(report, "persistence.journal", e)
+    _add(report, nvm_store.benchmark(10 if small else 50), "persistence")
+
+    print("\n--- rendering")
+    try:
+        _add(report, display_benchmark(50 if small else 200), "rendering")
+    except Exception as e:
+        # No TFT on this board, say.
+        _skip(report, "rendering", e)
+
+    print("\n--- fonts")
+    try:
+        _add(report, font_benchmark(3 if small else 10), "fonts")
+    except Exception as e:
+        # No atlas yet, say.
+        _skip(report, "fonts", e)
+
+    if not ON_DEVICE:
+        print("\n--- end to end")
+        try:
+            _add(report, simulator_benchmark(), "sim")
+        except Exception as e:
+            _skip(report, "sim", e)
+
+    print()
+    print(LOG_PREFIX + json.dumps(report))
+    return report
+
+
+# ------------------------------------------------------------------------------
+# Looking at reports: PC only.
+
+# Which way is better, for each kind of number in a result; anything else is just information.
+HIGHER_IS_BETTER = ("per_second", "events_per_second", "speedup")
+LOWER_IS_BETTER = ("us", "us_per_save", "bytes_per_item", "bytes_per_save", "bytes_kept",
+                   "heap_bytes", "load_us", "redraw_us")
+
+def from_log(path):
+    """The last report in a saved serial console capture."""
+    import json
+    report = None
+    with open(path, errors="replace") as f:
+        for line in f:
+            i = line.find(LOG_PREFIX)
+            if i >= 0:
+                report = json.loads(line[i + len(LOG_PREFIX):])
+    if report is None:
+        raise ValueError(f"{path}: no '{LOG_PREFIX.strip()}' line in it")
+    return report
+
+def compare(old, new, threshold=REGRESSION):
+    """Print old vs. new, side by side; return the list of (name, key, old, new) that got worse."""
+    regressions = []
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            print(f"{name:40} (new)")
+            continue
+        for key, value in result.items():
+            was = before.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(was, (int, float)) or was == 0:
+                continue
+            change = (value - was) / was
+            if key in HIGHER_IS_BETTER:
+                worse = change < -threshold
+            elif key in LOWER_IS_BETTER:
+                worse = change > threshold and value - was > 1 # (a byte or a microsecond is noise)
+            else:
+                continue
+            print(f"{name:40} {key:18} {was:>12} -> {value:<12} {change:+7.1%}{'  <-- WORSE' if worse else ''}")
+            if worse:
+                regressions.append((name, key, was, value))
+    for name in old["results"]:
+        if name not in new["results"]:
+            print(f"{name:40} (gone)")
+    return regressions
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="fewer iterations")
+    parser.add_argument("--from-log", metavar="FILE", help="don't run anything; take the report from a serial console capture")
+    parser.add_argument("--out", metavar="FILE", help="write the report here, as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="an earlier report; exit 1 if anything got more than 10%% worse")
+    args = parser.parse_args()
+
+    report = from_log(args.from_log) if args.from_log else run(args.quick)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print(f"\n--- compared with {args.compare}")
+        regressions = compare(old, report)
+        print(f"{len(regressions)} regression(s)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__" and not ON_DEVICE:
+    main()
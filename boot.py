@@ -10,6 +10,10 @@
 
 # Either way, flash the LED to show what mode we are going to.
 
+# With DEF.FAST_BOOT, skip the blinking - it's most of the 4 seconds this used to take:
+# the LED goes blue while we watch the button for BUTTON_WINDOW seconds (so hold it down
+# while plugging in), then straight to red or green.
+
 #
 # see https://learn.adafruit.com/circuitpython-essentials?view=all#circuitpython-storage
 #
@@ -23,11 +27,14 @@ import time
 
 import midibit_defines as DEF
 
+boot_start = time.monotonic()
+
 
 RUN_MODE_COLOR = (255, 0, 0)
 DEV_MODE_COLOR = (0, 255, 0)
 
 BUTTON = board.D7
+BUTTON_WINDOW = .5
 
 pixel = neopixel.NeoPixel(board.NEOPIXEL, 1)
 
@@ -38,6 +45,14 @@ def blink(times, color_triple):
         pixel.fill((0,0,0))
         time.sleep(.2)
 
+def button_pressed_within(button, seconds):
+    """Watch the button for that long; True as soon as it's down."""
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if not button.value:
+            return True
+    return False
+
 
 ###########################################################################
 
@@ -49,13 +64,17 @@ print(f"{microcontroller.nvm[0]=} -> {go_dev_mode=}")
 
 if not go_dev_mode:
 
-    # Blink blue 5 times, pause, then read button.
-    blink(5, (0, 0, 255))
-    time.sleep(1)
-
     button = digitalio.DigitalInOut(BUTTON)
     button.switch_to_input(pull=digitalio.Pull.UP)
-    button_pushed = not button.value
+
+    if DEF.FAST_BOOT:
+        pixel.fill((0, 0, 255))
+        button_pushed = button_pressed_within(button, BUTTON_WINDOW)
+    else:
+        # Blink blue 5 times, pause, then read button.
+        blink(5, (0, 0, 255))
+        time.sleep(1)
+        button_pushed = not button.value
     if button_pushed:
         go_dev_mode = True
         print(f"Button pushed -> {go_dev_mode=}")
@@ -77,8 +96,13 @@ if not go_dev_mode:
 # Blink & hold: green if dev mode, red if run mode.
 #
 if go_dev_mode:
-    blink(3, DEV_MODE_COLOR)
+    if not DEF.FAST_BOOT:
+        blink(3, DEV_MODE_COLOR)
     pixel.fill(DEV_MODE_COLOR)
 else:
-    blink(3, RUN_MODE_COLOR)
+    if not DEF.FAST_BOOT:
+        blink(3, RUN_MODE_COLOR)
     pixel.fill(RUN_MODE_COLOR)
+
+# This goes in boot_out.txt; see also boot_profile, for code.py.
+print(f"boot.py took {int((time.monotonic() - boot_start) * 1000)} ms")
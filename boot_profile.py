@@ -0,0 +1,59 @@
+'''
+Where the time goes between power-on and counting the first note.
+
+Make a BootProfile as the very first thing in code.py, then mark() each step as it
+finishes - the imports, the display, loading the totals, ... - and report() prints the
+breakdown:
+
+    boot: 4212 ms before code.py (boot.py, USB, the VM)
+    boot:   imports                     381 ms     4593 ms    112464 free
+    boot:   display                    1730 ms     6323 ms     61232 free
+    ...
+
+time.monotonic() counts from power-on, not from when code.py starts, so the first line
+is everything before us: boot.py's blinking, USB enumeration, starting the VM. Each step
+is how long it took, then the time since power-on, then the heap free after it
+(CircuitPython only; there's no gc.mem_free on a PC).
+
+On the simulator the clock only moves when the code waits for something, so the steps
+come out as 0 there; it's the device's numbers that matter.
+'''
+
+import gc
+import time
+
+
+class BootProfile:
+
+    def __init__(self):
+        self._start = time.monotonic_ns()
+        self._last = self._start
+        self._mem_free = getattr(gc, "mem_free", None)
+
+        # (step, ms it took, ms since power-on, bytes free after it, or None)
+        self.steps = []
+        self.reported = False
+
+    def mark(self, step):
+        """That step's done."""
+        now = time.monotonic_ns()
+        free = self._mem_free() if self._mem_free else None
+        self.steps.append((step, (now - self._last) // 1_000_000, now // 1_000_000, free))
+        self._last = now
+
+    def before_ms(self):
+        """How long it was from power-on to code.py starting."""
+        return self._start // 1_000_000
+
+    def total_ms(self):
+        """From power-on to the last step."""
+        return self._last // 1_000_000
+
+    def report(self):
+        """Print the breakdown (once)."""
+        self.reported = True
+        print(f"boot: {self.before_ms()} ms before code.py (boot.py, USB, the VM)")
+        for step, ms, since_boot, free in self.steps:
+            free = "" if free is None else f"{free:10} free"
+            print(f"boot:   {step:24} {ms:6} ms {since_boot:8} ms {free}")
+        print(f"boot: {self.total_ms()} ms in all")
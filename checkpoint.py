@@ -0,0 +1,127 @@
+'''
+When to save the totals in the middle of a session.
+
+Without this, a session only gets saved when it ends, so if the power goes two hours
+into one, that's two hours gone. CheckpointScheduler says a checkpoint is due every
+interval_ms, or as soon as delta_ms of unsaved time has piled up, whichever comes
+first - but never sooner than min_gap_ms after the last save of any kind, so the
+flash sees a bounded number of writes however things go.
+
+What gets saved is always the absolute totals, in-progress session included, so
+nothing special happens on boot: the store loads the last totals it has, whether
+they came from a checkpoint or from the end of a session, and the next save just
+carries on from there.
+
+The time since the last save is a session_clock.Accumulator, added to at every due(),
+so it's still right after days without a save (ticks_diff() from the last save isn't,
+past about 3 days: it wraps negative).
+'''
+
+import session_clock
+
+
+class CheckpointScheduler:
+
+    def __init__(self, clock, interval_ms, delta_ms, min_gap_ms, saved_ms=0):
+        """saved_ms is the totals (practice + play) already on storage when we start."""
+        self.interval_ms = interval_ms
+        self.delta_ms = delta_ms
+        self.min_gap_ms = min_gap_ms
+
+        # What's on storage, and how long since it got there.
+        self._saved_ms = saved_ms
+        self._since_save = session_clock.Accumulator(clock)
+        self._since_save.start()
+
+        self.checkpoints = 0
+        self.saves = 0
+
+    def start(self, total_ms, now=None):
+        """Tell us what's on storage to begin with (if it wasn't known when we were made)."""
+        self._saved_ms = total_ms
+        self._since_save.start(now)
+
+    def saved(self, total_ms, now=None, checkpoint=False):
+        """Tell us the totals (practice + play, in ms) just got written."""
+        self._saved_ms = total_ms
+        self._since_save.start(now)
+        self.saves += 1
+        if checkpoint:
+            self.checkpoints += 1
+
+    def failed(self, now=None):
+        """A write didn't work; don't try another checkpoint for a while."""
+        self._since_save.start(now)
+
+    def due(self, total_ms, now=None):
+        """Should we write a checkpoint, with the totals (practice + play, in ms) where they are now?
+        Call it every so often - at least every few days - even when there's nothing to save."""
+        since = self._since_save.update(now)
+        unsaved_ms = abs(total_ms - self._saved_ms)
+        if unsaved_ms == 0:
+            return False
+        if since < self.min_gap_ms:
+            return False
+        return since >= self.interval_ms or unsaved_ms >= self.delta_ms
+
+    def stats(self):
+        return f"checkpoint: {self.saves} saves, {self.checkpoints} of them checkpoints"
+
+
+# ------------------------------------------------------------------------------
+
+def test():
+    """A two-hour session, checked once a second, with a 2-minute delta and a 10-minute interval;
+    then some idle time, which shouldn't cause any saves."""
+    now = [0]
+    clock = session_clock.Clock(lambda: now[0])
+    scheduler = CheckpointScheduler(clock, 10 * 60_000, 2 * 60_000, 30_000)
+
+    total_ms = 0
+    for second in range(2 * 3600):
+        now[0] += 1000
+        total_ms += 1000
+        if scheduler.due(total_ms):
+            scheduler.saved(total_ms, checkpoint=True)
+    assert scheduler.checkpoints == 60, scheduler.checkpoints
+
+    # A slow trickle of unsaved time gets saved after interval_ms.
+    now[0] += 9 * 60_000
+    total_ms += 1000
+    assert not scheduler.due(total_ms)
+    now[0] += 60_001
+    assert scheduler.due(total_ms)
+    scheduler.saved(total_ms, checkpoint=True)
+
+    # Nothing unsaved, nothing due.
+    now[0] += 3600_000
+    assert not scheduler.due(total_ms)
+
+    # A save of some other kind pushes the next checkpoint back, min_gap_ms at least.
+    total_ms = 0
+    scheduler.saved(total_ms)
+    total_ms += 5 * 60_000
+    now[0] += 10_000
+    assert not scheduler.due(total_ms)
+    now[0] += 20_000
+    assert scheduler.due(total_ms)
+    print(scheduler.stats())
+
+    # Four days with nothing to save - the ticks wrap (every 2**29 ms) - then an hour's session.
+    PERIOD = 1 << 29
+    now = [PERIOD - 1000]
+    clock = session_clock.Clock(lambda: now[0] % PERIOD)
+    scheduler = CheckpointScheduler(clock, 10 * 60_000, 2 * 60_000, 30_000)
+    for minute in range(4 * 24 * 60):
+        now[0] += 60_000
+        assert not scheduler.due(0)
+    total_ms = 0
+    for second in range(3600):
+        now[0] += 1000
+        total_ms += 1000
+        if scheduler.due(total_ms):
+            scheduler.saved(total_ms, checkpoint=True)
+    assert scheduler.checkpoints == 30, scheduler.checkpoints
+    print("CheckpointScheduler OK")
+
+# test()
@@ -0,0 +1,221 @@
+'''
+Watch the incoming notes for any number of command sequences at once.
+
+This replaces one midi_state_machine per command. Those each tracked the shared
+prefix on their own, and restarting only on the first note meant they missed
+overlapping starts: G G G G Eb.. never matched G G G Eb.
+
+Instead we build an Aho-Corasick automaton over all the sequences and flatten it
+into a DFA: one dict per state, from note to next state. So each note is one dict
+lookup, however many commands there are, and the automaton always knows the longest
+partial match, overlaps included.
+
+When a sequence completes, note() returns its action and we go back to the start,
+so the last note of one command can't also start the next.
+
+For the "when did this command start" question, we keep the times of the last few
+notes in a small ring.
+'''
+
+from adafruit_ticks import ticks_ms
+
+
+class CommandMatcher:
+
+    def __init__(self, commands, ticks=ticks_ms):
+        """commands is a sequence of (notes, action) pairs; notes is a tuple of MIDI note numbers,
+        and action can be anything - it's what note() returns when those notes come in.
+        If one sequence ends with another one, the longer one wins."""
+        self._ticks = ticks
+
+        # Build the trie. State 0 is the root.
+        goto = [{}]
+        depth = [0]
+        action = [None]
+        for notes, act in commands:
+            if len(notes) == 0:
+                raise ValueError("empty command sequence")
+            state = 0
+            for n in notes:
+                next_state = goto[state].get(n)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][n] = next_state
+                    goto.append({})
+                    depth.append(depth[state] + 1)
+                    action.append(None)
+                state = next_state
+            if action[state] is not None:
+                raise ValueError(f"duplicate command sequence {notes}")
+            action[state] = act
+
+        # Breadth-first, work out the failure links and fill in the DFA: each state gets
+        # its own transitions, plus the ones its failure state has that it doesn't.
+        # Notes that aren't in any sequence aren't in any dict; they go back to the root.
+        # A state with no action of its own takes its failure state's, if that has one
+        # (a shorter sequence ending here); length is how long the matched sequence is.
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        length = [depth[s] if action[s] is not None else 0 for s in range(len(goto))]
+        delta[0] = dict(goto[0])
+        queue = list(goto[0].values())
+        i = 0
+        while i < len(queue):
+            state = queue[i]
+            i += 1
+            transitions = dict(delta[fail[state]])
+            for n, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(n, 0)
+                transitions[n] = child
+                queue.append(child)
+            delta[state] = transitions
+            if action[state] is None:
+                action[state] = action[fail[state]]
+                length[state] = length[fail[state]]
+
+        self._delta = delta
+        self._action = action
+        self._length = length
+        self.states = len(delta)
+
+        # Times of the last few notes, so we can say when a match started.
+        self._ring_size = max(len(notes) for notes, act in commands)
+        self._times = [0] * self._ring_size
+        self._count = 0
+        self._match_start = 0
+
+        self._state = 0
+
+    def note(self, new_note, now=None):
+        """Feed in one note. Return the action if this note completes a command, else None."""
+        i = self._count % self._ring_size
+        self._times[i] = self._ticks() if now is None else now
+        self._count += 1
+
+        state = self._delta[self._state].get(new_note, 0)
+        action = self._action[state]
+        if action is None:
+            self._state = state
+            return None
+
+        self._match_start = self._times[(self._count - self._length[state]) % self._ring_size]
+        self._state = 0
+        return action
+
+    def reset(self):
+        """Forget any partial match."""
+        self._state = 0
+
+    def match_start_time(self):
+        """When the first note of the last completed command came in, in adafruit_ticks.ticks_ms() milliseconds."""
+        return self._match_start
+
+
+# ------------------------------------------------------------------------------
+
+def _naive(commands, notes):
+    """What the matcher should do, done the slow way: after each note, does the stream end with
+    a command (longest first), counting only notes since the last match?"""
+    ordered = sorted(commands, key=lambda c: -len(c[0]))
+    results = []
+    since = []
+    for n in notes:
+        since.append(n)
+        for seq, act in ordered:
+            if len(since) >= len(seq) and tuple(since[-len(seq):]) == seq:
+                results.append((act, len(seq)))
+                since = []
+                break
+        else:
+            results.append(None)
+    return results
+
+def test(seed=1234, notes=20_000):
+    import random
+
+    prefix = (67, 67, 67, 63, 65, 65, 65, 62)
+    commands = ((prefix + (60,), "reset"), (prefix + (62,), "boot"), (prefix + (65,), "toggle"))
+
+    # Overlapping starts: the old state machine missed this one.
+    m = CommandMatcher(commands, ticks=lambda: 0)
+    stream = (67,) + prefix + (60,)
+    hits = [m.note(n, now=t) for t, n in enumerate(stream)]
+    assert hits[-1] == "reset" and hits[:-1] == [None] * (len(stream) - 1), hits
+    assert m.match_start_time() == 1, m.match_start_time()
+
+    # Several commands in a row, with no gaps.
+    stream = prefix + (62,) + prefix + (65,)
+    hits = [m.note(n) for n in stream]
+    assert hits.count("boot") == 1 and hits[-1] == "toggle", hits
+
+    # One command ending with another: the longer one wins.
+    m = CommandMatcher((((1, 2, 3), "long"), ((2, 3), "short")))
+    assert [m.note(n) for n in (1, 2, 3, 9, 2, 3)] == [None, None, "long", None, None, "short"]
+
+    # Fuzz against the slow way, over random notes drawn mostly from the commands' own notes.
+    rng = random.Random(seed)
+    alphabet = (60, 62, 63, 65, 67, 67, 67, 65, 65, 30)
+    stream = [rng.choice(alphabet) for i in range(notes)]
+    # And some real commands in there too.
+    for i in range(0, notes - 20, notes // 50):
+        stream[i:i+9] = commands[rng.randrange(3)][0]
+    m = CommandMatcher(commands, ticks=lambda: 0)
+    expected = _naive(commands, stream)
+    for t, n in enumerate(stream):
+        got = m.note(n, now=t)
+        want = expected[t]
+        if want is None:
+            assert got is None, (t, got)
+        else:
+            assert got == want[0], (t, got, want)
+            assert m.match_start_time() == t - want[1] + 1
+
+    # Random command sets, too.
+    for trial in range(200):
+        commands = []
+        seen = set()
+        for c in range(rng.randrange(1, 6)):
+            seq = tuple(rng.choice((1, 2, 3)) for i in range(rng.randrange(1, 6)))
+            if seq not in seen:
+                seen.add(seq)
+                commands.append((seq, c))
+        stream = [rng.choice((1, 2, 3, 4)) for i in range(300)]
+        m = CommandMatcher(commands, ticks=lambda: 0)
+        expected = _naive(commands, stream)
+        for t, n in enumerate(stream):
+            got = m.note(n, now=t)
+            assert got == (expected[t] and expected[t][0]), (commands, t, got, expected[t])
+
+    print(f"CommandMatcher OK ({m.states} states)")
+
+def benchmark(notes=1_000_000):
+    """Notes per second through the matcher vs. the three state machines it replaced."""
+    import random
+    import time
+    import midi_state_machine
+
+    prefix = (67, 67, 67, 63, 65, 65, 65, 62)
+    commands = ((prefix + (60,), 1), (prefix + (62,), 2), (prefix + (65,), 3))
+    rng = random.Random(1)
+    stream = [rng.choice((60, 62, 63, 65, 67, 48, 52, 55)) for i in range(notes)]
+
+    m = CommandMatcher(commands)
+    start = time.monotonic_ns()
+    for n in stream:
+        m.note(n, 0)
+    elapsed = time.monotonic_ns() - start
+    results = [{"name": "command_matcher", "per_second": notes * 1_000_000_000 // elapsed}]
+    print(f"CommandMatcher:        {results[-1]['per_second']:10} notes/s")
+
+    machines = [midi_state_machine.midi_state_machine(seq) for seq, act in commands]
+    start = time.monotonic_ns()
+    for n in stream:
+        for msm in machines:
+            msm.note(n)
+    elapsed = time.monotonic_ns() - start
+    results.append({"name": "state_machines_x3", "per_second": notes * 1_000_000_000 // elapsed})
+    print(f"3 midi_state_machines: {results[-1]['per_second']:10} notes/s")
+    return results
+
+# test()
+# benchmark()
@@ -0,0 +1,208 @@
+'''
+What all our displays have in common, and finding the one that's plugged in.
+
+Every display class is a DisplayBase, and has:
+
+    set_text_1(text)            the practice total
+    set_text_2(text)            the play total (with CAP_TWO_TOTALS)
+    set_text_status(text, duration=None, priority=PRIORITY_BACKGROUND)
+                                the status line; see status_channel.py
+    set_display_practice_mode(practice)
+                                which total is the live one (with CAP_MODE; else a no-op)
+    tick()                      expires timed status messages
+    set_auto_refresh(on)
+    refresh()                   pushes any changes; True if there were any
+    blank_screen()              idle: the panel goes to sleep
+    wake()                      not idle any more
+
+and 'caps', some CAP_ flags, so the entry points can ask what it can do instead of
+knowing which class it is. The part they share: refreshing only when something
+changed, the status channel, only touching a label when its text really changes (each
+assignment re-lays out all its glyphs), and the big font, loaded once.
+
+Idle, the display is a little state machine: AWAKE -> blank_screen() -> ASLEEP, where the
+panel gets its sleep command (the SSD1306's display off; the ST7735's display off and sleep
+in) and refresh() does nothing, so there's no bus traffic at all; calling blank_screen()
+again does nothing either. wake() -> WAKING: the panel's told to wake up, and the first
+refresh() once it's had WAKE_MS to do so turns it back on -> AWAKE. The Renderer
+(render_layer.set_idle) does the rest: skips drawing while asleep, and redraws everything
+the moment it can.
+
+open_display() looks at what's there, once: an I2C scan for the OLEDs' addresses, then
+the TFT, if we were given its pins - there's no scanning for an SPI panel, so that's the
+fallback. Then it makes just that one, instead of trying each in turn, and catching the
+exception, and tearing down what it got half-way through making.
+'''
+
+from adafruit_ticks import ticks_diff, ticks_ms
+
+from status_channel import StatusChannel, PRIORITY_BACKGROUND
+
+
+# What a display can do.
+CAP_TWO_TOTALS = 0x01   # practice and play; without it, just practice (text 1)
+CAP_MODE = 0x02         # shows which of them is live (set_display_practice_mode)
+CAP_COLOR = 0x04        # colors, and a background
+
+# Where the OLEDs answer on I2C.
+OLED_128x64_ADDRESS = 0x3D
+OLED_128x32_ADDRESS = 0x3C
+
+# The idle states.
+AWAKE = 0
+ASLEEP = 1
+WAKING = 2
+
+
+_big_font = None
+
+def big_font():
+    """The font for the totals: the glyph atlas, or the BDF. Loaded once, whoever asks."""
+    global _big_font
+    if _big_font is None:
+        import glyph_atlas
+        _big_font = glyph_atlas.load_font()
+    return _big_font
+
+
+class DisplayBase:
+
+    caps = 0
+
+    # How long the panel takes to wake up, before it can be sent anything else.
+    WAKE_MS = 0
+
+    def __init__(self, display):
+        """display is the displayio display (ST7735R, SSD1306, ...)."""
+        self._display = display
+
+        # Has anything changed since the last refresh()? Only matters with auto_refresh off.
+        self._dirty = True
+
+        self._status = StatusChannel(self._show_status)
+
+        self._state = AWAKE
+        self._woke_at = 0
+        self.sleeps = 0
+
+    def _set_label(self, label, text):
+        """Only if it's different."""
+        if label.text != text:
+            label.text = text
+            self._dirty = True
+
+    def _set_color(self, label, color):
+        if label.color != color:
+            label.color = color
+            self._dirty = True
+
+    def set_text_1(self, text):
+        """The practice total; every display has its own."""
+        pass
+
+    def set_text_2(self, text):
+        """The play total; only with CAP_TWO_TOTALS."""
+        pass
+
+    def set_text_status(self, text, duration=None, priority=PRIORITY_BACKGROUND):
+        """Show a status message. If duration (seconds) is given, it goes away by itself after that long;
+        a higher priority message hides a lower one until it expires. See status_channel.py."""
+        self._status.set(text, duration, priority)
+
+    def _show_status(self, text):
+        """Put the status line up; every display has its own."""
+        pass
+
+    def tick(self):
+        """Call this regularly, to expire timed status messages."""
+        self._status.tick()
+
+    def set_display_practice_mode(self, practice_mode):
+        """Only with CAP_MODE."""
+        pass
+
+    def set_auto_refresh(self, auto_refresh):
+        """If off, nothing shows up until refresh() is called."""
+        self._display.auto_refresh = auto_refresh
+
+    def refresh(self):
+        """Push any changes to the screen. Return True if there were any.
+        Asleep, nothing; waking, nothing till the panel's ready, then everything."""
+        if self._state != AWAKE:
+            if self._state == ASLEEP or ticks_diff(ticks_ms(), self._woke_at) < self.WAKE_MS:
+                return False
+            self._panel_on()
+            self._state = AWAKE
+        if not self._dirty:
+            return False
+        self._dirty = False
+        self._display.refresh()
+        return True
+
+    def blank_screen(self):
+        """Idle: put the panel to sleep, and stop refreshing. Does nothing if it's asleep already."""
+        if self._state == ASLEEP:
+            return
+        self._status.clear()
+        self._panel_sleep()
+        self._state = ASLEEP
+        self.sleeps += 1
+
+    def wake(self):
+        """Wake the panel up; it comes back on with the first refresh() after WAKE_MS.
+        Return True if it was asleep - so whatever draws on it should draw everything again."""
+        if self._state != ASLEEP:
+            return False
+        self._panel_wake()
+        self._state = WAKING
+        self._woke_at = ticks_ms()
+        self._dirty = True
+        return True
+
+    def asleep(self):
+        return self._state == ASLEEP
+
+    # The panel's own commands. These are the SSD1306 driver's; the TFT has its own.
+    def _panel_sleep(self):
+        self._display.sleep()
+
+    def _panel_wake(self):
+        self._display.wake()
+
+    def _panel_on(self):
+        pass
+
+
+# ------------------------------------------------------------------------------
+
+def probe_i2c():
+    """The addresses that answer on the I2C bus; none if there's no bus to speak of
+    (board.I2C() finds no pull-ups when nothing's plugged in)."""
+    import board
+    try:
+        i2c = board.I2C()
+    except RuntimeError as e:
+        print(f"No I2C: {e}")
+        return []
+    while not i2c.try_lock():
+        pass
+    try:
+        return i2c.scan()
+    finally:
+        i2c.unlock()
+
+def open_display(tft_pins=None, defer_assets=False):
+    """Make the display that's there: an OLED, if one answers on I2C; else the TFT, if
+    tft_pins (CS, DC, reset) are given. None if there's nothing."""
+    addresses = probe_i2c()
+    print(f"Displays: I2C {[hex(a) for a in addresses]}, TFT pins {tft_pins}")
+    if OLED_128x64_ADDRESS in addresses:
+        import two_line_oled
+        return two_line_oled.two_line_oled(OLED_128x64_ADDRESS, 64)
+    if OLED_128x32_ADDRESS in addresses:
+        import one_line_oled
+        return one_line_oled.one_line_oled()
+    if tft_pins is not None:
+        import tft_144_display
+        return tft_144_display.TFT144Display(*tft_pins, defer_assets=defer_assets)
+    return None
@@ -0,0 +1,302 @@
+'''
+The big font, precompiled: just the glyphs we show, in one bitmap.
+
+fonts/cmuntb22.bdf is 17,000 lines of text, and adafruit_bitmap_font parses it on the
+device - the header at load_font(), then each glyph the first time a label wants it,
+as a little Bitmap of its own. But the big labels only ever show the digits, ':' and
+"Practice" / "Play". So, on a PC, once:
+
+    python glyph_atlas.py [fonts/cmuntb22.bdf] [--out fonts/cmuntb22.atlas] [--chars "..."]
+
+makes an atlas: every glyph padded out to the same cell (it's a typewriter font; they
+nearly are already), side by side in one 1-bit strip, after a small header and a table
+of code points and advance widths. On the device, load() reads the header and table,
+then the strip straight into one displayio.Bitmap with bitmaptools.readinto() - no
+parsing, one allocation - and returns a font that adafruit_display_text's Label takes
+like any other: every glyph is a tile (tile_index) of the same bitmap.
+
+load_font() is what the displays call: the atlas if it's there, else the BDF, as before.
+benchmark() compares the two: load time, and RAM still in use afterwards.
+'''
+
+import struct
+import sys
+
+try:
+    import displayio
+except ImportError:
+    # Compiling on a PC.
+    displayio = None
+
+try:
+    import bitmaptools
+except ImportError:
+    # Not on the simulator; load() unpacks the bits itself.
+    bitmaptools = None
+
+try:
+    from fontio import Glyph
+except ImportError:
+    class Glyph:
+        """The same fields as fontio.Glyph."""
+        def __init__(self, bitmap, tile_index, width, height, dx, dy, shift_x, shift_y):
+            self.bitmap = bitmap
+            self.tile_index = tile_index
+            self.width = width
+            self.height = height
+            self.dx = dx
+            self.dy = dy
+            self.shift_x = shift_x
+            self.shift_y = shift_y
+
+
+BDF_PATH = "fonts/cmuntb22.bdf"
+ATLAS_PATH = "fonts/cmuntb22.atlas"
+
+# What the big labels show: the counters and the two titles.
+CHARS = "0123456789: Practice Play"
+
+# magic, cell width, cell height, cell x and y offset, ascent, descent, glyph count;
+# then per glyph, code point and advance; then the strip, cell height rows, MSB first.
+MAGIC = b"GLA1"
+HEADER_FORMAT = "<4sBBbbbbH"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+ENTRY_FORMAT = "<HB"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+
+
+class GlyphAtlas:
+    """A font, as far as adafruit_display_text is concerned."""
+
+    def __init__(self, bitmap, cell, ascent, descent, advances):
+        """cell is (width, height, dx, dy); advances is {code point: (tile index, shift_x)}."""
+        self.bitmap = bitmap
+        self._cell = cell
+        self.ascent = ascent
+        self.descent = descent
+        width, height, dx, dy = cell
+        self._glyphs = {}
+        for code_point, (tile, shift_x) in advances.items():
+            self._glyphs[code_point] = Glyph(bitmap, tile, width, height, dx, dy, shift_x, 0)
+
+    def get_bounding_box(self):
+        return self._cell
+
+    def get_glyph(self, code_point):
+        return self._glyphs.get(code_point)
+
+    def load_glyphs(self, code_points):
+        # They're all loaded.
+        pass
+
+
+def load(path=ATLAS_PATH):
+    """Read an atlas that make_atlas() made; return a GlyphAtlas."""
+    with open(path, "rb") as f:
+        magic, width, height, dx, dy, ascent, descent, count = struct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a glyph atlas")
+        table = f.read(count * ENTRY_SIZE)
+        advances = {}
+        for i in range(count):
+            code_point, shift_x = struct.unpack_from(ENTRY_FORMAT, table, i * ENTRY_SIZE)
+            advances[code_point] = (i, shift_x)
+
+        bitmap = displayio.Bitmap(width * count, height, 2)
+        if bitmaptools is not None:
+            bitmaptools.readinto(bitmap, f, 1)
+        else:
+            _unpack(bitmap, f.read(), (width * count + 7) // 8)
+    return GlyphAtlas(bitmap, (width, height, dx, dy), ascent, descent, advances)
+
+def _unpack(bitmap, data, row_bytes):
+    for y in range(bitmap.height):
+        row = y * row_bytes
+        for x in range(bitmap.width):
+            if data[row + (x >> 3)] & (0x80 >> (x & 7)):
+                bitmap[x, y] = 1
+
+def load_font(atlas_path=ATLAS_PATH, bdf_path=BDF_PATH):
+    """The atlas, if there is one; otherwise the BDF, with adafruit_bitmap_font."""
+    try:
+        return load(atlas_path)
+    except OSError:
+        print(f"No {atlas_path}; loading {bdf_path}. (Make one with glyph_atlas.py.)")
+        from adafruit_bitmap_font import bitmap_font
+        return bitmap_font.load_font(bdf_path)
+
+
+# ------------------------------------------------------------------------------
+# Making an atlas: on a PC.
+
+def read_bdf(path, chars):
+    """Just the glyphs we want from a BDF file.
+    Return (ascent, descent, {code point: (shift_x, width, height, x offset, y offset, rows)})."""
+    wanted = set(ord(c) for c in chars)
+    ascent = descent = 0
+    glyphs = {}
+    with open(path) as f:
+        code_point = None
+        rows = None
+        for line in f:
+            words = line.split()
+            if not words:
+                continue
+            key = words[0]
+            if key == "FONT_ASCENT":
+                ascent = int(words[1])
+            elif key == "FONT_DESCENT":
+                descent = int(words[1])
+            elif key == "ENCODING":
+                code_point = int(words[1])
+            elif code_point not in wanted:
+                continue
+            elif key == "DWIDTH":
+                shift_x = int(words[1])
+            elif key == "BBX":
+                bbx = [int(w) for w in words[1:5]]
+            elif key == "BITMAP":
+                rows = []
+            elif key == "ENDCHAR":
+                glyphs[code_point] = (shift_x, bbx[0], bbx[1], bbx[2], bbx[3], rows)
+                code_point = rows = None
+            elif rows is not None:
+                rows.append(int(key, 16) << (32 - len(key) * 4))
+    return ascent, descent, glyphs
+
+def make_atlas(bdf_path=BDF_PATH, out_path=ATLAS_PATH, chars=CHARS):
+    """Make an atlas of those characters from the BDF. Return its size in bytes."""
+    ascent, descent, glyphs = read_bdf(bdf_path, chars)
+    missing = [chr(c) for c in sorted(set(ord(c) for c in chars)) if c not in glyphs]
+    if missing:
+        raise ValueError(f"{bdf_path} hasn't got {missing}")
+
+    # The cell: big enough for all of them, from the same origin. (Not counting the
+    # empty ones, like space, whose box is all zeroes.)
+    boxes = [g[1:5] for g in glyphs.values() if g[1] and g[2]]
+    dx = min(x_offset for w, h, x_offset, y_offset in boxes)
+    dy = min(y_offset for w, h, x_offset, y_offset in boxes)
+    width = max(x_offset + w for w, h, x_offset, y_offset in boxes) - dx
+    height = max(y_offset + h for w, h, x_offset, y_offset in boxes) - dy
+
+    code_points = sorted(glyphs)
+    row_bytes = (width * len(code_points) + 7) // 8
+    strip = bytearray(row_bytes * height)
+    table = b""
+    for tile, code_point in enumerate(code_points):
+        shift_x, w, h, x_offset, y_offset, rows = glyphs[code_point]
+        table += struct.pack(ENTRY_FORMAT, code_point, shift_x)
+        # Rows go top down: the cell's top is dy + height above the baseline, the glyph's y_offset + h.
+        top = (dy + height) - (y_offset + h)
+        left = tile * width + (x_offset - dx)
+        for r, bits in enumerate(rows):
+            for c in range(w):
+                if bits & (0x8000_0000 >> c):
+                    x = left + c
+                    strip[(top + r) * row_bytes + (x >> 3)] |= 0x80 >> (x & 7)
+
+    data = struct.pack(HEADER_FORMAT, MAGIC, width, height, dx, dy, ascent, descent, len(code_points)) + table + strip
+    with open(out_path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+# ------------------------------------------------------------------------------
+
+def benchmark(iterations=5, bdf_path=BDF_PATH, atlas_path=ATLAS_PATH):
+    """The big font both ways: load time, and RAM still in use after (with the font kept).
+    On the device the BDF side is adafruit_bitmap_font, loading our glyphs too, as the labels
+    would. On a PC the bitmap_font there is the simulator's, which doesn't read the file,
+    so read_bdf() - the same parse, in Python - stands in for it; and the simulator's Bitmap
+    takes a byte a pixel, not a bit, so it's the device's RAM numbers that count."""
+    import gc
+    import time
+
+    on_device = sys.implementation.name == "circuitpython"
+    mem_free = getattr(gc, "mem_free", None)
+    if mem_free is None:
+        import tracemalloc
+
+    def load_bdf():
+        if on_device:
+            from adafruit_bitmap_font import bitmap_font
+            font = bitmap_font.load_font(bdf_path)
+            font.load_glyphs(CHARS)
+            return font
+        return read_bdf(bdf_path, CHARS)
+
+    def load_atlas():
+        return load(atlas_path)
+
+    results = []
+    for name, fn in (("bdf_load", load_bdf), ("atlas_load", load_atlas)):
+        gc.collect()
+        start = time.monotonic_ns()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.monotonic_ns() - start
+
+        # What it keeps.
+        gc.collect()
+        if mem_free is not None:
+            before = mem_free()
+            font = fn()
+            gc.collect()
+            kept = before - mem_free()
+        else:
+            tracemalloc.start()
+            font = fn()
+            gc.collect()
+            kept = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+        del font
+
+        us = elapsed // iterations // 1000
+        print(f"{name:24} {us:10} us/load  {kept:8} bytes kept")
+        results.append({"name": name, "us": us, "bytes_kept": kept})
+    return results
+
+def test():
+    import os
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "test.atlas")
+        size = make_atlas(BDF_PATH, path)
+        atlas = load(path)
+        print(f"{path}: {size} bytes, {atlas.bitmap.width}x{atlas.bitmap.height}")
+
+    # Every glyph's pixels are where the BDF says, in its own tile; nothing else is set.
+    ascent, descent, glyphs = read_bdf(BDF_PATH, CHARS)
+    width, height, dx, dy = atlas.get_bounding_box()
+    expected = set()
+    for code_point, (shift_x, w, h, x_offset, y_offset, rows) in glyphs.items():
+        glyph = atlas.get_glyph(code_point)
+        assert glyph.shift_x == shift_x and glyph.dx == dx and glyph.dy == dy
+        for r, bits in enumerate(rows):
+            for c in range(w):
+                if bits & (0x8000_0000 >> c):
+                    expected.add((glyph.tile_index * width + x_offset - dx + c, dy + height - y_offset - h + r))
+    got = set((x, y) for x in range(atlas.bitmap.width) for y in range(atlas.bitmap.height) if atlas.bitmap[x, y])
+    assert got == expected, len(got ^ expected)
+    assert atlas.get_glyph(ord("Q")) is None
+    assert (atlas.ascent, atlas.descent) == (ascent, descent)
+    print("GlyphAtlas OK")
+
+# test()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("bdf", nargs="?", default=BDF_PATH)
+    parser.add_argument("--out", default=ATLAS_PATH)
+    parser.add_argument("--chars", default=CHARS, help="the characters to put in it")
+    args = parser.parse_args()
+    size = make_atlas(args.bdf, args.out, args.chars)
+    print(f"{args.out}: {size} bytes")
+
+
+if __name__ == "__main__" and sys.implementation.name != "circuitpython":
+    main()
@@ -0,0 +1,158 @@
+'''
+H:MM:SS formatting without adafruit_datetime.
+
+as_hms() used to build a datetime.timedelta and str() it, once per second per counter.
+HMSCounter instead keeps the current digits in a bytearray and updates them in place
+from prebuilt digit tables, so moving the count along allocates nothing; the only
+allocation is the final str, made when somebody actually asks for the text.
+'''
+
+# Digit tables for 0..59: the tens and ones characters, as byte values.
+TENS = bytes(ord("0") + i // 10 for i in range(60))
+ONES = bytes(ord("0") + i % 10 for i in range(60))
+
+# And as ready-made strings, "00".."59".
+TWO_DIGITS = tuple(chr(TENS[i]) + chr(ONES[i]) for i in range(60))
+
+HOUR_DIGITS = 5
+
+
+def as_hms(seconds):
+    """Format seconds as H:MM:SS. (Hours just keep going; no days.)"""
+    seconds = int(seconds)
+    return str(seconds // 3600) + ":" + TWO_DIGITS[seconds // 60 % 60] + ":" + TWO_DIGITS[seconds % 60]
+
+
+class HMSCounter:
+    """One H:MM:SS readout. Call set() as often as you like; text() is only rebuilt after a change."""
+
+    def __init__(self, seconds=0):
+        self._buf = bytearray(b" " * (HOUR_DIGITS - 1) + b"0:00:00")
+        self._start = HOUR_DIGITS - 1
+        self._h = 0
+        self._m = 0
+        self._s = 0
+        self.seconds = 0
+        self._text = "0:00:00"
+        self.set(seconds)
+
+    def set(self, seconds):
+        """Move the readout to this many seconds. Return True if it changed."""
+        seconds = int(seconds)
+        if seconds == self.seconds:
+            return False
+
+        buf = self._buf
+        if seconds == self.seconds + 1:
+            # The usual case: one more second. Only touch the digits that roll over.
+            s = self._s + 1
+            if s < 60:
+                self._s = s
+                buf[-2] = TENS[s]
+                buf[-1] = ONES[s]
+            else:
+                self._s = 0
+                buf[-2] = TENS[0]
+                buf[-1] = ONES[0]
+                m = self._m + 1
+                if m < 60:
+                    self._m = m
+                else:
+                    m = 0
+                    self._m = 0
+                    self._set_hours(self._h + 1)
+                buf[-5] = TENS[m]
+                buf[-4] = ONES[m]
+        else:
+            self._set_hours(seconds // 3600)
+            m = seconds // 60 % 60
+            s = seconds % 60
+            self._m = m
+            self._s = s
+            buf[-5] = TENS[m]
+            buf[-4] = ONES[m]
+            buf[-2] = TENS[s]
+            buf[-1] = ONES[s]
+
+        self.seconds = seconds
+        self._text = None
+        return True
+
+    def _set_hours(self, h):
+        self._h = h
+        buf = self._buf
+        i = HOUR_DIGITS - 1
+        while True:
+            buf[i] = ONES[h % 10]
+            h //= 10
+            if h == 0 or i == 0:
+                break
+            i -= 1
+        self._start = i
+
+    def text(self):
+        """The readout as a string."""
+        if self._text is None:
+            self._text = str(self._buf[self._start:], "ascii")
+        return self._text
+
+    def __call__(self, seconds):
+        """Set and return the text in one go, so a counter can be used as a formatter."""
+        self.set(seconds)
+        return self.text()
+
+
+# ------------------------------------------------------------------------------
+
+def _timedelta_hms(seconds):
+    """The old way, for comparison."""
+    try:
+        import adafruit_datetime as datetime
+    except ImportError:
+        import datetime
+    return str(datetime.timedelta(0, int(seconds)))
+
+def benchmark(iterations=5000):
+    """Per-update time and allocation: the old timedelta as_hms vs. as_hms vs. HMSCounter.
+    (On a PC the counter still shows some allocation: CPython boxes every int over 256.
+    CircuitPython doesn't, so there set() allocates nothing.)"""
+    import bench_util
+
+    try:
+        import adafruit_datetime as datetime
+    except ImportError:
+        import datetime
+
+    results = []
+    seconds = [3599]
+    def old_way():
+        seconds[0] += 1
+        str(datetime.timedelta(0, seconds[0]))
+    def table_way():
+        seconds[0] += 1
+        as_hms(seconds[0])
+    counter = HMSCounter(3599)
+    def counter_set():
+        counter.set(counter.seconds + 1)
+    def counter_text():
+        counter.set(counter.seconds + 1)
+        counter.text()
+
+    for name, fn in (("timedelta as_hms", old_way), ("table as_hms", table_way),
+                     ("HMSCounter.set", counter_set), ("HMSCounter.set+text", counter_text)):
+        elapsed = bench_util.time_per_call(fn, iterations) * iterations
+        allocated = bench_util.bytes_allocated(fn, iterations)
+        results.append(bench_util.report(name, iterations, elapsed, allocated))
+    return results
+
+def test():
+    counter = HMSCounter()
+    for n in list(range(0, 7300)) + [36000, 35999, 360000, 0, 1, 3600 * 10000 - 1]:
+        counter.set(n)
+        assert counter.text() == as_hms(n), (n, counter.text(), as_hms(n))
+        if n < 24 * 3600:
+            assert counter.text() == _timedelta_hms(n)
+    print("HMSCounter OK")
+
+# test()
+# benchmark()
@@ -0,0 +1,347 @@
+'''
+Finding the MIDI keyboard on the USB bus, quickly.
+
+The old way was to try adafruit_usb_host_midi.MIDI() on every device, once a second,
+and see if it threw. It mostly doesn't: it parses the descriptors and, MIDI interface
+or not, hands back an object (with endpoint 0, for a hub) - hence the "FUNNY DEVICE"
+check. So instead:
+
+  - parse each device's configuration descriptor ourselves, once, looking for an
+    Audio / MIDI Streaming interface and its IN endpoint; remember the devices that
+    haven't got one, so we don't ask them again;
+  - remember the last keyboard that worked - VID, PID, interface, endpoint - in NVM,
+    so after a reboot (or an unplug) we look for it first, by VID/PID, and only read
+    its descriptors, not everybody's;
+  - when there's nothing there, wait longer between looks (doubling, up to a limit),
+    instead of once a second forever.
+
+When a read fails, that's not always an unplug. If the device is still on the bus,
+we try the same handle again a few times, a little apart (RECONNECT_WAITS_MS), before
+giving up on it and doing a whole new search; only that counts as an unplug.
+
+And it times itself. After boot: how long from boot until we'd found it. After that:
+how long from plug-in until we'd found it - at most; all we know is it wasn't there
+at the scan before. Either way, then how long until the first note came in.
+
+With more than one keyboard, they're told apart by device_key(): where each is plugged
+in, not what it is - two of the same model have the same VID, PID and product name.
+'''
+
+import struct
+
+import usb.core
+import adafruit_usb_host_descriptors
+
+from adafruit_ticks import ticks_diff, ticks_ms
+
+import midibit_defines as DEF
+import midi_reader
+
+
+# Interface class/subclass for a USB-MIDI device.
+CLASS_AUDIO = 0x01
+SUBCLASS_MIDI_STREAMING = 0x03
+
+# The cached device in NVM: marker, VID, PID, interface, IN endpoint, checksum.
+CACHE_FORMAT = "<BHHBBB"
+CACHE_SIZE = struct.calcsize(CACHE_FORMAT)
+CACHE_MARKER = 0xA5
+
+# After a USB error, while the device is still there: wait this long, then try it again.
+RECONNECT_WAITS_MS = (5, 20, 50, 100, 250)
+
+
+def device_key(device):
+    """Which device this is: its bus and the hub ports on the way to it (port_numbers is None
+    on the root port); else, if we can't tell that, its serial number; else just VID/PID."""
+    bus = getattr(device, "bus", None)
+    if bus is not None:
+        return (bus, getattr(device, "port_numbers", None))
+    serial = getattr(device, "serial_number", None)
+    if serial:
+        return (device.idVendor, device.idProduct, serial)
+    return (device.idVendor, device.idProduct)
+
+def device_name(device):
+    """Its product name, or its VID/PID if it hasn't got one."""
+    return device.product or f"0x{device.idVendor:04x}/0x{device.idProduct:04x}"
+
+def find_midi_interface(device):
+    """Parse the device's configuration descriptor; return (interface, in_endpoint),
+    or None if it has no MIDI Streaming interface with an IN endpoint."""
+    config = adafruit_usb_host_descriptors.get_configuration_descriptor(device, 0)
+    interface = None
+    i = 0
+    while i + 1 < len(config):
+        length = config[i]
+        kind = config[i+1]
+        if length == 0:
+            break
+        if kind == adafruit_usb_host_descriptors.DESC_INTERFACE:
+            if config[i+5] == CLASS_AUDIO and config[i+6] == SUBCLASS_MIDI_STREAMING:
+                interface = config[i+2]
+            else:
+                interface = None
+        elif kind == adafruit_usb_host_descriptors.DESC_ENDPOINT and interface is not None:
+            if config[i+2] & 0x80:
+                return interface, config[i+2]
+        i += length
+    return None
+
+
+class DeviceCache:
+    """The last MIDI device that worked, kept in a few bytes of NVM."""
+
+    def __init__(self, nvm, start=DEF.NVM_DEVICE_START):
+        self._nvm = nvm
+        self._start = start
+
+    def load(self):
+        """Return (vid, pid, interface, in_endpoint), or None."""
+        data = bytes(self._nvm[self._start:self._start + CACHE_SIZE])
+        marker, vid, pid, interface, endpoint, check = struct.unpack(CACHE_FORMAT, data)
+        if marker != CACHE_MARKER or check != sum(data[:-1]) & 0xFF:
+            return None
+        return vid, pid, interface, endpoint
+
+    def save(self, vid, pid, interface, endpoint):
+        """Remember this one; only writes the NVM if it's a different device."""
+        if self.load() == (vid, pid, interface, endpoint):
+            return False
+        data = bytearray(struct.pack(CACHE_FORMAT, CACHE_MARKER, vid, pid, interface, endpoint, 0))
+        data[-1] = sum(data[:-1]) & 0xFF
+        self._nvm[self._start:self._start + CACHE_SIZE] = data
+        return True
+
+
+class MidiFinder:
+
+    def __init__(self, nvm, read_timeout_ms, min_backoff_ms=250, max_backoff_ms=2000, ticks=ticks_ms):
+        """nvm is where the last good device is kept (microcontroller.nvm); read_timeout_ms is
+        for the readers we make. After a scan that finds nothing, wait wait_ms: doubling
+        from min_backoff_ms to max_backoff_ms."""
+        self._cache = DeviceCache(nvm)
+        self._read_timeout_ms = read_timeout_ms
+        self._min_backoff_ms = min_backoff_ms
+        self._max_backoff_ms = max_backoff_ms
+        self._ticks = ticks
+
+        # (vid, pid) of devices we've looked at that aren't MIDI.
+        self._not_midi = set()
+
+        self._backoff_ms = min_backoff_ms
+        self.wait_ms = 0
+        self.device = None
+
+        # For the timings.
+        self._search_start = ticks()
+        self._after_boot = True
+        self._found_at = None
+        self._last_miss = None
+        self.scans = 0
+        self.descriptor_reads = 0
+        self.search_ms = 0
+        self.plug_ms = 0
+
+        # USB errors we got over with the same handle, and ones that were real unplugs.
+        self.recoveries = 0
+        self.unplugs = 0
+        self._lost_at = None
+        self.reconnect_ms = 0
+        self.reconnect_worst_ms = 0
+
+    def start(self, now=None):
+        """We've lost the device for good; start timing a new search."""
+        self.unplugs += 1
+        self.device = None
+        self._search_start = self._ticks() if now is None else now
+        self._after_boot = False
+        self._found_at = None
+        self._last_miss = None
+        self.scans = 0
+        self._backoff_ms = self._min_backoff_ms
+
+    def scan(self):
+        """Look once. Return a midi_reader.FastMidiReader for the MIDI device, or None;
+        if None, wait wait_ms before the next scan."""
+        self.scans += 1
+        found = self._scan_cached() or self._scan_all()
+        if found is None:
+            self._last_miss = self._ticks()
+            self.wait_ms = self._backoff_ms
+            self._backoff_ms = min(self._backoff_ms * 2, self._max_backoff_ms)
+            return None
+
+        device, interface, endpoint = found
+        reader = self._open(device, interface, endpoint)
+        if self._cache.save(device.idVendor, device.idProduct, interface, endpoint):
+            print(f"MidiFinder: remembering 0x{device.idVendor:04x}/0x{device.idProduct:04x}")
+
+        self.device = device
+        self._found_at = self._ticks()
+        self.search_ms = ticks_diff(self._found_at, self._search_start)
+        self.plug_ms = self.search_ms if self._last_miss is None else ticks_diff(self._found_at, self._last_miss)
+        self._backoff_ms = self._min_backoff_ms
+        return reader
+
+    def scan_more(self, readers, limit):
+        """Look for MIDI devices other than the ones we already have readers for (a second
+        keyboard, say); return a list of readers for up to 'limit' new ones. Doesn't wait,
+        or back off."""
+        have = [device_key(r.device) for r in readers]
+        new = []
+        for device in usb.core.find(find_all=True):
+            if len(new) >= limit:
+                break
+            key = device_key(device)
+            if key in have or (device.idVendor, device.idProduct) in self._not_midi:
+                continue
+            found = self._check(device)
+            if found is not None:
+                new.append(self._open(*found))
+                have.append(key)
+        return new
+
+    def _open(self, device, interface, endpoint):
+        device.set_configuration()
+        try:
+            device.detach_kernel_driver(interface)
+        except Exception:
+            pass
+        return midi_reader.FastMidiReader(device, endpoint, self._read_timeout_ms)
+
+    def _scan_cached(self):
+        cached = self._cache.load()
+        if cached is None:
+            return None
+        device = usb.core.find(idVendor=cached[0], idProduct=cached[1])
+        if device is None:
+            return None
+        # Its descriptors are cheap to check, and then we know the cache isn't out of date.
+        found = self._check(device)
+        if found is not None:
+            print(f"MidiFinder: found the usual device, {device.product}")
+        return found
+
+    def _scan_all(self):
+        for device in usb.core.find(find_all=True):
+            if (device.idVendor, device.idProduct) in self._not_midi:
+                continue
+            found = self._check(device)
+            if found is not None:
+                return found
+        return None
+
+    def _check(self, device):
+        """(device, interface, endpoint) if it's MIDI, else None."""
+        key = (device.idVendor, device.idProduct)
+        try:
+            self.descriptor_reads += 1
+            midi = find_midi_interface(device)
+        except usb.core.USBError as e:
+            # Not ready yet, or gone again; try it next time.
+            print(f"MidiFinder: 0x{key[0]:04x}/0x{key[1]:04x}: {e}")
+            return None
+        if midi is None:
+            print(f"MidiFinder: 0x{key[0]:04x}/0x{key[1]:04x} ({device.product}) isn't MIDI")
+            self._not_midi.add(key)
+            return None
+        print(f"MidiFinder: 0x{key[0]:04x}/0x{key[1]:04x} ({device.product}) is MIDI")
+        return device, midi[0], midi[1]
+
+    def lost(self, now=None):
+        """A read just failed; start timing the reconnect."""
+        self._lost_at = self._ticks() if now is None else now
+
+    def still_there(self, device=None):
+        """Is the device (by default, the one scan() found) still on the bus?"""
+        if device is None:
+            device = self.device
+        if device is None:
+            return False
+        key = device_key(device)
+        for other in usb.core.find(find_all=True, idVendor=device.idVendor, idProduct=device.idProduct):
+            if device_key(other) == key:
+                return True
+        return False
+
+    def retry(self, reader):
+        """Try reading from the device again, with the same handle. Return True if it worked;
+        anything it read is in the reader's ring, for deliver()."""
+        try:
+            reader.fill(1)
+        except usb.core.USBError as e:
+            print(f"MidiFinder: retry: {e}")
+            return False
+        self.recoveries += 1
+        self.reconnect_ms = ticks_diff(self._ticks(), self._lost_at)
+        if self.reconnect_ms > self.reconnect_worst_ms:
+            self.reconnect_worst_ms = self.reconnect_ms
+        print("MidiFinder: " + self.reconnect_text() + f" ({self.recoveries} so far, {self.unplugs} unplugs)")
+        return True
+
+    def reconnect_text(self):
+        return f"Reconnected in {self.reconnect_ms} ms"
+
+    def found_text(self):
+        """What to say when we've found it."""
+        if self._after_boot:
+            return f"Found {device_name(self.device)} {self.search_ms} ms after boot"
+        return f"Found {device_name(self.device)} <{self.plug_ms} ms after plug-in"
+
+    def first_note(self, now):
+        """Tell us about a note. The first one after finding the device gets logged,
+        with the times; return the text for it, or None."""
+        if self._found_at is None:
+            return None
+        to_note = ticks_diff(now, self._found_at)
+        if self._after_boot:
+            found = f"{self.search_ms} ms after boot"
+        else:
+            found = f"at most {self.plug_ms} ms after plug-in"
+        text = (f"first note {to_note} ms after finding the device; found {found}, "
+                f"{self.scans} scans, {self.descriptor_reads} descriptor reads so far")
+        print("MidiFinder: " + text)
+        self._found_at = None
+        return text
+
+
+# ------------------------------------------------------------------------------
+
+def test():
+    nvm = bytearray(b"\xff" * 64)
+    cache = DeviceCache(nvm, 1)
+    assert cache.load() is None
+    assert cache.save(0x0582, 0x0127, 1, 0x81)
+    assert cache.load() == (0x0582, 0x0127, 1, 0x81)
+    assert not cache.save(0x0582, 0x0127, 1, 0x81)
+    nvm[3] ^= 1
+    assert cache.load() is None
+    assert nvm[0] == 0xFF and nvm[1 + CACHE_SIZE] == 0xFF
+
+    class Device:
+        def __init__(self, config):
+            self.config = config
+    class Descriptors:
+        DESC_INTERFACE = 0x04
+        DESC_ENDPOINT = 0x05
+        @staticmethod
+        def get_configuration_descriptor(device, index):
+            return device.config
+    global adafruit_usb_host_descriptors
+    real, adafruit_usb_host_descriptors = adafruit_usb_host_descriptors, Descriptors
+    try:
+        config = bytes((9, 2, 0, 0, 2, 1, 0, 0x80, 50))
+        audio_control = bytes((9, 4, 0, 0, 0, 1, 1, 0, 0))
+        midi = bytes((9, 4, 1, 0, 2, 1, 3, 0, 0))
+        ep_out = bytes((9, 5, 0x02, 2, 64, 0, 0, 0, 0))
+        ep_in = bytes((9, 5, 0x83, 2, 64, 0, 0, 0, 0))
+        hub = bytes((9, 4, 0, 0, 1, 9, 0, 0, 0)) + bytes((7, 5, 0x81, 3, 1, 0, 12))
+        assert find_midi_interface(Device(config + audio_control + midi + ep_out + ep_in)) == (1, 0x83)
+        assert find_midi_interface(Device(config + hub)) is None
+        assert find_midi_interface(Device(config + audio_control + ep_in)) is None
+    finally:
+        adafruit_usb_host_descriptors = real
+    print("midi_discovery OK")
+
+# test()
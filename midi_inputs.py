@@ -0,0 +1,218 @@
+'''
+Several MIDI keyboards at once - a controller and a digital piano behind a hub, say.
+
+MidiInputs keeps a midi_reader.FastMidiReader open for each one, and reads them in
+turns: each gets at most 'reads_per_turn' transfers per round, and the round starts
+with a different one each time, so a keyboard that's sending a lot can't keep the
+others waiting. Each reader has a 'source' number (its slot here), which goes along
+with every note it delivers.
+
+It also keeps a total per input: how long each one has been played since boot - the
+time between its batches of notes, when they're less than a session timeout apart.
+That's a batch at a time, not per note, to stay off the hot path. The tracker's
+totals are still for everything together.
+
+A read that fails doesn't stop the others; the reader goes in 'failed', for the entry
+point to retry or remove (see midi_discovery's reconnect path).
+'''
+
+from adafruit_ticks import ticks_diff
+
+try:
+    from usb.core import USBError
+except ImportError:
+    # No USB host support (testing on a PC, say).
+    USBError = OSError
+
+
+class MidiInputs:
+
+    def __init__(self, max_inputs, session_timeout_ms, reads_per_turn=2):
+        self.readers = []
+        self.failed = []
+        self._max_inputs = max_inputs
+        self._session_timeout_ms = session_timeout_ms
+        self._reads_per_turn = reads_per_turn
+        self._first = 0
+
+        # Per slot: the device's key (see midi_discovery.device_key) and name, whether it's
+        # open, ms played, when its last notes came, and how many. A device that comes back
+        # gets its old slot, and its totals. They're only kept till the next reboot.
+        self.keys = [None] * max_inputs
+        self.names = [None] * max_inputs
+        self._open = [False] * max_inputs
+        self.played_ms = [0] * max_inputs
+        self._last = [None] * max_inputs
+        self.notes = [0] * max_inputs
+
+    def has_room(self):
+        return len(self.readers) < self._max_inputs
+
+    def room(self):
+        """How many more we can take."""
+        return self._max_inputs - len(self.readers)
+
+    def add(self, reader, name, key=None):
+        """Start reading from this one; return its source number, or None if we've got
+        max_inputs already. key says which device it is - two of the same model have the
+        same name; by default, the name."""
+        if key is None:
+            key = name
+        source = self._slot_for(key)
+        if source is None:
+            print(f"MidiInputs: no room for {name}; {len(self.readers)} already")
+            return None
+        if self.keys[source] != key:
+            # Somebody else's old slot; start again.
+            self.keys[source] = key
+            self.played_ms[source] = 0
+            self.notes[source] = 0
+        self.names[source] = name
+        self._open[source] = True
+        self._last[source] = None
+        reader.source = source
+        self.readers.append(reader)
+        print(f"MidiInputs: {name} is input {source}; {len(self.readers)} now")
+        return source
+
+    def _slot_for(self, key):
+        """The slot for this device, or None if they're all taken."""
+        free = [i for i in range(self._max_inputs) if not self._open[i]]
+        if not free:
+            return None
+        for i in free:
+            if self.keys[i] == key:
+                return i
+        for i in free:
+            if self.keys[i] is None:
+                return i
+        return free[0]
+
+    def remove(self, reader):
+        """It's gone. Its total stays, in case it comes back."""
+        self.readers.remove(reader)
+        if reader in self.failed:
+            self.failed.remove(reader)
+        print(f"MidiInputs: {self.names[reader.source]} (input {reader.source}) gone; {len(self.readers)} left")
+        self._open[reader.source] = False
+
+    def fill(self, reads_per_turn=None):
+        """One round: each reader, in turn, reads what its device has (up to reads_per_turn
+        transfers). Return the number of notes now queued, over all of them. Readers whose
+        read failed go in self.failed."""
+        if reads_per_turn is None:
+            reads_per_turn = self._reads_per_turn
+        readers = self.readers
+        count = len(readers)
+        if count == 0:
+            return 0
+        queued = 0
+        first = self._first % count
+        for i in range(count):
+            reader = readers[(first + i) % count]
+            try:
+                queued += reader.fill(reads_per_turn)
+            except USBError as e:
+                print(f"MidiInputs: input {reader.source}: {e}")
+                self.failed.append(reader)
+        self._first = first + 1
+        return queued
+
+    def deliver(self, on_note, now):
+        """Hand every reader's notes to on_note(now, note, velocity, source); return how many."""
+        total = 0
+        for reader in self.readers:
+            n = reader.deliver(on_note, now)
+            if n:
+                source = reader.source
+                last = self._last[source]
+                if last is not None:
+                    # More than ~3 days apart and ticks_diff() wraps negative; that's
+                    # no more a part of the session than any other long gap.
+                    gap = ticks_diff(now, last)
+                    if 0 < gap < self._session_timeout_ms:
+                        self.played_ms[source] += gap
+                self._last[source] = now
+                self.notes[source] += n
+                total += n
+        return total
+
+    def stats(self):
+        lines = []
+        for source in range(self._max_inputs):
+            if self.names[source] is not None:
+                gone = "" if self._open[source] else " (unplugged)"
+                lines.append(f"input {source} {self.names[source]}{gone}: {self.notes[source]} notes, "
+                             f"{self.played_ms[source] // 1000} s played")
+        return "\n".join(lines)
+
+
+# ------------------------------------------------------------------------------
+
+class _CannedDevice:
+    """Serves 'notes' NoteOns per read, forever, 5 ms apart in 'clock' time."""
+    def __init__(self, vendor, notes, clock):
+        self.idVendor = vendor
+        self.idProduct = 1
+        self._notes = notes
+        self._clock = clock
+        self.reads = 0
+    def read(self, endpoint, buf, timeout):
+        self.reads += 1
+        self._clock[0] += 1
+        for i in range(self._notes):
+            buf[i*4:i*4+4] = bytes((0x09, 0x90, 60 + i, 64))
+        return self._notes * 4
+
+def test():
+    import midi_reader
+
+    now = [0]
+    inputs = MidiInputs(4, 15_000, reads_per_turn=2)
+    # A flood - a full transfer every read - and a quiet one, with just a note per read.
+    flood = midi_reader.FastMidiReader(_CannedDevice(0x1111, 16, now), 0x81)
+    quiet = midi_reader.FastMidiReader(_CannedDevice(0x2222, 1, now), 0x81)
+    inputs.add(flood, "flood")
+    inputs.add(quiet, "quiet")
+
+    got = [0, 0]
+    def on_note(t, note, velocity, source):
+        got[source] += 1
+    for round in range(100):
+        inputs.fill()
+        inputs.deliver(on_note, now[0])
+
+    # Both got their turns - 2 reads per round each - however much the flood sent.
+    assert flood.device.reads == quiet.device.reads == 200, (flood.device.reads, quiet.device.reads)
+    assert got == [3200, 200], got
+    assert inputs.notes == [3200, 200, 0, 0]
+    assert inputs.played_ms[0] == inputs.played_ms[1] == now[0] - 4, (inputs.played_ms, now)
+
+    # Unplug the flood; a new one gets a new slot, and the flood its old one back, totals and all.
+    inputs.remove(flood)
+    assert inputs.add(midi_reader.FastMidiReader(_CannedDevice(0x3333, 2, now), 0x81), "new") == 2
+    assert inputs.add(flood, "flood") == 0 and inputs.notes[0] == 3200
+
+    # Two of the same model, on different ports: two inputs.
+    twins = MidiInputs(4, 15_000)
+    assert twins.add(flood, "Synth", (1, (1,))) == 0
+    assert twins.add(quiet, "Synth", (1, (2,))) == 1
+
+    # More than max_inputs: the extra ones are turned away, not a crash.
+    full = MidiInputs(2, 15_000)
+    readers = [midi_reader.FastMidiReader(_CannedDevice(0x4000 + i, 1, now), 0x81) for i in range(3)]
+    assert [full.add(r, f"keyboard {i}") for i, r in enumerate(readers)] == [0, 1, None]
+    assert full.readers == readers[:2] and full.room() == 0 and not full.has_room()
+
+    # Four days later (the ticks wrap at 2**29 ms), a note: no time added for the gap.
+    ignore = lambda t, note, velocity, source: None
+    inputs.fill()
+    inputs.deliver(ignore, now[0])
+    played = inputs.played_ms[0]
+    inputs.fill()
+    inputs.deliver(ignore, (now[0] + 4 * 24 * 3600_000) % (1 << 29))
+    assert inputs.played_ms[0] == played, inputs.played_ms
+    print(inputs.stats())
+    print("MidiInputs OK")
+
+# test()
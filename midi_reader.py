@@ -0,0 +1,441 @@
+'''
+Fast-path USB MIDI reader.
+
+adafruit_midi builds a full message object (NoteOn, ControlChange, PitchBend...)
+for every incoming message, and we throw nearly all of them away. This reads the
+raw 4-byte USB-MIDI event packets straight off the endpoint into a preallocated
+buffer, and only hands back NoteOn events (velocity > 0), as plain ints.
+
+Create it from an adafruit_usb_host_midi.MIDI object (which has already found the
+MIDI interface and endpoint for us) and call read(); it returns the number of notes
+stored in the 'notes' and 'velocities' arrays.
+
+Or, to clear a whole burst (a chord, the pedal, aftertouch...) in one go: fill() reads
+transfer after transfer, for as long as the device has any, into a fixed-size ring of
+NoteOns; then deliver() hands the lot to the tracker, all with the one timestamp.
+The ring counts how full it got, and anything that didn't fit.
+
+Keyboards send plenty we don't want: Active Sensing every 300 ms, MIDI Clock 24 times
+a beat, SysEx dumps. That all gets thrown out at the packet level, first thing, before
+anything else looks at it - and counted, per kind, in 'filtered' (FILTERED_*), so we
+can see how much of what comes in is noise. Counting can be turned off (counting=False)
+to save the increments on the hot path.
+
+Which kinds get dropped is up to the caller: 'drop' is a mask of DROP_* bits, all of
+them by default. A kind that's not in it goes to on_message(status, data_1, data_2)
+instead - the clock, say, for the tempo, or channel messages for the pedal. (That's
+for whole packets; a device streaming raw bytes one to a packet only gets its NoteOns
+through.)
+'''
+
+try:
+    from usb.core import USBTimeoutError
+except ImportError:
+    # No USB host support (benchmarking on a PC, say).
+    USBTimeoutError = OSError
+
+
+# One USB full-speed bulk transfer is at most 64 bytes = 16 event packets.
+PACKET_BUFFER_SIZE = 64
+MAX_NOTES = PACKET_BUFFER_SIZE // 4
+
+# NoteOns fill() can queue up; a power of 2. Four full transfers.
+RING_SIZE = 64
+RING_MASK = RING_SIZE - 1
+
+# Timeout for the reads after the first one in a fill(): just see if there's more.
+FOLLOW_UP_TIMEOUT_MS = 1
+
+# Code Index Numbers (low nibble of the first byte of each USB-MIDI packet).
+CIN_SYSEX_START = 0x4 # 0x4 to 0x7 are SysEx (0x5 can also be a one-byte system common)
+CIN_NOTE_ON = 0x9
+CIN_SINGLE_BYTE = 0xF
+
+# What gets filtered out, counted separately.
+FILTERED_CLOCK = 0          # 0xF8
+FILTERED_ACTIVE_SENSING = 1 # 0xFE
+FILTERED_REALTIME = 2       # the other realtime bytes: start, stop, continue, reset
+FILTERED_SYSEX = 3
+FILTERED_SYSTEM_COMMON = 4  # song position, MTC quarter frames...
+FILTERED_CHANNEL = 5        # everything on a channel but NoteOn: note offs, CCs, pedal, pitch bend...
+FILTERED_NAMES = ("clock", "active sensing", "realtime", "sysex", "system common", "channel")
+
+# For 'drop': which of those to throw away.
+DROP_CLOCK = 1 << FILTERED_CLOCK
+DROP_ACTIVE_SENSING = 1 << FILTERED_ACTIVE_SENSING
+DROP_REALTIME = 1 << FILTERED_REALTIME
+DROP_SYSEX = 1 << FILTERED_SYSEX
+DROP_SYSTEM_COMMON = 1 << FILTERED_SYSTEM_COMMON
+DROP_CHANNEL = 1 << FILTERED_CHANNEL
+DROP_ALL = (1 << len(FILTERED_NAMES)) - 1
+
+# Realtime byte - 0xF8 -> FILTERED_*.
+_REALTIME_CLASS = bytes((FILTERED_CLOCK, FILTERED_REALTIME, FILTERED_REALTIME, FILTERED_REALTIME,
+                         FILTERED_REALTIME, FILTERED_REALTIME, FILTERED_ACTIVE_SENSING, FILTERED_REALTIME))
+
+
+class FastMidiReader:
+
+    def __init__(self, device, endpoint, timeout_ms=100, counting=True, drop=DROP_ALL, on_message=None):
+        """
+        device is a usb.core.Device, endpoint its MIDI IN endpoint address.
+        timeout_ms is how long a read() will wait for data.
+        counting False means don't count what gets filtered out.
+        drop is the DROP_* kinds to filter out; the others go to on_message(status, data_1, data_2).
+        """
+        self.device = device
+        self._endpoint = endpoint
+        self.timeout_ms = timeout_ms
+
+        # Which input this is, when there's more than one; deliver() passes it on.
+        self.source = 0
+
+        self._buf = bytearray(PACKET_BUFFER_SIZE)
+
+        # The results of the last read().
+        self.notes = bytearray(MAX_NOTES)
+        self.velocities = bytearray(MAX_NOTES)
+
+        # Running status, for devices that stream raw MIDI bytes in single-byte packets.
+        self._status = 0
+        self._data_1 = -1
+
+        self.packets = 0
+        self.counting = counting
+        self.set_drop(drop, on_message)
+        self.filtered = [0] * len(FILTERED_NAMES)
+
+        # What fill() has queued up, for deliver().
+        self.ring_notes = bytearray(RING_SIZE)
+        self.ring_velocities = bytearray(RING_SIZE)
+        self._head = 0
+        self._tail = 0
+        self.queued = 0
+
+        # Most NoteOns ever queued at once; fills cut short because the ring was too full
+        # for another transfer (the rest waits on the device); NoteOns that didn't fit at all.
+        self.high_water = 0
+        self.ring_full = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_host_midi(cls, raw_midi, timeout_ms=100, counting=True, drop=DROP_ALL, on_message=None):
+        """Make a reader for the device an adafruit_usb_host_midi.MIDI has already opened."""
+        return cls(raw_midi.device, raw_midi.in_ep, timeout_ms, counting, drop, on_message)
+
+    def set_drop(self, drop, on_message=None):
+        """Change which kinds get dropped (DROP_*); on_message gets the rest."""
+        if drop != DROP_ALL and on_message is None:
+            raise ValueError("FastMidiReader: nothing to pass the undropped messages to")
+        # The kinds to keep, as a mask; 0, the usual, and the decoder never looks further.
+        self._keep = DROP_ALL & ~drop
+        self.on_message = on_message
+
+    def read(self):
+        """Read one USB transfer; return the number of NoteOns now in self.notes/self.velocities.
+        Will raise usb.core.USBError if the device has gone away."""
+        try:
+            n = self.device.read(self._endpoint, self._buf, self.timeout_ms)
+        except USBTimeoutError:
+            return 0
+        return self.decode(self._buf, n)
+
+    def fill(self, max_reads=4):
+        """Read transfers into the ring until the device has nothing more, or we've done max_reads,
+        or there isn't room for another. The first read waits up to timeout_ms, the rest hardly at all.
+        Return the number of NoteOns queued. Will raise usb.core.USBError if the device has gone away."""
+        timeout = self.timeout_ms
+        for _ in range(max_reads):
+            if RING_SIZE - self.queued < MAX_NOTES:
+                self.ring_full += 1
+                break
+            try:
+                n = self.device.read(self._endpoint, self._buf, timeout)
+            except USBTimeoutError:
+                break
+            if n == 0:
+                break
+            self._push(self.decode(self._buf, n))
+            timeout = FOLLOW_UP_TIMEOUT_MS
+        return self.queued
+
+    def _push(self, count):
+        notes = self.notes
+        velocities = self.velocities
+        ring_notes = self.ring_notes
+        ring_velocities = self.ring_velocities
+        tail = self._tail
+        for i in range(count):
+            if self.queued == RING_SIZE:
+                self.dropped += count - i
+                break
+            ring_notes[tail] = notes[i]
+            ring_velocities[tail] = velocities[i]
+            tail = (tail + 1) & RING_MASK
+            self.queued += 1
+        self._tail = tail
+        if self.queued > self.high_water:
+            self.high_water = self.queued
+
+    def deliver(self, on_note, now):
+        """Hand each queued NoteOn to on_note(now, note, velocity, source), oldest first, and empty the ring.
+        source is ours - which input it came from, when there's more than one (see midi_inputs).
+        Return how many there were."""
+        ring_notes = self.ring_notes
+        ring_velocities = self.ring_velocities
+        head = self._head
+        count = self.queued
+        source = self.source
+        for _ in range(count):
+            on_note(now, ring_notes[head], ring_velocities[head], source)
+            head = (head + 1) & RING_MASK
+        self._head = head
+        self.queued = 0
+        return count
+
+    def stats(self):
+        filtered = ", ".join(f"{name} {count}" for name, count in zip(FILTERED_NAMES, self.filtered) if count)
+        return (f"reader: {self.packets} packets, ring high water {self.high_water}/{RING_SIZE}, "
+                f"{self.ring_full} fills cut short, {self.dropped} notes dropped; filtered out: {filtered or 'nothing'}")
+
+    def decode(self, buf, n):
+        """Decode n bytes of USB-MIDI event packets from buf. Return the number of NoteOns found."""
+        notes = self.notes
+        velocities = self.velocities
+        filtered = self.filtered
+        counting = self.counting
+        keep = self._keep
+        count = 0
+        i = 0
+        while i + 4 <= n:
+            cin = buf[i] & 0x0F
+            if cin == CIN_NOTE_ON:
+                status = buf[i+1]
+                self._status = status
+                self._data_1 = -1
+                if status & 0xF0 == 0x90 and buf[i+3] > 0:
+                    notes[count] = buf[i+2]
+                    velocities[count] = buf[i+3]
+                    count += 1
+                elif keep & DROP_CHANNEL:
+                    self.on_message(status, buf[i+2], buf[i+3])
+                elif counting:
+                    filtered[FILTERED_CHANNEL] += 1
+            elif cin == CIN_SINGLE_BYTE and buf[i+1] >= 0xF8:
+                # Realtime - clock, active sensing... - the most common thing we throw away.
+                # It doesn't disturb running status, so it just goes.
+                kind = _REALTIME_CLASS[buf[i+1] - 0xF8]
+                if keep and keep & (1 << kind):
+                    self.on_message(buf[i+1], 0, 0)
+                elif counting:
+                    filtered[kind] += 1
+            elif cin >= 0x8:
+                if cin == CIN_SINGLE_BYTE:
+                    if self._feed_byte(buf[i+1]):
+                        notes[count] = self._data_1
+                        velocities[count] = buf[i+1]
+                        self._data_1 = -1
+                        count += 1
+                else:
+                    # Some other channel message (CC, aftertouch, pitch bend...).
+                    self._status = buf[i+1]
+                    self._data_1 = -1
+                    if keep & DROP_CHANNEL:
+                        self.on_message(buf[i+1], buf[i+2], buf[i+3])
+                    elif counting:
+                        filtered[FILTERED_CHANNEL] += 1
+            elif cin >= 0x2:
+                # System common or SysEx; either one cancels running status.
+                # (Kept SysEx comes a packet - up to 3 bytes of it - at a time.)
+                self._status = 0
+                kind = FILTERED_SYSEX if cin >= CIN_SYSEX_START else FILTERED_SYSTEM_COMMON
+                if keep and keep & (1 << kind):
+                    self.on_message(buf[i+1], buf[i+2], buf[i+3])
+                elif counting:
+                    filtered[kind] += 1
+            # CIN 0 and 1 are reserved; skip them (and all-zero padding).
+            i += 4
+            self.packets += 1
+        return count
+
+    def _feed_byte(self, b):
+        """Handle a single streamed MIDI byte. Return True if it completes a NoteOn with velocity > 0."""
+        # (Realtime bytes never get here; decode() filters them out.)
+        if b >= 0x80:
+            # New status byte; only channel messages set running status.
+            self._status = b if b < 0xF0 else 0
+            self._data_1 = -1
+            return False
+        if self._status & 0xF0 != 0x90:
+            return False
+        if self._data_1 < 0:
+            self._data_1 = b
+            return False
+        if b == 0:
+            # Zero-velocity NoteOn is really a NoteOff.
+            self._data_1 = -1
+            return False
+        return True
+
+
+# ------------------------------------------------------------------------------
+
+class _CannedDevice:
+    """Pretends to be a usb.core.Device, serving the same block of packets (one transfer's worth) forever."""
+    def __init__(self, packets):
+        assert len(packets) <= PACKET_BUFFER_SIZE
+        self._packets = packets
+        self._filled = None
+    def read(self, endpoint, buf, timeout):
+        # Only copy once, so the copy doesn't count against the reader's allocations.
+        if buf is not self._filled:
+            buf[0:len(self._packets)] = self._packets
+            self._filled = buf
+        return len(self._packets)
+
+class _CannedStream:
+    """Pretends to be an adafruit_usb_host_midi.MIDI, serving the same raw MIDI bytes forever."""
+    def __init__(self, data):
+        self._data = data
+        self._pos = 0
+    def read(self, size):
+        data = self._data
+        if self._pos >= len(data):
+            self._pos = 0
+        result = data[self._pos:self._pos+size]
+        self._pos += len(result)
+        return result
+
+def _busy_keyboard_packets():
+    """A typical burst: a 3-note chord, sustain pedal, aftertouch, active sensing, note-offs."""
+    packets = bytearray()
+    for note in (60, 64, 67):
+        packets += bytes((0x09, 0x90, note, 80))
+    packets += bytes((0x0B, 0xB0, 64, 127))
+    packets += bytes((0x0D, 0xD0, 40, 0))
+    packets += bytes((0x0F, 0xFE, 0, 0))
+    packets += bytes((0x0E, 0xE0, 0, 64))
+    for note in (60, 64, 67):
+        packets += bytes((0x09, 0x90, note, 0))
+    packets += bytes((0x0B, 0xB0, 64, 0))
+    return bytes(packets)
+
+def _clock_keyboard_packets():
+    """A keyboard sending MIDI Clock: a third of a beat's worth of clocks, active sensing, a short
+    SysEx, a song position, and just two NoteOns (and their note-offs) in among it all.
+    One full transfer."""
+    packets = bytearray()
+    for tick in range(8):
+        packets += bytes((0x0F, 0xF8, 0, 0))
+        if tick == 2:
+            packets += bytes((0x09, 0x90, 60, 80)) + bytes((0x09, 0x90, 64, 80))
+        if tick == 6:
+            packets += bytes((0x09, 0x90, 60, 0)) + bytes((0x09, 0x90, 64, 0))
+    packets += bytes((0x0F, 0xFE, 0, 0))
+    packets += bytes((0x04, 0xF0, 0x41, 0x10)) + bytes((0x07, 0x42, 0x12, 0xF7))
+    packets += bytes((0x03, 0xF2, 0, 8))
+    return bytes(packets)
+
+def _midi_bytes(packets):
+    """The same messages as plain MIDI bytes, as adafruit_usb_host_midi would hand them over."""
+    lengths = (0, 0, 2, 3, 3, 1, 2, 3, 3, 3, 3, 3, 2, 2, 3, 1)
+    out = bytearray()
+    for i in range(0, len(packets), 4):
+        out += packets[i+1:i+1+lengths[packets[i] & 0x0F]]
+    return bytes(out)
+
+def benchmark(iterations=2000):
+    """Messages/second and bytes allocated per message: this reader vs. adafruit_midi, on a busy
+    keyboard and on one that sends MIDI Clock (where nearly everything gets filtered out)."""
+    import bench_util
+
+    try:
+        import adafruit_midi
+        from adafruit_midi.note_on import NoteOn
+    except ImportError:
+        print("adafruit_midi not available; skipping comparison")
+        adafruit_midi = None
+
+    results = []
+    for stream, packets in (("", _busy_keyboard_packets()), (" clock", _clock_keyboard_packets())):
+        messages = len(packets) // 4
+
+        reader = FastMidiReader(_CannedDevice(packets), 0x81)
+        elapsed = bench_util.time_per_call(reader.read, iterations) * iterations
+        allocated = bench_util.bytes_allocated(reader.read, iterations)
+        results.append(bench_util.report("FastMidiReader" + stream, messages * iterations, elapsed, allocated))
+        if stream:
+            print("  " + reader.stats())
+        else:
+            # Four transfers per fill(), then the NoteOns out to a do-nothing tracker.
+            def on_note(now, note, velocity, source):
+                pass
+            def fill_deliver():
+                reader.fill(4)
+                reader.deliver(on_note, 0)
+            elapsed = bench_util.time_per_call(fill_deliver, iterations) * iterations
+            allocated = bench_util.bytes_allocated(fill_deliver, iterations)
+            results.append(bench_util.report("FastMidiReader.fill", messages * 4 * iterations, elapsed, allocated))
+
+        if adafruit_midi is None:
+            continue
+        midi = adafruit_midi.MIDI(midi_in=_CannedStream(_midi_bytes(packets)), in_buf_size=64)
+        def receive_all():
+            for _ in range(messages):
+                msg = midi.receive()
+                if isinstance(msg, NoteOn) and msg.velocity > 0:
+                    pass
+        elapsed = bench_util.time_per_call(receive_all, iterations) * iterations
+        allocated = bench_util.bytes_allocated(receive_all, iterations)
+        results.append(bench_util.report("adafruit_midi.receive" + stream, messages * iterations, elapsed, allocated))
+    return results
+
+def test():
+    reader = FastMidiReader(_CannedDevice(_busy_keyboard_packets()), 0x81)
+    n = reader.read()
+    print(f"{n} notes: {list(reader.notes[:n])}, {list(reader.velocities[:n])}")
+    assert list(reader.notes[:n]) == [60, 64, 67]
+
+    # Running status, streamed a byte at a time, with a realtime byte in the middle.
+    stream = bytearray()
+    for b in (0x90, 60, 100, 62, 0xF8, 101, 64, 0, 0x80, 60, 0, 65, 90):
+        stream += bytes((0x0F, b, 0, 0))
+    n = reader.decode(stream, len(stream))
+    print(f"{n} notes: {list(reader.notes[:n])}, {list(reader.velocities[:n])}")
+    assert list(reader.notes[:n]) == [60, 62]
+
+    # The clock-sending keyboard: just the two notes get through; everything else is counted.
+    reader = FastMidiReader(_CannedDevice(_clock_keyboard_packets()), 0x81)
+    n = reader.read()
+    assert list(reader.notes[:n]) == [60, 64], list(reader.notes[:n])
+    assert reader.filtered == [8, 1, 0, 2, 1, 2], reader.filtered
+    print(reader.stats())
+
+    # Keep the clock and the channel messages: they go to on_message, not the counts.
+    kept = []
+    reader = FastMidiReader(_CannedDevice(_clock_keyboard_packets()), 0x81,
+                            drop=DROP_ALL & ~(DROP_CLOCK | DROP_CHANNEL),
+                            on_message=lambda status, data_1, data_2: kept.append(status))
+    n = reader.read()
+    assert list(reader.notes[:n]) == [60, 64]
+    assert kept == [0xF8] * 7 + [0x90, 0x90] + [0xF8], kept
+    assert reader.filtered == [0, 1, 0, 2, 1, 0], reader.filtered
+    reader = FastMidiReader(_CannedDevice(_busy_keyboard_packets()), 0x81)
+
+    # The ring: three notes per transfer, 4 transfers per fill; round and round it.
+    got = []
+    def on_note(now, note, velocity, source):
+        got.append(note)
+    for i in range(20):
+        assert reader.fill(4) == 12
+        assert reader.deliver(on_note, i) == 12 and reader.queued == 0
+    assert got == [60, 64, 67] * 80
+    # Without deliver(), it fills up and stops reading - and drops nothing.
+    for i in range(10):
+        reader.fill(4)
+    # (It stops once a full transfer - 16 NoteOns - might not fit.)
+    assert reader.queued == 51 and reader.ring_full > 0 and reader.dropped == 0, reader.stats()
+    print(reader.stats())
+
+# test()
+# benchmark()
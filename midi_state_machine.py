@@ -5,7 +5,7 @@ call 'note()' method with each new note;
 if the sequence is completed, note() will return true.
 '''
 
-import time
+from adafruit_ticks import ticks_ms
 
 
 class midi_state_machine:
@@ -41,7 +41,7 @@ class midi_state_machine:
             if new_note == self.note_list_[0]:
                 self.debug_print("  Note is first in sequence")
                 self._last_hit = 0
-                self._first_hit_time = time.monotonic()
+                self._first_hit_time = ticks_ms()
                 return False
 
             self.debug_print("  Next is NOT in sequence")
@@ -55,7 +55,7 @@ class midi_state_machine:
 
         # Keep track of time of first hit.
         if self._last_hit == 0:
-            self._first_hit_time = time.monotonic()
+            self._first_hit_time = ticks_ms()
 
         if self._last_hit < len(self.note_list_) - 1:
             self.debug_print("  Not at end of list yet ")
@@ -66,6 +66,7 @@ class midi_state_machine:
         return True
 
     def get_seq_start_time(self):
+        """When the first note of the sequence came in, in adafruit_ticks.ticks_ms() milliseconds."""
         return self._first_hit_time
 
     
@@ -20,65 +20,103 @@ To force startup mode,
 
 """
 
+# First, so it times everything else; see boot_profile.
+import boot_profile
+profile_ = boot_profile.BootProfile()
+
 # stdlibs
-import time
+import asyncio
 
 import board
 import microcontroller
 import neopixel
 import supervisor
-import usb.core
-
-# adafruit libs
-import adafruit_datetime as datetime
-import adafruit_midi
-import adafruit_midi.midi_message
-
-# FIXME: this seems clunky. can't we do this more succinctly?
-from adafruit_midi.control_change import ControlChange
-from adafruit_midi.note_off import NoteOff
-from adafruit_midi.note_on import NoteOn
-from adafruit_midi.pitch_bend import PitchBend
-
-import adafruit_usb_host_midi
 
 # Our libs
 
-# Which display are we using?
-# import one_line_oled
-# import two_line_oled
-import tft_144_display
+# The display: one of the OLEDs, if one's on I2C, else the TFT on these pins.
+import display_base
 
 PIN_TFT_CS = board.D5
 PIN_TFT_DC = board.D6
 PIN_TFT_RESET = board.D9
 
-import midi_state_machine
+import checkpoint
+import hms_format
+import midi_discovery
+import midi_inputs
 import midibit_defines as DEF
+import practice_tracker
+import read_pacer
+import render_layer
+import session_clock
+from status_channel import PRIORITY_INFO
+
+# (practice_journal or nvm_store: make_store() imports whichever one we need.)
+
+profile_.mark("imports")
+
 
+# How long one read of the MIDI device may block, in milliseconds.
+# This blocks every other task, so keep it short.
+MIDI_READ_TIMEOUT_MS = 2
 
-# TODO: how does this affect responsiveness? buffering? what-all??
-MIDI_TIMEOUT = .1
+# While notes are coming in, read up to MIDI_DRAIN_READS transfers in a row (whatever the
+# device has) before letting the other tasks go; once nothing's been played for MIDI_ACTIVE_HOLD seconds, back off,
+# sleeping between reads, from MIDI_IDLE_WAIT_MIN_MS up to MIDI_IDLE_WAIT_MAX_MS. (See read_pacer.)
+MIDI_DRAIN_READS = 4
+MIDI_ACTIVE_HOLD = 2
+MIDI_IDLE_WAIT_MIN_MS = 5
+MIDI_IDLE_WAIT_MAX_MS = 100
+
+# Read up to MIDI_MAX_INPUTS keyboards at once (see midi_inputs); while there's room for
+# another, look for one every MIDI_RESCAN_INTERVAL seconds.
+MIDI_MAX_INPUTS = 4
+MIDI_RESCAN_INTERVAL = 5
+
+# How often the session, display and LED tasks wake up, in seconds.
+SESSION_TICK = .1
+DISPLAY_TICK = .1
+LED_TICK = 1
+
+# Most screen refreshes per second. Fields that haven't changed aren't redrawn at all.
+RENDER_FPS = 5
+
+# How often to log ingest and render statistics, in seconds.
+REPORT_INTERVAL = 60
 
 # Timeouts, in seconds.
 # Defaults will be changed if dev mode
 SESSION_TIMEOUT = 15
 DISPLAY_IDLE_TIMEOUT = 60 # for display blanking
 
+# Save the totals part-way through a session: every CHECKPOINT_INTERVAL seconds, or
+# once CHECKPOINT_DELTA seconds of unsaved time have built up, whichever comes first,
+# but never within CHECKPOINT_MIN_GAP seconds of the last save.
+CHECKPOINT_INTERVAL = 10 * 60
+CHECKPOINT_DELTA = 2 * 60
+CHECKPOINT_MIN_GAP = 30
+CHECKPOINT_TICK = 1
+
+# Where the totals used to be kept; read once, if there's no journal yet.
 SETTINGS_NAME = "pm_settings.text"
 
-# Keyboard "attention" sequence MIDI notes: G G G Eb F F F D
-MIDI_TRIGGER_SEQ_PREFIX = (67, 67, 67, 63, 65, 65, 65, 62)
-MIDI_TRIGGER_SEQ_RESET = MIDI_TRIGGER_SEQ_PREFIX + (60,) # middle C
-MIDI_TRIGGER_SEQ_TOGGLE_BOOT = MIDI_TRIGGER_SEQ_PREFIX + (62,) # D above middle C
-# MIDI_TRIGGER_SEQ_TEST = MIDI_TRIGGER_SEQ_PREFIX + (64,) # E
-MIDI_TRIGGER_SEQ_TOGGLE_PRAC_PLAY = MIDI_TRIGGER_SEQ_PREFIX + (65,) # F
+# Where to keep the totals in run mode: "journal" (files on CIRCUITPY) or "nvm".
+# Dev mode always uses NVM, since CircuitPython can't write the drive then;
+# so dev-mode totals are kept apart from the real ones.
+STORE_BACKEND = "journal"
+
+
+# The one PracticeTracker, once main() has made it; for poking at from the REPL, or the simulator.
+tracker_ = None
 
+# The MIDI devices we're reading; main() makes it.
+midi_inputs_ = None
 
 neopixel_ = neopixel.NeoPixel(board.NEOPIXEL, 1)
-def flash_led(seconds):
+async def flash_led(seconds):
     neopixel_.fill(flash_color_)
-    time.sleep(seconds)
+    await asyncio.sleep(seconds)
     neopixel_.fill((0,0,0))
 
 def set_run_or_dev():
@@ -109,400 +147,286 @@ def set_run_or_dev():
         print(f"\nRUN MODE")
     return is_dev_mode
 
-SPINNER = "|/-\\"
-spinner_index_ = 0
-def spin():
-    '''Return the next wiggling text characater.'''
-    global spinner_index_
-    spinner_index_ = (spinner_index_+1) % len(SPINNER)
-    return SPINNER[spinner_index_]
-
-def as_hms(seconds):
-    return str(datetime.timedelta(0, int(seconds)))
-
-def show_total_time(disp, prac_seconds, play_seconds):
-    """Display the practice and play totals."""
-    disp.set_text_1(as_hms(prac_seconds))
-    disp.set_text_2(as_hms(play_seconds))
-
-def write_session_data(practice_seconds, play_seconds):
-    '''Write a string-ified version of the integer value.
-    This will throw an exception if the filesystem isn't writable. Catch it higher up.'''
-
-    print(f"write_session_data: {int(practice_seconds)=}, {int(play_seconds)=}")
-    with open(SETTINGS_NAME, "w") as f:
-        f.write(str(int(practice_seconds)) + "\n")
-        f.write(str(int(play_seconds)))
-
-
-def read_session_data():
-    """Return old (practice,play) values."""
-
-    try:
-        with open(SETTINGS_NAME, "r") as f:
-            r1 = f.readline()
-            r2 = f.readline()
-    except:
-        print("No old session data? Continuing....")
-
-    if len(r1) == 0:
-        practice = 0
-    else:
-        practice = int(r1.strip())
-    play = int(r2)
-
-    print(f"read_session_data: returning ({practice=}, {play=})")
-    return practice, play
-
-def find_midi_device(disp):
-    """Does not return until it finds a (suitable?) MIDI device"""
-
-    # does this help weird startup behavior? No,
-    # time.sleep(1)
+async def find_midi_device(tracker, disp, finder):
+    """Does not return until it finds a MIDI device"""
 
     print("\nLooking for MIDI devices...")
 
-    # display_message_for_a_bit(disp, "Looking for MIDI", delay=1)
     disp.set_text_status("Looking for MIDI....")
 
-    raw_midi = None
-    attempt = 1
-    
-    no_midi_idle_start_time = time.monotonic()
-
-    while raw_midi is None:
-        all_devices = usb.core.find(find_all=True)
-        
-        #  no can do 
-        # print(f"  Found {len(all_devices)} devices?")
-
-        for device in all_devices:
-            
-            # FIXME: this is not useful?
-            print(f" - looking at USB device vendor 0x{device.idVendor:04x}, product 0x{device.idProduct:04x}") 
-
-            # I guess this is how we find a MIDI device: try it; if not MIDI, will throw exception.
-            try:
-                raw_midi = adafruit_usb_host_midi.MIDI(device, timeout=MIDI_TIMEOUT)
-                print(f" ^ MIDI OK for {device.product=}")
-                if device.product is None:
-                    print("FUNNY DEVICE; SKIPPING!")
-                    continue
-                else:
-                   break
-
-            except ValueError:
-                print(" * adafruit_usb_host_midi.MIDI: ValueError?")
-                continue
-            except Exception as e:
-                    print(f" * adafruit_usb_host_midi.MIDI: {e}")
+    # For the no-MIDI idle timeout; see display_task and led_task.
+    tracker.wake_up()
 
-        print(f"  Done iterating MIDI devices, found {raw_midi}")
-
-        # Looked at all devices, didn't find MIDI. Try again.
-        if raw_midi is None:
-
-            print(f"No MIDI device found on try #{attempt}. Sleeping....")
-            time.sleep(1)
-
-            # No-MIDI timeout; flash LED twice
-            if time.monotonic() - no_midi_idle_start_time > DISPLAY_IDLE_TIMEOUT:
-                # print("no-MIDI idle timeout!")
-                disp.blank_screen()
-                flash_led(0.01)
-                time.sleep(0.1)
-                flash_led(0.01)
-
-            attempt += 1
+    while True:
+        midi_device = finder.scan()
+        if midi_device is not None:
+            break
 
-    try:
-        midi_device = adafruit_midi.MIDI(midi_in=raw_midi)
-    except Exception as e:
-        print(f" * adafruit_midi.MIDI: {e}")
+        # Nothing there. Look again in a bit - a longer bit each time.
+        print(f"No MIDI device found on try #{finder.scans}. Sleeping {finder.wait_ms} ms....")
+        await asyncio.sleep(finder.wait_ms / 1000)
 
     print(f"  returning {midi_device=}")
-    disp.set_text_status(f"Found {raw_midi}")
+    disp.set_text_status(finder.found_text())
     return midi_device
 
 
-def try_write_session_data(dev_mode, disp, prac, play):
-    '''Write the given elapsed time to the data file. Display errors as needed.'''
-    try:
-        write_session_data(prac, play)
-        display_message_for_a_bit(disp, "DATA SAVED")
-
-    except Exception as e:
-
-        # we expect write errors in dev mode.
-        if dev_mode:
-            print("Can't write, as expected in dev mode.")
-            display_message_for_a_bit(disp, "FAILED TO SAVE - OK", delay=5)
-        else:
-            print(f"Can't write! {e}")
-            display_message_for_a_bit(disp, "FAILED TO SAVE!", delay=5)
-
-
-def toggle_boot_mode(disp):
+async def reconnect(finder, reader, disp, clock):
+    """After a USB error: if the device is still there, keep using it - a few tries,
+    a little apart. Return True if that worked; False means it's really gone."""
+    finder.lost(clock.now())
+    for wait_ms in midi_discovery.RECONNECT_WAITS_MS:
+        if not finder.still_there(reader.device):
+            return False
+        await asyncio.sleep(wait_ms / 1000)
+        if finder.retry(reader):
+            disp.set_text_status(finder.reconnect_text(), 2, PRIORITY_INFO)
+            return True
+    return False
+
+
+def make_store(dev_mode):
+    '''The journal or the NVM store, per STORE_BACKEND and the mode we're in.'''
+    if dev_mode or STORE_BACKEND == "nvm":
+        print("Keeping totals in NVM")
+        import nvm_store
+        return nvm_store.NVMStore(microcontroller.nvm)
+    import practice_journal
+    return practice_journal.PracticeJournal(legacy_name=SETTINGS_NAME)
+
+def toggle_boot_mode():
+    '''Flip the run/dev byte in NVM, for next boot. Return what to show.'''
     nvm_dev_mode = microcontroller.nvm[0] == DEF.MAGIC_NUMBER_DEV_MODE
     nvm_dev_mode = not nvm_dev_mode
     microcontroller.nvm[0] = DEF.MAGIC_NUMBER_DEV_MODE if nvm_dev_mode else DEF.MAGIC_NUMBER_RUN_MODE
     print(f"Setting {microcontroller.nvm[0]=} -> {nvm_dev_mode=}")
-    display_message_for_a_bit(disp, f"Dev: {nvm_dev_mode}")
+    return f"Dev: {nvm_dev_mode}"
 
-def display_message_for_a_bit(disp, text, delay=2):
-    disp.set_text_status(str(text))
-    time.sleep(delay)
-    disp.set_text_status("")
 
-
-
-# ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
+# The tasks. Each one must await regularly, and never time.sleep(), so none of them
+# holds up the others - in particular, so we never stop reading MIDI.
+# The tracker does the actual work; these just feed it.
+
+async def midi_ingest_task(tracker, display, finder, inputs, pacer, clock):
+    """Find a MIDI device, then read notes from it - and any others that turn up - forever.
+    finder finds them; inputs reads them, in turns; pacer says how long to wait between reads."""
+
+    # The worst-case time between finishing one read and starting the next, when we
+    # meant to read again straight away. A note that arrives in that gap waits this long
+    # (plus the read timeout) to be seen.
+    worst_gap_ms = 0
+    reads = 0
+    report_time = clock.now()
+    rescan_time = clock.now()
+    last_read = clock.now()
 
-def main():
-
-    # NEW: are we in 'practice' mode, as opposed to 'play' mode?
-    practice_not_play_mode = True
-
-    # turn off auto-reload, cuz it's a pain
-    supervisor.runtime.autoreload = False
-    print(f"{supervisor.runtime.autoreload=}")
-
-    # Are we running in dev mode? Set some stuff.
-    in_dev_mode = set_run_or_dev()
-
-    # Load previous total time from text file.
-    total_seconds_prac, total_seconds_play = read_session_data()
-    print(f"read_session_data: {total_seconds_prac=}, {total_seconds_play=}")
-
-
-    # The display.
-    # FIXME: exeption?
-    display = None
-    display = tft_144_display.TFT144Display(PIN_TFT_CS, PIN_TFT_DC, PIN_TFT_RESET)
-    print("Created TFT display")
-    if display == None:
-        print("Can't init display??")
-        return
-
-    # display.set_text_status("This still yet another test that should wrap.")
-    # time.sleep(4)
-
-    display.set_display_practice_mode(practice_not_play_mode)
-    
-
-    last_event_time = time.monotonic()
-    in_session = False
-    session_start_time = 0
-
-    show_total_time(display, total_seconds_prac, total_seconds_play)
-
-    # last_displayed_time is the (integer) time we last displayed; only update if changed.
-    # (The time itself is a float that's always changing.)
-    # 
-    last_displayed_time_prac = int(total_seconds_prac)
-    last_displayed_time_play = int(total_seconds_play)
-
-    idle_start_time = time.monotonic()
-    idle_led_blip_time = idle_start_time
-
-    # A state machine to watch for the "reset" sequence.
-    msm_reset = midi_state_machine.midi_state_machine(MIDI_TRIGGER_SEQ_RESET)
-
-    # A state machine to watch for the "toggle boot mode" sequence.
-    msm_toggle_boot = midi_state_machine.midi_state_machine(MIDI_TRIGGER_SEQ_TOGGLE_BOOT)
-
-    # State machine to catch command to toggle practice/play mode.
-    msm_toggle_practice_play = midi_state_machine.midi_state_machine(MIDI_TRIGGER_SEQ_TOGGLE_PRAC_PLAY)
-
-    # # For testing stuff
-    # msm_test = midi_state_machine.midi_state_machine(MIDI_TRIGGER_SEQ_TEST)
-
-    # wait for USB ready??? nah
-    # time.sleep(2) 
-
-    # Main event loop. Does not exit.
-    #
-    midi_device = None
-    msg_number = 0
     while True:
 
         # This doesn't return until we have a MIDI device.
-        # TODO: Is it always a *usable* device? No. Something funny here.
-        #
-        if midi_device is None:
-
+        if not inputs.readers:
             print("MEL loking for MIDI....")
-
-            # Wait for a MIDI device....
-            midi_device = find_midi_device(display)
+            reader = await find_midi_device(tracker, display, finder)
             print("  back from find_midi_device")
 
-            # TODO: check for None?
             # stop screen timeout immediately after finding ?
-            last_event_time = time.monotonic()
-
-        # print(f"waiting for event; {in_session=}")
-        # TODO: remove this as 'else' to fix one-off error?
-        # else:
-
-        try:
-            msg = midi_device.receive()
-        except usb.core.USBError as e:
-            print(f" ** midi_device.receive: usb.core.USBError: '{e}'")
-
-            # Assume this is a MIDI disconnect?
-            if in_session:
-                total_seconds_temp = total_seconds_prac + session_length
-                print(f"* Force write: {total_seconds_prac=}, {session_length=}")
-                try_write_session_data(in_dev_mode, display, total_seconds_prac+session_length)
-
-                # TODO: end the session?
-
-            last_event_time = time.monotonic()
-
-            midi_device = None
-            continue
-
-        event_time = time.monotonic()
-
-        # Got MIDI?
-        if msg:
-            msg_number += 1
-
-            # We only act on MIDI "NoteOn" messages.
-            if not isinstance(msg, NoteOn):
-                # print(f"Not a MIDI ON message! ({msg_number})")
-                # print(f"  > midi msg: {msg} @ {event_time:.1f}")
+            tracker.on_connect(clock.now())
+            reader.timeout_ms = pacer.timeout_ms
+            inputs.add(reader, midi_discovery.device_name(reader.device), midi_discovery.device_key(reader.device))
+            rescan_time = last_read = clock.now()
+
+        # Another keyboard?
+        if inputs.has_room() and clock.since(rescan_time) > MIDI_RESCAN_INTERVAL * 1000:
+            for reader in finder.scan_more(inputs.readers, inputs.room()):
+                reader.timeout_ms = pacer.timeout_ms
+                name = midi_discovery.device_name(reader.device)
+                if inputs.add(reader, name, midi_discovery.device_key(reader.device)) is not None:
+                    display.set_text_status(f"Added {name}", 2, PRIORITY_INFO)
+            # Not last_read: the time the scan took counts towards the gap.
+            rescan_time = clock.now()
+
+        gap_ms = clock.since(last_read)
+        if gap_ms > worst_gap_ms:
+            worst_gap_ms = gap_ms
+
+        # Everything the devices have for us (up to a few transfers each), into their rings.
+        note_count = inputs.fill(pacer.drain)
+
+        while inputs.failed:
+            reader = inputs.failed.pop()
+            print(f" ** input {reader.source}: USB error")
+
+            # A hiccup, or has it gone?
+            if await reconnect(finder, reader, display, clock):
                 continue
 
-            # print(f"midi msg: {msg} @ {event_time:.1f}")
-
-            last_event_time = time.monotonic()
-
-            display.set_text_status(spin())
-
-            if not in_session:
-                print("\nStarting session")
-                session_start_time = time.monotonic()
-                in_session = True
-
-                # This would only be missing for <1 sec, but hey.
-                show_total_time(display, total_seconds_prac, total_seconds_play)
-
-            # Look for command sequences.
-            if isinstance(msg, NoteOn):
-
-                # Could be a zero-velocity NoteOn which is really a "note off".
-                if msg.velocity == 0:
-                    # print("note off!")
-                    continue
+            # Unplugged. Only the end of the session if it was the last one.
+            inputs.remove(reader)
+            if not inputs.readers:
+                tracker.on_disconnect(clock.now())
+                finder.start(clock.now())
+
+        now = clock.now()
+        last_read = now
+        reads += 1
+
+        # Got MIDI? The readers only give us NoteOns, and not the zero-velocity ones.
+        # Each device's batch, with the one timestamp.
+        if inputs.deliver(tracker.on_note, now):
+            finder.first_note(now)
+
+        if clock.since(report_time) > REPORT_INTERVAL * 1000:
+            print(f"ingest: worst gap between reads {worst_gap_ms} ms over {reads} reads "
+                  f"(+ {MIDI_READ_TIMEOUT_MS} ms read timeout)")
+            for reader in inputs.readers:
+                print(reader.stats())
+            print(inputs.stats())
+            print(pacer.stats(now))
+            worst_gap_ms = 0
+            reads = 0
+            report_time = clock.now()
+
+        wait_ms = pacer.read_done(now, note_count)
+        if wait_ms:
+            # Nobody's playing: let everybody else have a go, and then some.
+            await asyncio.sleep(wait_ms / 1000)
+            last_read = clock.now()
+        else:
+            # Let everybody else have a go.
+            await asyncio.sleep(0)
 
-                # Is it a MIDI state machine command?
-                #
-                if msm_reset.note(msg.note):
-                    print("* Got MIDI_TRIGGER_SEQ_RESET")
-                    total_seconds_prac = 0
-                    total_seconds_play = 0
-                    last_displayed_time_prac = 0
-                    last_displayed_time_play = 0
-                    session_length = 0
-                    session_start_time = time.monotonic()
-                    show_total_time(display, total_seconds_prac, total_seconds_play)
 
-                    try_write_session_data(in_dev_mode, display, total_seconds_prac, total_seconds_play)
+async def assets_task(display):
+    """With DEF.FAST_BOOT, the totals go up in the built-in font; once everybody's started,
+    load the background image and the big font. That holds everything up for a moment,
+    but it's right at the start, while we're still looking for the keyboard.
+    Then say where the startup time went. Returns, unlike the others."""
+    await asyncio.sleep(0)
+    load_assets = getattr(display, "load_assets", None)
+    if load_assets is not None and load_assets():
+        profile_.mark("background and font")
+    profile_.report()
 
-                elif msm_toggle_boot.note(msg.note):
-                    print("* Got MIDI_TRIGGER_SEQ_TOGGLE_BOOT")
-                    toggle_boot_mode(display)
 
-                elif msm_toggle_practice_play.note(msg.note):
-                    print("* Got MIDI_TRIGGER_SEQ_TOGGLE_PRAC_PLAY!")
+async def session_task(tracker, clock):
+    """Keep track of the current session, and end it when it times out."""
+    while True:
+        await asyncio.sleep(SESSION_TICK)
+        tracker.tick(clock.now())
 
-                    # TODO: this ends the previous prac/play session; need to start a new one
-                    # FIXME: WHEN DOES OLD SESSION END??? HOW DO WE DIVIDE UP THE PRAC/PLAY TIME????
 
-                    print(f" * MIDI escape start - {msm_toggle_practice_play.get_seq_start_time()=}")
+async def display_task(tracker, display, view, renderer, pacer, clock):
+    """Show the running totals, or put the screen to sleep when idle."""
+    report_time = clock.now()
+    while True:
+        await asyncio.sleep(DISPLAY_TICK)
 
-                    print(f" - before adjust {total_seconds_prac=}, {total_seconds_play=}")
+        # Take down any status messages whose time is up.
+        display.tick()
 
-                    time_to_subtract = time.monotonic() - msm_toggle_practice_play.get_seq_start_time()
-                    print(f" - offset {} by {time_to_subtract=}")
-                    if practice_not_play_mode:
-                        total_seconds_prac -= time_to_subtract
-                    else:
-                        total_seconds_play -= time_to_subtract
+        # Asleep when idle; awake, and everything redrawn, the first frame after a note.
+        renderer.set_idle(tracker.idle())
 
-                    print(f" - after adjust {total_seconds_prac=}, {total_seconds_play=}")
+        # Only draws what changed, and not more than RENDER_FPS times a second.
+        if view.frame(tracker.notes):
+            pacer.displayed(clock.now())
 
-                    practice_not_play_mode = not practice_not_play_mode
+        if clock.since(report_time) > REPORT_INTERVAL * 1000:
+            print(renderer.stats())
+            report_time = clock.now()
 
-                    show_total_time(display, total_seconds_prac, total_seconds_play)
-                    display.set_display_practice_mode(practice_not_play_mode)
- 
 
-                # elif msm_force_write.note(msg.note):
-                #     # don't update total_seconds_prac yet, but write the new value
-                #     total_seconds_temp = total_seconds_prac + session_length
-                #     print(f"* Force write: {total_seconds_prac=}, {total_seconds_temp=}")
-                #     try_write_session_data(display, total_seconds_temp)
+async def led_task(tracker):
+    """When idle, blip the LED once per second - twice if there's no MIDI device."""
+    while True:
+        await asyncio.sleep(LED_TICK)
 
-        # else:
-        #     # print("  empty message")
-        #     pass
+        if tracker.idle():
+            await flash_led(0.01)
+            if not midi_inputs_.readers:
+                await asyncio.sleep(0.1)
+                await flash_led(0.01)
 
-        # We have handled the event/note. Now do other stuff.
-        #
-        if in_session:
 
-            # Session timeout?
-            if event_time - last_event_time > SESSION_TIMEOUT:
+async def persistence_task(tracker, save_requested, checkpoints, clock):
+    """Have the tracker write the totals whenever it wants to (it sets save_requested),
+    and check once every CHECKPOINT_TICK for a checkpoint."""
+    report_time = clock.now()
+    while True:
+        try:
+            await asyncio.wait_for(save_requested.wait(), CHECKPOINT_TICK)
+        except asyncio.TimeoutError:
+            pass
+        save_requested.clear()
+        tracker.persist(clock.now())
 
-                # print("\nSESSION_TIMEOUT!")
-                in_session = False
-                display.set_text_status("")
+        if clock.since(report_time) > REPORT_INTERVAL * 1000:
+            print(checkpoints.stats())
+            report_time = clock.now()
 
-                if practice_not_play_mode:
-                    total_seconds_prac += session_length
-                else:
-                    total_seconds_play += session_length
 
-                try_write_session_data(in_dev_mode, display, total_seconds_prac, total_seconds_play)
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
 
-                # For idle screen timeout
-                idle_start_time = time.monotonic()
+async def main():
+    global tracker_, midi_inputs_
 
-            else:
-                # Update current session info
-                session_length = time.monotonic() - session_start_time
-                # print(f"  Session now {as_hms(session_length)}")
+    # turn off auto-reload, cuz it's a pain
+    supervisor.runtime.autoreload = False
+    print(f"{supervisor.runtime.autoreload=}")
 
-                if practice_not_play_mode:
-                    new_total = total_seconds_prac + session_length
-                    if last_displayed_time_prac != int(new_total):
-                        last_displayed_time_prac = int(new_total)
-                        # print(f" updating at {last_displayed_time_prac=}")
-                else:
-                    new_total = total_seconds_play + session_length
-                    if last_displayed_time_play != int(new_total):
-                        last_displayed_time_play = int(new_total)
-                        # print(f" updating at {last_displayed_time_play=}")
-                show_total_time(display, last_displayed_time_prac, last_displayed_time_play)
+    # Are we running in dev mode? Set some stuff.
+    in_dev_mode = set_run_or_dev()
+    profile_.mark("mode")
 
-        else:
-            # print("  not in session...")
+    # Start looking for the keyboard - and timing how long it takes - from here.
+    finder = midi_discovery.MidiFinder(microcontroller.nvm, MIDI_READ_TIMEOUT_MS)
 
-            # With-MIDI display timeout
-            if time.monotonic() - idle_start_time > DISPLAY_IDLE_TIMEOUT:
-                # print("idle timeout!")
-                display.blank_screen()
+    # The display.
+    display = display_base.open_display((PIN_TFT_CS, PIN_TFT_DC, PIN_TFT_RESET), defer_assets=DEF.FAST_BOOT)
+    profile_.mark("display")
+    if display == None:
+        print("Can't init display??")
+        return
+    print(f"Created {type(display).__name__}")
 
-                # Single flash of LED, once per second.
-                if time.monotonic() - idle_led_blip_time > 1:
-                    flash_led(0.01)
-                    idle_led_blip_time = time.monotonic()
+    # Practice and play if it can show both; otherwise just practice.
+    if display.caps & display_base.CAP_TWO_TOTALS:
+        formatters = (hms_format.HMSCounter(), hms_format.HMSCounter())
+    else:
+        formatters = (hms_format.HMSCounter(),)
+    mode = display.set_display_practice_mode if display.caps & display_base.CAP_MODE else None
+    renderer = render_layer.Renderer(display, RENDER_FPS, formatters)
+    view = practice_tracker.DisplayView(renderer, display.set_text_status, mode)
+
+    clock = session_clock.Clock()
+    save_requested = asyncio.Event()
+    checkpoints = checkpoint.CheckpointScheduler(clock,
+        CHECKPOINT_INTERVAL * 1000, CHECKPOINT_DELTA * 1000, CHECKPOINT_MIN_GAP * 1000)
+
+    # Loads the previous totals.
+    tracker = practice_tracker.PracticeTracker(clock, make_store(in_dev_mode), view,
+        SESSION_TIMEOUT * 1000, DISPLAY_IDLE_TIMEOUT * 1000,
+        checkpoints=checkpoints, toggle_boot=toggle_boot_mode, dev_mode=in_dev_mode, wake=save_requested.set)
+    tracker_ = tracker
+    profile_.mark("totals loaded")
+    renderer.frame()
+    profile_.mark("totals on screen")
+
+    pacer = read_pacer.ReadPacer(MIDI_READ_TIMEOUT_MS, MIDI_ACTIVE_HOLD * 1000, MIDI_DRAIN_READS,
+        MIDI_IDLE_WAIT_MIN_MS, MIDI_IDLE_WAIT_MAX_MS)
+    inputs = midi_inputs.MidiInputs(MIDI_MAX_INPUTS, SESSION_TIMEOUT * 1000, MIDI_DRAIN_READS)
+    midi_inputs_ = inputs
+
+    # None of these ever return, but assets_task.
+    await asyncio.gather(
+        midi_ingest_task(tracker, display, finder, inputs, pacer, clock),
+        assets_task(display),
+        session_task(tracker, clock),
+        display_task(tracker, display, view, renderer, pacer, clock),
+        led_task(tracker),
+        persistence_task(tracker, save_requested, checkpoints, clock))
 
 
 # Run the code!
-main()
-
+asyncio.run(main())
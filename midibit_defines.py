@@ -3,3 +3,16 @@
 
 MAGIC_NUMBER_RUN_MODE = 0x12 # 18
 MAGIC_NUMBER_DEV_MODE = 0x34 # 52
+
+# Fast boot: boot.py only looks at the button for a moment, without the blinking, and
+# code.py puts the totals up before loading the background image and the big font.
+# False for the old, slow, blinky way.
+FAST_BOOT = True
+
+# How we use microcontroller.nvm:
+#   byte 0 is the run/dev magic number, above;
+#   bytes 1 to 15: midi_discovery.DeviceCache, the last MIDI device we used;
+#   bytes 16 on are nvm_store.NVMStore's slots.
+NVM_MODE_INDEX = 0
+NVM_DEVICE_START = 1
+NVM_STORE_START = 16
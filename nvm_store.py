@@ -0,0 +1,155 @@
+'''
+Practice totals kept in microcontroller.nvm instead of the filesystem.
+
+Same interface as practice_journal.PracticeJournal - load(), save(), reset() - but
+it doesn't need the CIRCUITPY drive to be writable by CircuitPython, so it works in
+DEV mode too, and there's no FAT layer in the way.
+
+The totals live in a ring of fixed-size slots, each one:
+
+    sequence number  uint32
+    practice total   int64, ms
+    play total       int64, ms
+    CRC-32           uint32, of the first 20 bytes
+
+Each save goes in the slot after the last one, so the writes are spread around the
+ring and the previous slot is always still there if a write gets torn. Loading picks
+the valid slot with the newest sequence number.
+
+(On the RP2040, NVM is one flash sector and every write re-programs the whole sector,
+so the ring doesn't spread the flash wear there the way it does on chips with real
+EEPROM. It still never leaves us without a good slot to fall back on.)
+'''
+
+import binascii
+import struct
+
+import midibit_defines as DEF
+
+
+SLOT_FORMAT = "<IqqI"
+SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+SLOTS = 16
+
+
+class NVMStore:
+
+    def __init__(self, nvm=None, start=DEF.NVM_STORE_START, slots=SLOTS):
+        """nvm defaults to microcontroller.nvm; anything that slices like a bytearray will do."""
+        if nvm is None:
+            import microcontroller
+            nvm = microcontroller.nvm
+        self._nvm = nvm
+        self._start = start
+        self._slots = slots
+
+        self._record = bytearray(SLOT_SIZE)
+
+        # The last slot written, and its sequence number; -1 if none.
+        self._slot = -1
+        self._sequence = 0
+
+        self._practice_ms = 0
+        self._play_ms = 0
+
+        self.bytes_written = 0
+
+    def load(self):
+        """Recover the latest totals; return (practice_ms, play_ms)."""
+        data = self._nvm[self._start:self._start + SLOT_SIZE * self._slots]
+        best = -1
+        for i in range(self._slots):
+            record = data[i*SLOT_SIZE:(i+1)*SLOT_SIZE]
+            sequence, practice, play, crc = struct.unpack(SLOT_FORMAT, record)
+            if binascii.crc32(record[0:20]) & 0xFFFF_FFFF != crc:
+                continue
+            # Newer, allowing for the sequence number wrapping around (it won't, but still).
+            if best < 0 or (sequence - self._sequence) & 0xFFFF_FFFF < 0x8000_0000:
+                best = i
+                self._sequence = sequence
+                self._practice_ms = practice
+                self._play_ms = play
+
+        self._slot = best
+        if best < 0:
+            self._sequence = 0
+            self._practice_ms = 0
+            self._play_ms = 0
+        print(f"NVMStore: slot {best} -> {self._practice_ms=}, {self._play_ms=}")
+        return self._practice_ms, self._play_ms
+
+    def save(self, practice_ms, play_ms):
+        """Record the new totals."""
+        if practice_ms == self._practice_ms and play_ms == self._play_ms and self._slot >= 0:
+            return
+
+        slot = (self._slot + 1) % self._slots
+        sequence = (self._sequence + 1) & 0xFFFF_FFFF
+        struct.pack_into("<Iqq", self._record, 0, sequence, practice_ms, play_ms)
+        struct.pack_into("<I", self._record, 20, binascii.crc32(self._record[0:20]) & 0xFFFF_FFFF)
+
+        # One slice assignment, so it's one NVM write.
+        start = self._start + slot * SLOT_SIZE
+        self._nvm[start:start + SLOT_SIZE] = self._record
+        self.bytes_written += SLOT_SIZE
+
+        self._slot = slot
+        self._sequence = sequence
+        self._practice_ms = practice_ms
+        self._play_ms = play_ms
+
+    def reset(self):
+        """Start again from zero."""
+        self.save(0, 0)
+
+
+# ------------------------------------------------------------------------------
+
+def benchmark(saves=50, nvm=None):
+    """Time per save. On the device this uses the real NVM (and so wears it a little);
+    elsewhere, a bytearray."""
+    import time
+
+    if nvm is None:
+        try:
+            import microcontroller
+            nvm = microcontroller.nvm
+        except (ImportError, AttributeError):
+            # (Blinka has a microcontroller module, but no nvm.)
+            nvm = bytearray(4096)
+
+    # Don't lose the real totals.
+    saved = bytes(nvm[DEF.NVM_STORE_START:DEF.NVM_STORE_START + SLOT_SIZE * SLOTS])
+    try:
+        store = NVMStore(nvm)
+        store.load()
+        start = time.monotonic_ns()
+        for i in range(saves):
+            store.save(i * 60_000 + 1, i * 30_000 + 2)
+        elapsed = time.monotonic_ns() - start
+    finally:
+        nvm[DEF.NVM_STORE_START:DEF.NVM_STORE_START + len(saved)] = saved
+
+    print(f"NVM store save:         {elapsed // saves // 1000:6} us/save, {store.bytes_written / saves:6.1f} bytes/save")
+    return [{"name": "nvm_save", "us_per_save": elapsed // saves // 1000, "bytes_per_save": store.bytes_written / saves}]
+
+def test():
+    nvm = bytearray(b"\xff" * 1024)
+    store = NVMStore(nvm, slots=4)
+    assert store.load() == (0, 0)
+    for i in range(1, 11):
+        store.save(i * 1000 + 1, i * 500)
+    assert NVMStore(nvm, slots=4).load() == (10_001, 5000)
+
+    # Tear the newest slot; we should fall back to the one before.
+    last = DEF.NVM_STORE_START + store._slot * SLOT_SIZE
+    nvm[last + 6] ^= 0xFF
+    assert NVMStore(nvm, slots=4).load() == (9001, 4500)
+
+    # Totals bigger than 32 bits of milliseconds are fine.
+    store.save(10_000 * 3600 * 1000, 1)
+    assert NVMStore(nvm, slots=4).load() == (10_000 * 3600 * 1000, 1)
+    print("NVMStore OK")
+
+# test()
+# benchmark()
@@ -9,8 +9,14 @@ import adafruit_displayio_ssd1306
 
 import time
 
+import display_base
+from display_base import DisplayBase
 
-class oled_display:
+
+class oled_display(DisplayBase):
+    '''Three lines of the built-in font on a 128x32 OLED: the practice total, the status line, and text 3.'''
+
+    caps = 0
 
     def __init__(self):
 
@@ -19,12 +25,13 @@ class oled_display:
         displayio.release_displays()
 
         i2c = board.I2C()  # uses board.SCL and board.SDA
-        display_bus = I2CDisplayBus(i2c, device_address=0x3C)
+        display_bus = I2CDisplayBus(i2c, device_address=display_base.OLED_128x32_ADDRESS)
 
         WIDTH = 128
         HEIGHT = 32
 
         display = adafruit_displayio_ssd1306.SSD1306(display_bus, width=WIDTH, height=HEIGHT)
+        super().__init__(display)
 
         # Make the display context
         root = displayio.Group()
@@ -58,13 +65,14 @@ class oled_display:
 
 
     def set_text_1(self, text):
-        self.text_area_1._set_text(text, 2.0)
+        self._set_label(self.text_area_1, text)
 
-    def set_text_2(self, text):
-        self.text_area_2._set_text(text, 1.0)
+    def _show_status(self, text):
+        self._set_label(self.text_area_2, text)
 
     def set_text_3(self, text):
-        self.text_area_3._set_text(text, 1.0)
+        self._set_label(self.text_area_3, text)
+
 
     # def set_text_4(self, text):
     #     self.text_area_4._set_text(text, 1.0)
@@ -73,7 +81,7 @@ class oled_display:
     def test(self):
 
         self.set_text_1("This is a test.")
-        self.set_text_2("This is only a test.")
+        self.set_text_status("This is only a test.")
         self.set_text_3("1234567890123456789012345")
 
         time.sleep(1)
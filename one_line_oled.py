@@ -3,16 +3,17 @@
 import board
 import displayio
 import terminalio
-from adafruit_bitmap_font import bitmap_font
 from adafruit_display_text import label
 import adafruit_displayio_ssd1306
 
+import display_base
+from display_base import DisplayBase
 
-# FONT_PATH = "fonts/LeagueSpartan-Bold-22.bdf"
-FONT_PATH = "fonts/cmuntb22.bdf"
 
+class one_line_oled(DisplayBase):
+    '''Display on an Adafruit 128x32 OLED: the practice total, the status line, and a little text 3.'''
 
-class one_line_oled:
+    caps = 0
 
     def __init__(self):
 
@@ -24,12 +25,14 @@ class one_line_oled:
             print("Is the I2C wiring correct?")
             return
 
-        display_bus = displayio.I2CDisplay(i2c, device_address=0x3C)
+        display_bus = displayio.I2CDisplay(i2c, device_address=display_base.OLED_128x32_ADDRESS)
         WIDTH = 128
         HEIGHT = 32
         display = adafruit_displayio_ssd1306.SSD1306(display_bus, width=WIDTH, height=HEIGHT)
+        super().__init__(display)
 
-        font_main = bitmap_font.load_font(FONT_PATH)
+        # CMU Typewriter, from the glyph atlas if there is one.
+        font_main = display_base.big_font()
 
         text_area_1 = label.Label(font_main, color=0xFFFFFF)
         text_area_1.x =  0
@@ -54,24 +57,21 @@ class one_line_oled:
         self.text_area_3 = text_area_3
 
     def set_text_1(self, text):
-        self.text_area_1.text = text
-        
-    def set_text_2(self, text):
-        self.text_area_2.text = text
+        self._set_label(self.text_area_1, text)
+
+    def _show_status(self, text):
+        """Line 2 is the status line."""
+        self._set_label(self.text_area_2, text)
 
     def set_text_3(self, text):
-        self.text_area_3.text = text
+        self._set_label(self.text_area_3, text)
 
-    def blank_screen(self):
-        self.set_text_1("")
-        self.set_text_2("")
-        self.set_text_3("")
         
 def test():        
     print(f"\nTesting {__name__}....")
     olo = one_line_oled()
     olo.set_text_1("00:23:34")
-    olo.set_text_2("Test-a-roni!")
+    olo.set_text_status("Test-a-roni!")
     olo.set_text_3("X")
     print("Test done.")
     while True:
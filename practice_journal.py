@@ -0,0 +1,270 @@
+'''
+Append-only practice journal, to replace rewriting pm_settings.text.
+
+Rewriting the settings file truncates it and writes it again - a whole FAT update
+every save - and if the power goes in the middle, the totals are gone. Instead, each
+save appends one small fixed-size record to a preallocated file:
+
+    sequence number  uint32
+    practice delta   int32, ms
+    play delta       int32, ms
+    CRC-32           uint32, of the first 12 bytes
+
+Records never get rewritten, so a torn write can only lose the record being written.
+There are a few files, used in rotation: when one fills up, the next one is wiped and
+starts with a snapshot record (sequence number with the top bit set; the two fields
+are then the totals in whole seconds, and whatever milliseconds that leaves out go in
+the next delta). So the old totals are always still in the previous file until the new
+one has a good snapshot.
+
+To recover: look at the first record of each file, take the file with the newest good
+snapshot, and add up its deltas until the first bad or out-of-sequence record. That's
+at most one file's worth of reading, however long the unit has been running.
+'''
+
+import binascii
+import os
+import struct
+
+
+JOURNAL_NAME = "pm_journal_{}.bin"
+JOURNAL_FILES = 4
+RECORDS_PER_FILE = 64
+
+# The old text file, read once if there's no journal yet.
+LEGACY_SETTINGS_NAME = "pm_settings.text"
+
+RECORD_FORMAT = "<IiiI"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+SNAPSHOT_FLAG = 0x8000_0000
+SEQUENCE_MASK = 0x7FFF_FFFF
+
+INT32_MAX = 0x7FFF_FFFF
+INT32_MIN = -0x8000_0000
+
+
+class PracticeJournal:
+
+    def __init__(self, name_format=JOURNAL_NAME, files=JOURNAL_FILES, records_per_file=RECORDS_PER_FILE,
+                 legacy_name=LEGACY_SETTINGS_NAME):
+        self._name_format = name_format
+        self._files = files
+        self._records_per_file = records_per_file
+        self._legacy_name = legacy_name
+
+        self._record = bytearray(RECORD_SIZE)
+
+        # Where the next record goes; file -1 means "no journal yet".
+        self._file = -1
+        self._position = 0
+        self._sequence = 0
+
+        # What the journal adds up to so far.
+        self._practice_ms = 0
+        self._play_ms = 0
+
+        self.bytes_written = 0
+
+    def load(self):
+        """Recover the latest totals; return (practice_ms, play_ms)."""
+        best_file = -1
+        best_sequence = -1
+        for i in range(self._files):
+            try:
+                with open(self._name(i), "rb") as f:
+                    record = self._unpack(f.read(RECORD_SIZE))
+            except OSError:
+                continue
+            if record is None or not record[0] & SNAPSHOT_FLAG:
+                continue
+            sequence = record[0] & SEQUENCE_MASK
+            if sequence > best_sequence:
+                best_file = i
+                best_sequence = sequence
+
+        if best_file < 0:
+            self._practice_ms, self._play_ms = self._load_legacy()
+            print(f"PracticeJournal: no journal; starting from {self._practice_ms=}, {self._play_ms=}")
+            return self._practice_ms, self._play_ms
+
+        with open(self._name(best_file), "rb") as f:
+            data = f.read(RECORD_SIZE * self._records_per_file)
+
+        snapshot = self._unpack(data[0:RECORD_SIZE])
+        practice_ms = snapshot[1] * 1000
+        play_ms = snapshot[2] * 1000
+        sequence = best_sequence
+        position = 1
+        while position < self._records_per_file:
+            record = self._unpack(data[position*RECORD_SIZE:(position+1)*RECORD_SIZE])
+            if record is None or record[0] != sequence + 1:
+                break
+            sequence = record[0]
+            practice_ms += record[1]
+            play_ms += record[2]
+            position += 1
+
+        self._file = best_file
+        self._position = position
+        self._sequence = sequence
+        self._practice_ms = practice_ms
+        self._play_ms = play_ms
+        print(f"PracticeJournal: file {best_file}, {position} records -> {practice_ms=}, {play_ms=}")
+        return practice_ms, play_ms
+
+    def save(self, practice_ms, play_ms):
+        """Record the new totals. Raises OSError if the filesystem isn't writable."""
+        practice_delta = practice_ms - self._practice_ms
+        play_delta = play_ms - self._play_ms
+        if practice_delta == 0 and play_delta == 0 and self._file >= 0:
+            return
+
+        if (self._file < 0 or self._position >= self._records_per_file
+                or not INT32_MIN <= practice_delta <= INT32_MAX
+                or not INT32_MIN <= play_delta <= INT32_MAX):
+            self._rotate(practice_ms, play_ms)
+            practice_delta = practice_ms - self._practice_ms
+            play_delta = play_ms - self._play_ms
+            if practice_delta == 0 and play_delta == 0:
+                return
+
+        self._pack(self._sequence + 1, practice_delta, play_delta)
+        with open(self._name(self._file), "r+b") as f:
+            f.seek(self._position * RECORD_SIZE)
+            f.write(self._record)
+        self.bytes_written += RECORD_SIZE
+
+        self._sequence += 1
+        self._position += 1
+        self._practice_ms = practice_ms
+        self._play_ms = play_ms
+
+    def reset(self):
+        """Start again from zero."""
+        self._rotate(0, 0)
+
+    def _rotate(self, practice_ms, play_ms):
+        """Wipe the next file and start it with a snapshot of these totals (in whole seconds)."""
+        next_file = (self._file + 1) % self._files
+        practice_s = practice_ms // 1000
+        play_s = play_ms // 1000
+        self._pack((self._sequence + 1) | SNAPSHOT_FLAG, practice_s, play_s)
+        with open(self._name(next_file), "wb") as f:
+            f.write(self._record)
+            f.write(b"\xff" * (RECORD_SIZE * (self._records_per_file - 1)))
+        self.bytes_written += RECORD_SIZE * self._records_per_file
+
+        self._file = next_file
+        self._position = 1
+        self._sequence += 1
+        self._practice_ms = practice_s * 1000
+        self._play_ms = play_s * 1000
+
+    def _name(self, i):
+        return self._name_format.format(i)
+
+    def _pack(self, sequence, practice, play):
+        struct.pack_into("<Iii", self._record, 0, sequence, practice, play)
+        struct.pack_into("<I", self._record, 12, binascii.crc32(self._record[0:12]) & 0xFFFF_FFFF)
+
+    def _unpack(self, data):
+        """Return (sequence, practice, play), or None if the record isn't valid."""
+        if len(data) < RECORD_SIZE:
+            return None
+        sequence, practice, play, crc = struct.unpack(RECORD_FORMAT, data)
+        if binascii.crc32(data[0:12]) & 0xFFFF_FFFF != crc:
+            return None
+        return sequence, practice, play
+
+    def _load_legacy(self):
+        try:
+            with open(self._legacy_name, "r") as f:
+                practice = f.readline().strip()
+                play = f.readline().strip()
+            return int(practice or 0) * 1000, int(play or 0) * 1000
+        except (OSError, ValueError):
+            return 0, 0
+
+
+# ------------------------------------------------------------------------------
+
+def _legacy_write(name, practice_seconds, play_seconds):
+    """What write_session_data() used to do. Returns the bytes written."""
+    text = str(int(practice_seconds)) + "\n" + str(int(play_seconds))
+    with open(name, "w") as f:
+        f.write(text)
+    return len(text)
+
+def benchmark(directory=".", saves=200):
+    """Write latency and bytes written per save (we save once per session): the old settings
+    file vs. the journal. Byte counts are what we hand the filesystem; the rewrite also costs a
+    FAT and directory update each time, which the in-place append mostly doesn't.
+    Needs a writable filesystem - run it in RUN mode on the device."""
+    import time
+
+    legacy_name = directory + "/bench_settings.text"
+    journal = PracticeJournal(name_format=directory + "/bench_journal_{}.bin", legacy_name="no such file")
+    results = []
+    try:
+        start = time.monotonic_ns()
+        written = 0
+        for i in range(saves):
+            written += _legacy_write(legacy_name, i * 60, i * 30)
+        elapsed = time.monotonic_ns() - start
+        print(f"settings file rewrite:  {elapsed // saves // 1000:6} us/save, {written / saves:6.1f} bytes/save (whole file, truncated each time)")
+        results.append({"name": "settings_rewrite", "us_per_save": elapsed // saves // 1000, "bytes_per_save": written / saves})
+
+        journal.load()
+        start = time.monotonic_ns()
+        for i in range(saves):
+            journal.save(i * 60_000 + 123, i * 30_000 + 45)
+        elapsed = time.monotonic_ns() - start
+        print(f"journal append:         {elapsed // saves // 1000:6} us/save, {journal.bytes_written / saves:6.1f} bytes/save (incl. rotations)")
+        results.append({"name": "journal_append", "us_per_save": elapsed // saves // 1000, "bytes_per_save": journal.bytes_written / saves})
+
+        start = time.monotonic_ns()
+        totals = PracticeJournal(name_format=directory + "/bench_journal_{}.bin").load()
+        elapsed = time.monotonic_ns() - start
+        print(f"journal recovery:       {elapsed // 1000:6} us")
+        results.append({"name": "journal_recovery", "us": elapsed // 1000})
+        assert totals == ((saves - 1) * 60_000 + 123, (saves - 1) * 30_000 + 45), totals
+    finally:
+        for i in range(JOURNAL_FILES):
+            try:
+                os.remove(directory + f"/bench_journal_{i}.bin")
+            except OSError:
+                pass
+        try:
+            os.remove(legacy_name)
+        except OSError:
+            pass
+    return results
+
+def test(directory="."):
+    """Saves, rotation, recovery, and a torn last record."""
+    name_format = directory + "/test_journal_{}.bin"
+    try:
+        journal = PracticeJournal(name_format=name_format, records_per_file=8, legacy_name="no such file")
+        assert journal.load() == (0, 0)
+        for i in range(1, 29):
+            journal.save(i * 1500, i * 700)
+        assert PracticeJournal(name_format=name_format, records_per_file=8).load() == (28 * 1500, 28 * 700)
+
+        # Tear the last record; we should get the one before.
+        with open(name_format.format(journal._file), "r+b") as f:
+            f.seek((journal._position - 1) * RECORD_SIZE + 5)
+            f.write(b"\x00\x00")
+        assert PracticeJournal(name_format=name_format, records_per_file=8).load() == (27 * 1500, 27 * 700)
+
+        journal.reset()
+        assert PracticeJournal(name_format=name_format, records_per_file=8).load() == (0, 0)
+        print("PracticeJournal OK")
+    finally:
+        for i in range(JOURNAL_FILES):
+            try:
+                os.remove(name_format.format(i))
+            except OSError:
+                pass
+
+# test()
+# benchmark()
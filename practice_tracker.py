@@ -0,0 +1,395 @@
+'''
+The practice-tracking engine, on its own: sessions, timeouts, practice/play totals,
+keyboard commands, and when to save. No hardware, no asyncio, no globals - the
+clock, the store and the view get handed in - so both entry points can share it,
+and it can be tested and timed on a PC.
+
+The entry points feed it notes with on_note(), call tick() a few times a second,
+and persist() whenever they like (it decides whether there's anything to write).
+All times are adafruit_ticks milliseconds, as from session_clock.Clock.now().
+
+The view is anything with:
+    show_totals(practice_seconds, play_seconds)
+    show_mode(practice_not_play)
+    show_status(text, duration=None, priority=PRIORITY_BACKGROUND)
+DisplayView, below, is the one our display classes use.
+'''
+
+from adafruit_ticks import ticks_diff
+
+import checkpoint
+import command_matcher
+import session_clock
+import session_log
+from status_channel import PRIORITY_BACKGROUND, PRIORITY_INFO, PRIORITY_SAVE, PRIORITY_ERROR
+
+
+# Keyboard "attention" sequence MIDI notes: G G G Eb F F F D
+MIDI_TRIGGER_SEQ_PREFIX = (67, 67, 67, 63, 65, 65, 65, 62)
+MIDI_TRIGGER_SEQ_RESET = MIDI_TRIGGER_SEQ_PREFIX + (60,) # middle C
+MIDI_TRIGGER_SEQ_TOGGLE_BOOT = MIDI_TRIGGER_SEQ_PREFIX + (62,) # D above middle C
+MIDI_TRIGGER_SEQ_TOGGLE_PRAC_PLAY = MIDI_TRIGGER_SEQ_PREFIX + (65,) # F
+
+
+class PracticeTracker:
+
+    def __init__(self, clock, store, view, session_timeout_ms, idle_timeout_ms,
+                 checkpoints=None, toggle_boot=None, play_mode=True, dev_mode=False, wake=None):
+        """
+        clock is a session_clock.Clock; store has load()/save()/reset() (practice_journal,
+        nvm_store); view is as above.
+        checkpoints is a checkpoint.CheckpointScheduler, or None for no mid-session saves.
+        toggle_boot, if given, is called for the "toggle boot mode" command.
+        play_mode False means practice only: no practice/play toggle command.
+        dev_mode just changes what a failed save says.
+        wake, if given, is called when a save is wanted, so whoever calls persist() can do it now.
+        """
+        self._clock = clock
+        self._store = store
+        self._view = view
+        self._toggle_boot = toggle_boot
+        self._wake = wake
+        self.dev_mode = dev_mode
+
+        self.practice_not_play_mode = True
+        self.total_ms_prac, self.total_ms_play = store.load()
+
+        # The current session, if any, and when it started.
+        self.session = session_clock.Accumulator(clock)
+        self.session_start = 0
+        self.sessions = session_log.SessionLog()
+
+        self.session_timeout = session_clock.Timeout(clock, session_timeout_ms)
+        self.idle_timeout = session_clock.Timeout(clock, idle_timeout_ms)
+
+        self._checkpoints = checkpoints
+        if checkpoints is not None:
+            checkpoints.start(self.total_ms_prac + self.total_ms_play)
+        self.save_requested = False
+
+        commands = [(MIDI_TRIGGER_SEQ_RESET, self._command_reset),
+                    (MIDI_TRIGGER_SEQ_TOGGLE_BOOT, self._command_toggle_boot)]
+        if play_mode:
+            commands.append((MIDI_TRIGGER_SEQ_TOGGLE_PRAC_PLAY, self._command_toggle_practice_play))
+        self._commands = command_matcher.CommandMatcher(commands, ticks=clock.now)
+
+        # NoteOns seen, ever; the view uses it to wiggle the spinner.
+        self.notes = 0
+
+        view.show_mode(self.practice_not_play_mode)
+        self._show_totals()
+
+    @property
+    def in_session(self):
+        return self.session.running
+
+    # --------------------------------------------------------------------------
+    # Events
+
+    def on_note(self, t, note, velocity=64, source=0):
+        """A NoteOn at time t. This is the hot path; keep it short.
+        source is which input it came from; the totals here are for all of them together,
+        and midi_inputs keeps the per-input ones, a batch at a time rather than per note."""
+        self.session_timeout.restart(t)
+        self.notes += 1
+        if not self.session.running:
+            self._start_session(t)
+        command = self._commands.note(note, t)
+        if command is not None:
+            command(t)
+
+    def tick(self, t):
+        """Move the current session along; end it if it's timed out."""
+        if not self.session.running:
+            return
+        if self.session_timeout.expired(t):
+            self._end_session(t)
+        else:
+            self.session.update(t)
+            self._show_totals()
+
+    def on_disconnect(self, t):
+        """The MIDI device went away - really unplugged, not just a USB hiccup (the entry
+        points tell those apart; see midi_discovery). That ends the session, and saves it."""
+        if self.session.running:
+            print(f"* Unplugged; ending the session at {self.session.update(t)} ms")
+            self._end_session(t)
+        self.session_timeout.restart(t)
+
+    def on_connect(self, t):
+        self.session_timeout.restart(t)
+
+    def idle(self, t=None):
+        """Have we been idle long enough to blank the display?"""
+        return not self.session.running and self.idle_timeout.expired(t)
+
+    def wake_up(self, t=None):
+        """Start the idle timeout again (we just went looking for MIDI, say)."""
+        self.idle_timeout.restart(t)
+
+    # --------------------------------------------------------------------------
+    # Totals and saving
+
+    def current_totals(self):
+        """(practice ms, play ms), counting the current session so far."""
+        session_ms = self.session.ms if self.session.running else 0
+        if self.practice_not_play_mode:
+            return self.total_ms_prac + session_ms, self.total_ms_play
+        return self.total_ms_prac, self.total_ms_play + session_ms
+
+    def request_save(self):
+        self.save_requested = True
+        if self._wake is not None:
+            self._wake()
+
+    def persist(self, t=None):
+        """Write the totals, if somebody asked for it or a checkpoint is due. A request and a
+        checkpoint that come together make one write. Return True if we wrote something."""
+        prac_ms, play_ms = self.current_totals()
+        requested = self.save_requested
+        if not requested and (self._checkpoints is None or not self._checkpoints.due(prac_ms + play_ms, t)):
+            return False
+        self.save_requested = False
+
+        try:
+            print(f"persist: {prac_ms=}, {play_ms=}")
+            self._store.save(prac_ms, play_ms)
+        except Exception as e:
+            # we expect write errors in dev mode, with a file store.
+            if self.dev_mode:
+                print("Can't write, as expected in dev mode.")
+                self._view.show_status("FAILED TO SAVE - OK", 5, PRIORITY_ERROR)
+            else:
+                print(f"Can't write! {e}")
+                self._view.show_status("FAILED TO SAVE!", 5, PRIORITY_ERROR)
+            if self._checkpoints is not None:
+                self._checkpoints.failed(t)
+            return False
+
+        # Checkpoints go quietly.
+        if requested:
+            self._view.show_status("DATA SAVED", 2, PRIORITY_SAVE)
+        if self._checkpoints is not None:
+            self._checkpoints.saved(prac_ms + play_ms, t, checkpoint=not requested)
+        return True
+
+    # --------------------------------------------------------------------------
+
+    def _start_session(self, t):
+        print("\nStarting session")
+        self.session.start(t)
+        self.session_start = t
+        self._show_totals()
+
+    def _end_session(self, t):
+        session_ms = self.session.stop(t)
+        self.sessions.add(self.session_start, session_ms, self.practice_not_play_mode)
+        self._view.show_status("")
+        if self.practice_not_play_mode:
+            self.total_ms_prac += session_ms
+        else:
+            self.total_ms_play += session_ms
+        self._show_totals()
+        self.request_save()
+
+        # For idle screen timeout
+        self.idle_timeout.restart(t)
+
+    def _show_totals(self):
+        prac_ms, play_ms = self.current_totals()
+        self._view.show_totals(session_clock.seconds(prac_ms), session_clock.seconds(play_ms))
+
+    def _command_reset(self, t):
+        print("* Got MIDI_TRIGGER_SEQ_RESET")
+        self.total_ms_prac = 0
+        self.total_ms_play = 0
+        self.session.start(t)
+        self.session_start = t
+        self._show_totals()
+        self.request_save()
+
+    def _command_toggle_boot(self, t):
+        print("* Got MIDI_TRIGGER_SEQ_TOGGLE_BOOT")
+        if self._toggle_boot is not None:
+            self._view.show_status(self._toggle_boot(), 2, PRIORITY_INFO)
+
+    def _command_toggle_practice_play(self, t):
+        """The session so far goes to the mode we were in - less the time it took to play the
+        command - and the rest of it to the other mode."""
+        print("* Got MIDI_TRIGGER_SEQ_TOGGLE_PRAC_PLAY!")
+        command_ms = ticks_diff(t, self._commands.match_start_time())
+        session_ms = max(0, self.session.stop(t) - command_ms)
+        if session_ms > 0:
+            self.sessions.add(self.session_start, session_ms, self.practice_not_play_mode)
+        if self.practice_not_play_mode:
+            self.total_ms_prac += session_ms
+        else:
+            self.total_ms_play += session_ms
+        print(f" - {command_ms=}, {session_ms=} -> {self.total_ms_prac=}, {self.total_ms_play=}")
+
+        self.practice_not_play_mode = not self.practice_not_play_mode
+        self.session.start(t)
+        self.session_start = t
+        self._view.show_mode(self.practice_not_play_mode)
+        self._show_totals()
+
+
+class DisplayView:
+    """The view for our display classes: totals go through a render_layer.Renderer,
+    status text to 'status' (the display's set_text_status), and the
+    mode to 'mode' (set_display_practice_mode), if the display has one."""
+
+    SPINNER = "|/-\\"
+
+    def __init__(self, renderer, status, mode=None):
+        self._renderer = renderer
+        self._status = status
+        self._mode = mode
+        self._spinner = 0
+        self._notes = 0
+
+    def show_totals(self, practice_seconds, play_seconds):
+        self._renderer.show_totals(practice_seconds, play_seconds)
+
+    def show_mode(self, practice_not_play):
+        if self._mode is not None:
+            self._mode(practice_not_play)
+
+    def show_status(self, text, duration=None, priority=PRIORITY_BACKGROUND):
+        self._status(text, duration=duration, priority=priority)
+
+    def frame(self, notes):
+        """Once per display update: wiggle the spinner if any notes came in since last time,
+        and draw what changed."""
+        if notes != self._notes:
+            self._notes = notes
+            self._spinner = (self._spinner + 1) % len(self.SPINNER)
+            self._status(self.SPINNER[self._spinner])
+        return self._renderer.frame()
+
+
+# ------------------------------------------------------------------------------
+
+class _MemoryStore:
+    def __init__(self, practice_ms=0, play_ms=0):
+        self.totals = (practice_ms, play_ms)
+        self.saves = 0
+        self.fail = False
+
+    def load(self):
+        return self.totals
+
+    def save(self, practice_ms, play_ms):
+        if self.fail:
+            raise OSError(30, "Read-only filesystem")
+        self.totals = (practice_ms, play_ms)
+        self.saves += 1
+
+    def reset(self):
+        self.save(0, 0)
+
+class _NullView:
+    def __init__(self):
+        self.totals = None
+        self.mode = None
+        self.status = None
+
+    def show_totals(self, practice_seconds, play_seconds):
+        self.totals = (practice_seconds, play_seconds)
+
+    def show_mode(self, practice_not_play):
+        self.mode = practice_not_play
+
+    def show_status(self, text, duration=None, priority=PRIORITY_BACKGROUND):
+        self.status = text
+
+def _tracker(now, store=None, view=None, **kwargs):
+    clock = session_clock.Clock(lambda: now[0])
+    return PracticeTracker(clock, store or _MemoryStore(), view or _NullView(), 15_000, 60_000, **kwargs)
+
+def test():
+    now = [1000]
+    store = _MemoryStore(60_000, 0)
+    view = _NullView()
+    tracker = _tracker(now, store, view)
+    assert view.totals == (60, 0)
+
+    # A 10-second session, a note every 100 ms, then the timeout.
+    for i in range(101):
+        tracker.on_note(now[0], 60)
+        tracker.tick(now[0])
+        now[0] += 100
+    assert tracker.in_session and view.totals == (70, 0), view.totals
+    now[0] += 15_000
+    tracker.tick(now[0])
+    # The timeout counts, as it always has.
+    assert not tracker.in_session and tracker.total_ms_prac == 60_000 + 10_000 + 100 + 15_000, tracker.total_ms_prac
+    assert tracker.persist(now[0]) and store.totals == (tracker.total_ms_prac, 0) and view.status == "DATA SAVED"
+    assert not tracker.persist(now[0])
+    assert tracker.sessions.count == 1
+
+    # Toggle to play: the command's own notes don't count.
+    before = tracker.total_ms_prac
+    for n in MIDI_TRIGGER_SEQ_TOGGLE_PRAC_PLAY:
+        tracker.on_note(now[0], n)
+        now[0] += 200
+    assert not tracker.practice_not_play_mode and view.mode is False
+    assert tracker.total_ms_prac == before, (tracker.total_ms_prac, before)
+    for i in range(50):
+        now[0] += 100
+        tracker.on_note(now[0], 72)
+    now[0] += 20_000
+    tracker.tick(now[0])
+    # From the end of the command to the timeout after the last note.
+    assert tracker.total_ms_prac == before and tracker.total_ms_play == 200 + 5000 + 20_000, tracker.total_ms_play
+
+    # Reset.
+    for n in MIDI_TRIGGER_SEQ_RESET:
+        tracker.on_note(now[0], n)
+        now[0] += 200
+    assert tracker.save_requested and tracker.current_totals() == (0, 0)
+    tracker.persist(now[0])
+    assert store.totals == (0, 0)
+
+    # Checkpoints in a long session, and a failed save.
+    now = [0]
+    store = _MemoryStore()
+    tracker = _tracker(now, store, checkpoints=checkpoint.CheckpointScheduler(
+        session_clock.Clock(lambda: now[0]), 600_000, 120_000, 30_000))
+    for i in range(3600):
+        tracker.on_note(now[0], 60)
+        tracker.tick(now[0])
+        tracker.persist(now[0])
+        now[0] += 1000
+    assert store.saves == 29 and store.totals[0] >= 3600_000 - 120_000, (store.saves, store.totals)
+    store.fail = True
+    tracker.on_disconnect(now[0])
+    assert not tracker.persist(now[0])
+    print("PracticeTracker OK")
+
+def benchmark(notes=100_000):
+    """Per-note cost of on_note(), and per-call cost of tick(), with a do-nothing view and store."""
+    import bench_util
+
+    now = [0]
+    tracker = _tracker(now)
+    stream = [48 + i % 37 for i in range(notes)]
+    index = [0]
+    def one_note():
+        i = index[0]
+        now[0] += 7
+        tracker.on_note(now[0], stream[i % notes])
+        index[0] = i + 1
+    def one_tick():
+        now[0] += 7
+        tracker.tick(now[0])
+
+    results = []
+    for name, fn in (("PracticeTracker.on_note", one_note), ("PracticeTracker.tick", one_tick)):
+        elapsed = bench_util.time_per_call(fn, notes) * notes
+        allocated = bench_util.bytes_allocated(fn, notes // 10)
+        results.append(bench_util.report(name, notes, elapsed, allocated))
+    return results
+
+# test()
+# benchmark()
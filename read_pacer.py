@@ -0,0 +1,152 @@
+'''
+How long to wait for MIDI, depending on whether anybody's playing.
+
+A fixed read timeout is wrong both ways. Long, and a fast passage sits in a blocking
+read while the display and the command matcher wait; short, and an idle unit wakes
+up hundreds of times a second to find nothing. So:
+
+  - ACTIVE (a note in the last 'hold_ms'): short reads, and no waiting between them.
+    'drain' is how many transfers to take in one go (midi_reader's fill()) while the
+    device has more;
+  - IDLE: after each empty read, wait a little longer than last time (doubling, from
+    'min_wait_ms' up to 'max_wait_ms') before reading again. The keyboard holds on to
+    anything it sends meanwhile; USB devices don't lose data when the host is slow to ask.
+
+The first note puts us straight back in ACTIVE.
+
+Also keeps the numbers to show it's working: loop wakeups (reads) per second, and
+note-to-display latency, for each regime. The latency is from the end of the read
+before the one that got the note (the earliest it can have arrived, so this is the
+worst case) to the display refresh that showed it.
+'''
+
+from adafruit_ticks import ticks_diff
+
+
+ACTIVE = 0
+IDLE = 1
+REGIME_NAMES = ("active", "idle")
+
+
+class ReadPacer:
+
+    def __init__(self, timeout_ms=2, hold_ms=2000, drain=4, min_wait_ms=5, max_wait_ms=100):
+        """timeout_ms is the read timeout in ACTIVE. The waits are in IDLE; see above."""
+        self.timeout_ms = timeout_ms
+        self._hold_ms = hold_ms
+        self.drain = drain
+        self._min_wait_ms = min_wait_ms
+        self._max_wait_ms = max_wait_ms
+
+        self.regime = IDLE
+        self.wait_ms = min_wait_ms
+        self._last_note = 0
+        self._last_read = None
+
+        # For latency: the earliest the oldest note not yet on the screen can have come in.
+        self._pending = None
+        self._pending_regime = IDLE
+
+        # Per regime: reads, ms spent in it, and latency count/total/worst.
+        self._regime_start = None
+        self.reads = [0, 0]
+        self.ms = [0, 0]
+        self.latency_count = [0, 0]
+        self.latency_total = [0, 0]
+        self.latency_worst = [0, 0]
+
+    def read_done(self, now, notes):
+        """Tell us a read just finished, and how many notes it got.
+        Return how long to wait before the next read: 0 for straight away."""
+        if self._regime_start is None:
+            self._regime_start = now
+        self.reads[self.regime] += 1
+
+        if notes:
+            if self._pending is None:
+                self._pending = now if self._last_read is None else self._last_read
+                self._pending_regime = self.regime
+            self._last_note = now
+            self._set_regime(ACTIVE, now)
+            self.wait_ms = self._min_wait_ms
+        elif self.regime == ACTIVE and ticks_diff(now, self._last_note) > self._hold_ms:
+            self._set_regime(IDLE, now)
+
+        self._last_read = now
+        if self.regime == ACTIVE or notes:
+            return 0
+        wait = self.wait_ms
+        self.wait_ms = min(self.wait_ms * 2, self._max_wait_ms)
+        return wait
+
+    def displayed(self, now):
+        """Tell us the display just refreshed; any notes we've seen are on it now."""
+        if self._pending is None:
+            return
+        latency = ticks_diff(now, self._pending)
+        regime = self._pending_regime
+        self._pending = None
+        self.latency_count[regime] += 1
+        self.latency_total[regime] += latency
+        if latency > self.latency_worst[regime]:
+            self.latency_worst[regime] = latency
+
+    def _set_regime(self, regime, now):
+        if regime != self.regime:
+            self.ms[self.regime] += ticks_diff(now, self._regime_start)
+            self._regime_start = now
+            self.regime = regime
+
+    def stats(self, now):
+        """One line per regime, then start counting again."""
+        lines = []
+        if self._regime_start is not None:
+            # Count the time in the regime we're in, up to now.
+            self.ms[self.regime] += ticks_diff(now, self._regime_start)
+            self._regime_start = now
+        for regime in (ACTIVE, IDLE):
+            seconds = self.ms[regime] / 1000
+            rate = self.reads[regime] / seconds if seconds else 0
+            count = self.latency_count[regime]
+            mean = self.latency_total[regime] // count if count else 0
+            lines.append(f"pacer {REGIME_NAMES[regime]:6}: {seconds:8.1f} s, {rate:6.1f} wakeups/s, "
+                         f"note-to-display {mean} ms mean, {self.latency_worst[regime]} ms worst ({count} refreshes)")
+            self.reads[regime] = 0
+            self.ms[regime] = 0
+            self.latency_count[regime] = 0
+            self.latency_total[regime] = 0
+            self.latency_worst[regime] = 0
+        return "\n".join(lines)
+
+
+# ------------------------------------------------------------------------------
+
+def test():
+    pacer = ReadPacer(timeout_ms=2, hold_ms=1000, drain=4, min_wait_ms=5, max_wait_ms=80)
+    t = 0
+
+    # Idle: the waits double, up to the most.
+    waits = []
+    for i in range(6):
+        wait = pacer.read_done(t, 0)
+        waits.append(wait)
+        t += wait
+    assert waits == [5, 10, 20, 40, 80, 80], waits
+    assert pacer.regime == IDLE
+
+    # A note: read again right away, and stay active for hold_ms.
+    assert pacer.read_done(t, 2) == 0 and pacer.regime == ACTIVE
+    t += 30
+    pacer.displayed(t)
+    # (It came in while we were idle, so it counts there: from the read before, 80 ms back.)
+    assert pacer.latency_worst[IDLE] == 30 + 80, pacer.latency_worst
+    while t < 235 + 1000:
+        t += 2
+        assert pacer.read_done(t, 0) == 0
+    t += 2
+    assert pacer.read_done(t, 0) == 5 and pacer.regime == IDLE
+
+    print(pacer.stats(t + 100))
+    print("ReadPacer OK")
+
+# test()
@@ -0,0 +1,95 @@
+'''
+A layer between the main loop and the display that only draws what changed.
+
+Assigning a label's text re-lays out all its glyphs, and with auto_refresh on,
+every assignment also kicks off an SPI refresh. So instead: the main loop tells
+us the totals as often as it likes; we remember the last value we actually drew
+for each field, and at most 'fps' times a second we push just the fields that
+changed, then do one refresh for everything (status line and colors included).
+
+Idle, set_idle() blanks the display - the panel goes to sleep - and we draw nothing
+at all; the next frame after it's woken up redraws everything.
+
+Keeps counts of fields rendered vs. skipped, so we can see what it saves us.
+'''
+
+from adafruit_ticks import ticks_add, ticks_diff, ticks_ms
+
+
+FIELD_PRACTICE = 0
+FIELD_PLAY = 1
+FIELD_COUNT = 2 # at most
+
+
+class Renderer:
+
+    def __init__(self, display, fps, formatters):
+        """display is one of our display classes; formatters are one per field, and
+        turn integer seconds into text - hms_format.HMSCounter objects, say.
+        One formatter means just the practice total, in the display's text 1."""
+        self._display = display
+        self._formatters = formatters
+        self._frame_ms = 1000 // fps
+        self._fields = len(formatters)
+
+        # What's wanted, and what's on the screen now. None means "never drawn".
+        self._wanted = [0] * FIELD_COUNT
+        self._rendered = [None] * FIELD_COUNT
+        self._setters = (display.set_text_1, display.set_text_2)[0:self._fields]
+
+        self._next_frame = ticks_ms()
+
+        self.renders = 0
+        self.skipped = 0
+        self.refreshes = 0
+
+        # We decide when to refresh, not displayio.
+        display.set_auto_refresh(False)
+
+    def show_totals(self, practice_seconds, play_seconds):
+        """Ask for these totals to be shown. Cheap; call as often as you like."""
+        self._wanted[FIELD_PRACTICE] = int(practice_seconds)
+        self._wanted[FIELD_PLAY] = int(play_seconds)
+
+    def invalidate(self):
+        """Forget what's on the screen, so everything gets redrawn (after blanking it, say)."""
+        for i in range(self._fields):
+            self._rendered[i] = None
+
+    def set_idle(self, idle):
+        """Tell us whether we're idle, as often as you like. Going idle puts the display to
+        sleep; coming back wakes it, and the next frame - as soon as the panel's ready for
+        it - draws everything again."""
+        if idle:
+            self._display.blank_screen()
+        elif self._display.wake():
+            self.invalidate()
+            self._next_frame = ticks_add(ticks_ms(), self._display.WAKE_MS)
+
+    def frame(self):
+        """Draw whatever changed, if it's time for a new frame. Return True if we refreshed the screen."""
+        now = ticks_ms()
+        if ticks_diff(now, self._next_frame) < 0:
+            return False
+        if self._display.asleep():
+            return False
+        self._next_frame = ticks_add(now, self._frame_ms)
+
+        for i in range(self._fields):
+            value = self._wanted[i]
+            if value == self._rendered[i]:
+                self.skipped += 1
+                continue
+            self._rendered[i] = value
+            self._setters[i](self._formatters[i](value))
+            self.renders += 1
+
+        # The display knows if anything else (status, colors) changed too.
+        if self._display.refresh():
+            self.refreshes += 1
+            return True
+        return False
+
+    def stats(self):
+        return (f"render: {self.renders} fields drawn, {self.skipped} skipped, {self.refreshes} refreshes, "
+                f"{self._display.sleeps} sleeps")
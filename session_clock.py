@@ -0,0 +1,153 @@
+'''
+Integer-millisecond timekeeping for sessions, timeouts and the like.
+
+time.monotonic() is a float, and CircuitPython floats only have about 22 bits of
+mantissa, so once the board has been up a few hours it can't tell one millisecond
+from the next - and after a few days, not even one second from the next. Our units
+stay plugged in for weeks.
+
+So everything here is built on adafruit_ticks: an integer millisecond counter that
+wraps around every 2**29 ms (about 6.2 days). Differences between two readings are
+right as long as they're less than half that, so:
+
+  - Accumulator adds up elapsed time a little at a time (every update()), and keeps
+    the total as a plain int, which never wraps.
+  - Timeout latches once it has expired, so it can't "un-expire" when the counter wraps.
+
+Both just need to be looked at more often than every 3 days or so; our tasks do it
+several times a second.
+'''
+
+from adafruit_ticks import ticks_diff, ticks_ms
+
+
+class Clock:
+    """Where the ticks come from. Swap in a fake one for testing or simulation."""
+
+    def __init__(self, ticks=ticks_ms):
+        self._ticks = ticks
+
+    def now(self):
+        """Current time, in wrapping ticks_ms() milliseconds."""
+        return self._ticks()
+
+    def since(self, then):
+        """Milliseconds from 'then' until now (valid for up to ~3 days)."""
+        return ticks_diff(self._ticks(), then)
+
+
+class Accumulator:
+    """Total milliseconds spent running, added up one update() at a time."""
+
+    def __init__(self, clock):
+        self._clock = clock
+        self.ms = 0
+        self.running = False
+        self._last = 0
+
+    def start(self, now=None):
+        """Start counting from zero."""
+        self.ms = 0
+        self.running = True
+        self._last = self._clock.now() if now is None else now
+
+    def update(self, now=None):
+        """Add the time since the last update; return the total."""
+        if self.running:
+            if now is None:
+                now = self._clock.now()
+            self.ms += ticks_diff(now, self._last)
+            self._last = now
+        return self.ms
+
+    def stop(self, now=None):
+        """Stop counting; return the total."""
+        self.update(now)
+        self.running = False
+        return self.ms
+
+
+class Timeout:
+    """Goes off duration_ms after the last restart(), and stays off until the next one."""
+
+    def __init__(self, clock, duration_ms):
+        self._clock = clock
+        self.duration_ms = duration_ms
+        self._start = clock.now()
+        self._expired = False
+
+    def restart(self, now=None):
+        self._start = self._clock.now() if now is None else now
+        self._expired = False
+
+    def expired(self, now=None):
+        if not self._expired:
+            if now is None:
+                now = self._clock.now()
+            if ticks_diff(now, self._start) > self.duration_ms:
+                self._expired = True
+        return self._expired
+
+
+def seconds(ms):
+    """Whole seconds, for display."""
+    return ms // 1000
+
+
+# ------------------------------------------------------------------------------
+
+def _float32(x):
+    """Round to single precision - about as good as a CircuitPython float gets (it's worse, really)."""
+    import struct
+    return struct.unpack("f", struct.pack("f", x))[0]
+
+def test(weeks=6, tick_ms=333):
+    """Simulate weeks of uptime, in steps of tick_ms, with a 10-minute session every 3 hours.
+    The integer total, kept from the wrapping tick counter, must match the true elapsed time
+    exactly; the float one, kept the way the old code did it, doesn't."""
+
+    TICKS_PERIOD = 1 << 29
+
+    # Booting at some odd millisecond, so the numbers aren't conveniently round.
+    BOOT_MS = 1237
+    true_ms = [BOOT_MS - tick_ms]
+    clock = Clock(lambda: true_ms[0] % TICKS_PERIOD)
+
+    session = Accumulator(clock)
+    timeout = Timeout(clock, 15_000)
+    total_ms = 0
+    expected_ms = 0
+    session_start_ms = 0
+
+    float_total = 0.0
+    float_start = 0.0
+
+    SESSION_EVERY = 3 * 3600 * 1000
+    SESSION_LENGTH = 10 * 60 * 1000
+    end = weeks * 7 * 24 * 3600 * 1000
+    wraps = 0
+    while true_ms[0] < end:
+        true_ms[0] += tick_ms
+        if true_ms[0] % TICKS_PERIOD < tick_ms:
+            wraps += 1
+
+        if (true_ms[0] - BOOT_MS) % SESSION_EVERY < SESSION_LENGTH:
+            # Playing: a note every tick.
+            if not session.running:
+                session.start()
+                session_start_ms = true_ms[0]
+                float_start = _float32(true_ms[0] / 1000)
+            timeout.restart()
+
+        if session.running:
+            session.update()
+            if timeout.expired():
+                total_ms += session.stop()
+                expected_ms += true_ms[0] - session_start_ms
+                float_total = _float32(float_total + (_float32(true_ms[0] / 1000) - float_start))
+
+    print(f"{weeks} weeks, {wraps} tick wraps: integer total {total_ms} ms, true total {expected_ms} ms; "
+          f"float total {float_total:.3f} s (off by {float_total - expected_ms / 1000:.3f} s)")
+    assert total_ms == expected_ms
+
+# test()
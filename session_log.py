@@ -0,0 +1,41 @@
+'''
+The last few sessions, for looking back at: when each one started, how long it
+was, and whether it counted as practice or play. A fixed-size ring, so it never
+grows however long the unit stays up.
+'''
+
+
+class SessionLog:
+
+    def __init__(self, size=16):
+        self._starts = [0] * size
+        self._lengths = [0] * size
+        self._practice = [False] * size
+        self._size = size
+
+        # Sessions ever logged; the ring holds the last 'size' of them.
+        self.count = 0
+
+    def add(self, start, length_ms, practice):
+        """Log a session: start in ticks_ms() milliseconds, length in ms."""
+        i = self.count % self._size
+        self._starts[i] = start
+        self._lengths[i] = length_ms
+        self._practice[i] = practice
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self._size)
+
+    def __iter__(self):
+        """The sessions we still have, oldest first, as (start, length_ms, practice)."""
+        for n in range(self.count - len(self), self.count):
+            i = n % self._size
+            yield self._starts[i], self._lengths[i], self._practice[i]
+
+    def last(self):
+        """The latest session, or None."""
+        if self.count == 0:
+            return None
+        i = (self.count - 1) % self._size
+        return self._starts[i], self._lengths[i], self._practice[i]
@@ -0,0 +1,72 @@
+'''
+Run MIDI-bit on a PC, with simulated hardware.
+
+sim/fakes has stand-ins for the CircuitPython modules and Adafruit libraries the
+code imports - board, microcontroller, supervisor, neopixel, usb.core, displayio,
+adafruit_ticks and friends - all backed by one simulated world (see world.py):
+
+  - a virtual clock, which only moves when the code waits for something;
+  - a USB bus that devices get plugged into and out of on a schedule;
+  - MIDI devices that play a note script (see script.py);
+  - an NVM bytearray;
+  - headless displays that count their refreshes.
+
+install() puts the stand-ins first on sys.path, points time.monotonic() and
+time.sleep() at the virtual clock, and makes asyncio.run() use an event loop that
+skips ahead on the virtual clock instead of sleeping. Then midibit_2 (or
+prac_mon_feather) can just be imported, unmodified, and runs until the virtual
+clock reaches the end, when world.SimulationOver gets raised.
+
+See run.py for the whole thing, with some numbers at the end:
+
+    python -m sim.run --hours 4
+'''
+
+import asyncio
+import os
+import sys
+import time
+
+from sim import world
+from sim.loop import VirtualTimePolicy
+
+
+FAKES = os.path.join(os.path.dirname(__file__), "fakes")
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that have to come from sim/fakes, not from whatever's installed (Blinka, say).
+FAKE_MODULES = ("board", "microcontroller", "supervisor", "neopixel", "digitalio", "storage",
+                "usb", "usb.core", "displayio", "fourwire", "i2cdisplaybus", "terminalio",
+                "adafruit_ticks", "adafruit_usb_host_midi", "adafruit_usb_host_descriptors", "adafruit_imageload",
+                "adafruit_bitmap_font", "adafruit_bitmap_font.bitmap_font",
+                "adafruit_display_text", "adafruit_display_text.label",
+                "adafruit_st7735r", "adafruit_displayio_ssd1306")
+
+
+def install(end_ms, boot_ticks=world.BOOT_TICKS, mode=None, speed=None, patch_time=True):
+    """Start a new world that ends after end_ms of sim time, and make it what the code sees.
+    mode is the NVM run/dev byte (midibit_defines.MAGIC_NUMBER_*), if it should be set.
+    speed, if given, holds sim time to that many times real time; otherwise, as fast as it goes.
+    patch_time False leaves the time module alone (for timing our own code against the fakes)."""
+    world.reset(end_ms, boot_ticks, speed)
+    if mode is not None:
+        world.nvm[0] = mode
+
+    if FAKES not in sys.path:
+        sys.path.insert(0, FAKES)
+    for name in FAKE_MODULES:
+        sys.modules.pop(name, None)
+    # And our own modules, so they import this world's fakes, not the last one's (midi_reader
+    # holding on to an old usb.core's USBTimeoutError, say) - for more than one run per process.
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if name != "__main__" and path and os.path.dirname(os.path.abspath(path)) == REPO:
+            del sys.modules[name]
+
+    if patch_time:
+        time.monotonic = world.clock.monotonic
+        time.monotonic_ns = lambda: world.clock.ns
+        time.sleep = world.clock.sleep
+
+    asyncio.set_event_loop_policy(VirtualTimePolicy())
+    return world
@@ -0,0 +1,22 @@
+# Stand-in for adafruit_bitmap_font: fonts with a size and no glyphs.
+
+
+class _Font:
+
+    def __init__(self, name, width, height):
+        self.name = name
+        self._width = width
+        self._height = height
+
+    def get_bounding_box(self):
+        return self._width, self._height, 0, 0
+
+    def get_glyph(self, code_point):
+        return None
+
+    def load_glyphs(self, code_points):
+        pass
+
+
+def load_font(filename, bitmap=None):
+    return _Font(filename, 14, 22)
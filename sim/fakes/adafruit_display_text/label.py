@@ -0,0 +1,41 @@
+# Stand-in for adafruit_display_text.label. Counts text and color changes - the real
+# Label re-lays out its glyphs on each one - and tells the display something changed.
+
+from sim import world
+
+
+class Label:
+
+    def __init__(self, font, *, text="", color=0xFFFFFF, scale=1, x=0, y=0, **kwargs):
+        self.font = font
+        self._text = text
+        self._color = color
+        self.scale = scale
+        self.x = x
+        self.y = y
+        self.hidden = False
+        self.updates = 0
+        world.labels.append(self)
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        self._text = text
+        self._changed()
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        self._color = color
+        self._changed()
+
+    def _changed(self):
+        self.updates += 1
+        for display in world.displays:
+            display.changed()
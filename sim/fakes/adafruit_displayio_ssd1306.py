@@ -0,0 +1,16 @@
+# Stand-in for adafruit_displayio_ssd1306.
+
+import displayio
+
+
+class SSD1306(displayio.Display):
+
+    def __init__(self, bus, *, width=128, height=32, **kwargs):
+        super().__init__(bus, width=width, height=height, **kwargs)
+        self.bytes_per_refresh = width * height // 8
+
+    def sleep(self):
+        self.bus.send(0xAE, b"")
+
+    def wake(self):
+        self.bus.send(0xAF, b"")
@@ -0,0 +1,9 @@
+# Stand-in for adafruit_imageload: doesn't read the file, just makes a 128x128 bitmap.
+
+import displayio
+
+
+def load(file_or_filename, *, bitmap=None, palette=None):
+    bitmap = (bitmap or displayio.Bitmap)(128, 128, 256)
+    palette = (palette or displayio.Palette)(256)
+    return bitmap, palette
@@ -0,0 +1,9 @@
+# Stand-in for adafruit_st7735r.
+
+import displayio
+
+
+class ST7735R(displayio.Display):
+
+    def __init__(self, bus, *, width=128, height=128, colstart=0, rowstart=0, **kwargs):
+        super().__init__(bus, width=width, height=height, **kwargs)
@@ -0,0 +1,24 @@
+# Stand-in for adafruit_ticks, on the simulated clock. Same wrapping arithmetic as the real one.
+
+from sim import world
+
+_TICKS_PERIOD = world.TICKS_PERIOD
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+
+def ticks_ms():
+    return world.clock.ticks_ms()
+
+def ticks_add(ticks, delta):
+    if -_TICKS_HALFPERIOD < delta < _TICKS_HALFPERIOD:
+        return (ticks + delta) % _TICKS_PERIOD
+    raise OverflowError("ticks interval overflow")
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & _TICKS_MAX
+    diff = ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+    return diff
+
+def ticks_less(ticks1, ticks2):
+    return ticks_diff(ticks2, ticks1) > 0
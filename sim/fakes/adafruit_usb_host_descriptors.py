@@ -0,0 +1,31 @@
+# Stand-in for adafruit_usb_host_descriptors: the same control requests, which the
+# simulated devices answer (see world.SimDevice.ctrl_transfer).
+
+import struct
+
+DESC_DEVICE = 0x01
+DESC_CONFIGURATION = 0x02
+DESC_STRING = 0x03
+DESC_INTERFACE = 0x04
+DESC_ENDPOINT = 0x05
+
+_REQ_GET_DESCRIPTOR = 6
+_DIR_IN = 0x80
+
+
+def get_descriptor(device, desc_type, index, buf, language_id=0):
+    device.ctrl_transfer(_DIR_IN, _REQ_GET_DESCRIPTOR, desc_type << 8 | index, language_id, buf)
+
+def get_device_descriptor(device):
+    buf = bytearray(1)
+    get_descriptor(device, DESC_DEVICE, 0, buf)
+    full_buf = bytearray(buf[0])
+    get_descriptor(device, DESC_DEVICE, 0, full_buf)
+    return full_buf
+
+def get_configuration_descriptor(device, index):
+    buf = bytearray(4)
+    get_descriptor(device, DESC_CONFIGURATION, index, buf)
+    full_buf = bytearray(struct.unpack("<xxH", buf)[0])
+    get_descriptor(device, DESC_CONFIGURATION, index, full_buf)
+    return full_buf
@@ -0,0 +1,31 @@
+# Stand-in for adafruit_usb_host_midi: finds the simulated device's MIDI endpoints.
+
+import usb.core
+
+
+class MIDI:
+
+    def __init__(self, device, timeout=None):
+        if not device.is_midi:
+            raise ValueError("No MIDI interface found")
+        if not device.attached:
+            raise usb.core.USBError("No such device")
+        self.device = device
+        self.in_ep = 0x81
+        self.out_ep = 0x01
+        self.interface = 1
+        self.timeout = timeout
+
+    def read(self, size):
+        buf = bytearray(size)
+        try:
+            n = self.device.read(self.in_ep, buf, int((self.timeout or 0) * 1000))
+        except usb.core.USBTimeoutError:
+            return None
+        return bytes(buf[:n])
+
+    def write(self, buf):
+        self.device.write(self.out_ep, buf)
+
+    def __repr__(self):
+        return f"<MIDI {self.device.product}>"
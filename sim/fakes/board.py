@@ -0,0 +1,38 @@
+# Stand-in for CircuitPython's board module: the pins we use, as names.
+
+from sim import world
+
+D5 = "D5"
+D6 = "D6"
+D7 = "D7"
+D9 = "D9"
+SCK = "SCK"
+MOSI = "MOSI"
+MISO = "MISO"
+SCL = "SCL"
+SDA = "SDA"
+NEOPIXEL = "NEOPIXEL"
+
+
+class _Bus:
+    def __init__(self, name):
+        self.name = name
+
+    def try_lock(self):
+        return True
+
+    def unlock(self):
+        pass
+
+    def scan(self):
+        return list(world.i2c_addresses)
+
+    def deinit(self):
+        pass
+
+
+def SPI():
+    return _Bus("SPI")
+
+def I2C():
+    return _Bus("I2C")
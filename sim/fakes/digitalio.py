@@ -0,0 +1,32 @@
+# Stand-in for CircuitPython's digitalio. Inputs read high (so, buttons not pushed).
+
+
+class Pull:
+    UP = "UP"
+    DOWN = "DOWN"
+
+
+class Direction:
+    INPUT = "INPUT"
+    OUTPUT = "OUTPUT"
+
+
+class DigitalInOut:
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.value = True
+        self.direction = Direction.INPUT
+        self.pull = None
+
+    def switch_to_input(self, pull=None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+        self.value = True
+
+    def switch_to_output(self, value=False):
+        self.direction = Direction.OUTPUT
+        self.value = value
+
+    def deinit(self):
+        pass
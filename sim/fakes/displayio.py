@@ -0,0 +1,159 @@
+# Stand-in for CircuitPython's displayio: enough of it for our display classes, drawing nothing.
+# Display counts its refreshes - and with auto_refresh on, every change to what's shown.
+
+from sim import world
+
+
+class Group(list):
+
+    def __init__(self, *, scale=1, x=0, y=0):
+        super().__init__()
+        self.scale = scale
+        self.x = x
+        self.y = y
+        self.hidden = False
+
+
+class Bitmap:
+
+    def __init__(self, width, height, value_count):
+        self.width = width
+        self.height = height
+        self._pixels = bytearray(width * height) if value_count <= 256 else [0] * (width * height)
+
+    def __getitem__(self, xy):
+        x, y = xy
+        return self._pixels[y * self.width + x]
+
+    def __setitem__(self, xy, value):
+        x, y = xy
+        self._pixels[y * self.width + x] = value
+
+    def fill(self, value):
+        for i in range(len(self._pixels)):
+            self._pixels[i] = value
+
+
+class Palette(list):
+
+    def __init__(self, color_count, *, dither=False):
+        super().__init__([0] * color_count)
+
+    def make_transparent(self, index):
+        pass
+
+    def make_opaque(self, index):
+        pass
+
+
+class ColorConverter:
+
+    def __init__(self, *, input_colorspace=None, dither=False):
+        pass
+
+
+class OnDiskBitmap:
+
+    def __init__(self, file):
+        self.width = 128
+        self.height = 128
+        self.pixel_shader = ColorConverter()
+
+
+class TileGrid:
+
+    def __init__(self, bitmap, *, pixel_shader, width=1, height=1, tile_width=None, tile_height=None,
+                 default_tile=0, x=0, y=0):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.x = x
+        self.y = y
+        self.hidden = False
+        self._tiles = [default_tile] * (width * height)
+
+    def __getitem__(self, i):
+        return self._tiles[i]
+
+    def __setitem__(self, i, tile):
+        self._tiles[i] = tile
+
+
+class Display:
+    """What ST7735R and SSD1306 give us. Counts refreshes, and bytes 'sent' to the panel."""
+
+    def __init__(self, display_bus, *, width, height, **kwargs):
+        self.bus = display_bus
+        self.width = width
+        self.height = height
+        self.rotation = 0
+        self.brightness = 1.0
+        self.auto_refresh = True
+        self.root_group = None
+        self.refreshes = 0
+        self.bytes_per_refresh = width * height * 2
+        world.displays.append(self)
+
+    def refresh(self, *, target_frames_per_second=None, minimum_frames_per_second=0):
+        self.refreshes += 1
+        self.bus.sent(self.bytes_per_refresh)
+        return True
+
+    def changed(self):
+        """Something on screen changed; with auto_refresh, that's a refresh."""
+        if self.auto_refresh:
+            self.refresh()
+
+    @property
+    def renders(self):
+        return self.refreshes
+
+
+# The panels' sleep and wake commands: SSD1306 display off / on, ST7735 SLPIN / SLPOUT.
+SLEEP_COMMANDS = (0xAE, 0x10)
+WAKE_COMMANDS = (0xAF, 0x11)
+
+
+class _DisplayBus:
+    """Counts bytes sent, and - between a sleep command and a wake - how long the panel
+    was asleep, and what got sent to it meanwhile (which should be nothing)."""
+
+    def __init__(self, *args, **kwargs):
+        self.bytes_sent = 0
+        self.commands = []
+        self.asleep_since = None
+        self.asleep_ms = 0
+        self.bytes_sent_asleep = 0
+
+    def send(self, command, data):
+        self.commands.append((command, bytes(data)))
+        if command in WAKE_COMMANDS and self.asleep_since is not None:
+            self.asleep_ms += world.clock.ms - self.asleep_since
+            self.asleep_since = None
+        self.sent(1 + len(data))
+        if command in SLEEP_COMMANDS and self.asleep_since is None:
+            self.asleep_since = world.clock.ms
+
+    def sent(self, count):
+        self.bytes_sent += count
+        if self.asleep_since is not None:
+            self.bytes_sent_asleep += count
+
+    def total_asleep_ms(self):
+        if self.asleep_since is None:
+            return self.asleep_ms
+        return self.asleep_ms + world.clock.ms - self.asleep_since
+
+    def reset(self):
+        pass
+
+
+class I2CDisplay(_DisplayBus):
+    pass
+
+
+class FourWire(_DisplayBus):
+    pass
+
+
+def release_displays():
+    pass
@@ -0,0 +1,3 @@
+# Stand-in for CircuitPython's fourwire module.
+
+from displayio import FourWire
@@ -0,0 +1,3 @@
+# Stand-in for CircuitPython's i2cdisplaybus module.
+
+from displayio import I2CDisplay as I2CDisplayBus
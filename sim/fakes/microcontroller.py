@@ -0,0 +1,17 @@
+# Stand-in for CircuitPython's microcontroller module. nvm is the simulated world's bytearray.
+
+from sim import world
+
+nvm = world.nvm
+
+
+class _CPU:
+    frequency = 125_000_000
+    temperature = 25.0
+    voltage = 3.3
+
+cpu = _CPU()
+
+
+def reset():
+    raise world.SimulationOver("microcontroller.reset()")
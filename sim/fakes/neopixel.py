@@ -0,0 +1,32 @@
+# Stand-in for the neopixel library. Remembers its colors, and counts fills.
+
+from sim import world
+
+
+class NeoPixel:
+
+    def __init__(self, pin, n, brightness=1.0, auto_write=True):
+        self.pin = pin
+        self.brightness = brightness
+        self._pixels = [(0, 0, 0)] * n
+        self.fills = 0
+        world.pixels.append(self)
+
+    def fill(self, color):
+        self._pixels = [color] * len(self._pixels)
+        self.fills += 1
+
+    def __setitem__(self, i, color):
+        self._pixels[i] = color
+
+    def __getitem__(self, i):
+        return self._pixels[i]
+
+    def __len__(self):
+        return len(self._pixels)
+
+    def show(self):
+        pass
+
+    def deinit(self):
+        pass
@@ -0,0 +1,4 @@
+# Stand-in for CircuitPython's storage module; the host filesystem is always writable.
+
+def remount(path, readonly=False, *, disable_concurrent_write_protection=False):
+    pass
@@ -0,0 +1,18 @@
+# Stand-in for CircuitPython's supervisor module.
+
+from sim import world
+
+
+class _Runtime:
+    autoreload = True
+    serial_connected = True
+    usb_connected = True
+
+runtime = _Runtime()
+
+
+def ticks_ms():
+    return world.clock.ticks_ms()
+
+def reload():
+    raise world.SimulationOver("supervisor.reload()")
@@ -0,0 +1,5 @@
+# Stand-in for CircuitPython's terminalio: just the built-in font.
+
+from adafruit_bitmap_font.bitmap_font import _Font
+
+FONT = _Font("terminalio", 6, 12)
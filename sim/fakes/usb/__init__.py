@@ -0,0 +1 @@
+# Stand-in for CircuitPython's usb package; see core.py.
@@ -0,0 +1,20 @@
+# Stand-in for usb.core, on the simulated USB bus.
+
+from sim import world
+
+
+class USBError(OSError):
+    pass
+
+
+class USBTimeoutError(USBError):
+    pass
+
+
+def find(find_all=False, idVendor=None, idProduct=None):
+    devices = [d for d in world.bus.find()
+               if (idVendor is None or d.idVendor == idVendor)
+               and (idProduct is None or d.idProduct == idProduct)]
+    if find_all:
+        return iter(devices)
+    return devices[0] if devices else None
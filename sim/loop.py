@@ -0,0 +1,41 @@
+'''
+An asyncio event loop that runs on the simulated clock.
+
+When every task is waiting, a real loop blocks in select() until the next timer is
+due. This one just moves the virtual clock forward to then, so an hour of
+asyncio.sleep()s takes as long as the code in between them does.
+'''
+
+import asyncio
+import math
+import selectors
+
+from sim import world
+
+
+class VirtualSelector(selectors.SelectSelector):
+
+    def select(self, timeout=None):
+        if timeout is None:
+            # Nothing scheduled at all: skip to the end.
+            world.clock.advance_ns(world.clock.until_end_ns() or 0)
+        elif timeout > 0:
+            world.clock.advance_ns(math.ceil(timeout * 1_000_000_000))
+        # Still look at the real file descriptors (the loop's own wakeup pipe), without waiting.
+        return super().select(0)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+
+    def __init__(self):
+        super().__init__(VirtualSelector())
+
+    def time(self):
+        return world.clock.monotonic()
+
+
+class VirtualTimePolicy(asyncio.DefaultEventLoopPolicy):
+    """So asyncio.run() - called however deep inside the code under test - gets our loop."""
+
+    def new_event_loop(self):
+        return VirtualTimeLoop()
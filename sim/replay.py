@@ -0,0 +1,367 @@
+'''
+Replay a recorded performance through MIDI-bit, on simulated hardware, much faster
+than real time - so checking session accounting and timeouts doesn't mean playing
+the keyboard for real minutes.
+
+    python -m sim.replay FILE [FILE...] [--gap 60] [--tail 120] [--speed 1000] [--entry tracker] [--dev]
+
+By default (--entry tracker) the events go straight to a PracticeTracker on the virtual
+clock - decoded by midi_reader, as on the device, then on_note(), tick() and persist(),
+with midibit_2's timeouts and checkpoints - and nothing else: no display, no asyncio
+loop, no USB polling; between sessions the clock jumps straight to the next event. A day
+of recordings goes through in seconds. --entry midibit_2 (or prac_mon_feather) runs the
+whole entry point instead, unmodified, polling and all, which is slower but is the real
+thing end to end.
+
+Each FILE is a Standard MIDI File (.mid) or a raw packet log (anything else; see
+read_packet_log). Several files are played one after another, 'gap' seconds apart,
+so a day of recordings can go through in one run. At the end we print the saved
+practice/play totals, the session boundaries, and events handled per wall-clock
+second. Without --speed it goes as fast as it can; with it, that many times real time.
+'''
+
+import argparse
+import contextlib
+import io
+import os
+import struct
+import tempfile
+import time
+
+import sim
+from sim import run, world
+
+
+# Where the first event goes, in sim time: after the keyboard is plugged in and found.
+PLUG_MS = 1000
+START_MS = 5000
+
+# The fast path's settings: midibit_2's.
+TRACKER_ENTRY = "tracker"
+SESSION_TIMEOUT_MS = 15_000
+DEV_SESSION_TIMEOUT_MS = 5_000
+DISPLAY_IDLE_TIMEOUT_MS = 60_000
+CHECKPOINT_INTERVAL_MS = 10 * 60_000
+CHECKPOINT_DELTA_MS = 2 * 60_000
+CHECKPOINT_MIN_GAP_MS = 30_000
+# How often the session gets ticked while one's going (midibit_2's SESSION_TICK).
+TICK_MS = 100
+
+
+# ------------------------------------------------------------------------------
+# Standard MIDI Files
+
+def _varlen(data, i):
+    value = 0
+    while True:
+        b = data[i]
+        i += 1
+        value = (value << 7) | (b & 0x7F)
+        if not b & 0x80:
+            return value, i
+
+def read_smf(path):
+    """Read a Standard MIDI File (format 0 or 1). Return [(time_ms, USB-MIDI packet)], time 0 at the
+    start of the file. Channel messages only; meta events (but tempo) and SysEx are skipped."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[0:4] != b"MThd":
+        raise ValueError(f"{path}: not a Standard MIDI File")
+    length, format, tracks, division = struct.unpack(">IHHH", data[4:14])
+    i = 8 + length
+
+    # Everything, from every track, in ticks; tempo changes are (tick, None, tempo).
+    events = []
+    for track in range(tracks):
+        if data[i:i+4] != b"MTrk":
+            raise ValueError(f"{path}: bad track {track}")
+        (length,) = struct.unpack(">I", data[i+4:i+8])
+        j = i + 8
+        end = j + length
+        i = end
+        tick = 0
+        status = 0
+        while j < end:
+            delta, j = _varlen(data, j)
+            tick += delta
+            b = data[j]
+            if b == 0xFF:
+                kind = data[j+1]
+                length, j = _varlen(data, j + 2)
+                if kind == 0x51:
+                    events.append((tick, None, int.from_bytes(data[j:j+3], "big")))
+                elif kind == 0x2F:
+                    break
+                j += length
+                continue
+            if b in (0xF0, 0xF7):
+                length, j = _varlen(data, j + 1)
+                j += length
+                continue
+            if b & 0x80:
+                status = b
+                j += 1
+            # else running status: b is the first data byte
+            if status & 0xF0 in (0xC0, 0xD0):
+                d1, d2 = data[j], 0
+                j += 1
+            else:
+                d1, d2 = data[j], data[j+1]
+                j += 2
+            events.append((tick, bytes((status >> 4, status, d1, d2)), None))
+
+    # Ticks to milliseconds, following the tempo map (tempo changes sort first at a given tick).
+    events.sort(key=lambda e: (e[0], e[1] is not None))
+    if division & 0x8000:
+        # SMPTE: frames per second (negative) and ticks per frame.
+        ticks_per_second = (256 - (division >> 8)) * (division & 0xFF)
+        return [(int(tick * 1000 / ticks_per_second), packet) for tick, packet, tempo in events if packet]
+
+    tempo = 500_000  # microseconds per quarter note; 120 BPM
+    last_tick = 0
+    ms = 0.0
+    result = []
+    for tick, packet, new_tempo in events:
+        ms += (tick - last_tick) * tempo / division / 1000
+        last_tick = tick
+        if packet is None:
+            tempo = new_tempo
+        else:
+            result.append((int(ms), packet))
+    return result
+
+def write_smf(path, events, division=480):
+    """Write [(time_ms, USB-MIDI packet)] as a format 0 file, at 120 BPM; channel messages only.
+    For tests, and for turning a packet log into something other programs can open."""
+    track = bytearray()
+    ticks_per_ms = division * 2 / 1000
+    last = 0
+    for ms, packet in sorted(events, key=lambda e: e[0]):
+        if packet[1] >= 0xF0:
+            # Realtime and other system messages don't go in a file.
+            continue
+        tick = round(ms * ticks_per_ms)
+        delta = tick - last
+        last = tick
+        var = bytearray((delta & 0x7F,))
+        delta >>= 7
+        while delta:
+            var.insert(0, 0x80 | (delta & 0x7F))
+            delta >>= 7
+        track += var
+        size = 2 if packet[1] & 0xF0 in (0xC0, 0xD0) else 3
+        track += packet[1:1+size]
+    track += b"\x00\xff\x2f\x00"
+    with open(path, "wb") as f:
+        f.write(b"MThd" + struct.pack(">IHHH", 6, 0, 1, division))
+        f.write(b"MTrk" + struct.pack(">I", len(track)) + track)
+
+
+# ------------------------------------------------------------------------------
+# Raw packet logs: one USB-MIDI packet per line, as milliseconds and 8 hex digits,
+#   12345 09903c40
+# Blank lines and anything after a # are ignored.
+
+def read_packet_log(path):
+    events = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if not line:
+                continue
+            ms, packet = line.split()
+            events.append((int(ms), bytes.fromhex(packet)))
+    events.sort(key=lambda e: e[0])
+    return events
+
+def write_packet_log(path, events):
+    with open(path, "w") as f:
+        for ms, packet in events:
+            f.write(f"{ms} {bytes(packet).hex()}\n")
+
+
+def read_recording(path):
+    if path.lower().endswith((".mid", ".midi", ".smf")):
+        return read_smf(path)
+    return read_packet_log(path)
+
+
+# ------------------------------------------------------------------------------
+
+class _NoView:
+    """The tracker's view, with no display behind it."""
+    def show_totals(self, practice_seconds, play_seconds):
+        pass
+    def show_mode(self, practice_not_play):
+        pass
+    def show_status(self, text, duration=None, priority=0):
+        pass
+
+
+def replay_tracker(events, end_ms, dev_mode=False, speed=None, verbose=False):
+    """The fast path: events [(time_ms, packet)] straight into a PracticeTracker, until end_ms
+    of sim time. Return a results dict, like run.simulate()'s."""
+    import midibit_defines as DEF
+
+    sim.install(end_ms, mode=DEF.MAGIC_NUMBER_DEV_MODE if dev_mode else DEF.MAGIC_NUMBER_RUN_MODE,
+                speed=speed, patch_time=False)
+    import checkpoint
+    import midi_reader
+    import practice_tracker
+    import session_clock
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(None if verbose else io.StringIO()):
+            if dev_mode:
+                import nvm_store
+                store = nvm_store.NVMStore(world.nvm)
+            else:
+                import practice_journal
+                store = practice_journal.PracticeJournal()
+            clock = session_clock.Clock()
+            tracker = practice_tracker.PracticeTracker(clock, store, _NoView(),
+                DEV_SESSION_TIMEOUT_MS if dev_mode else SESSION_TIMEOUT_MS, DISPLAY_IDLE_TIMEOUT_MS,
+                checkpoints=checkpoint.CheckpointScheduler(clock,
+                    CHECKPOINT_INTERVAL_MS, CHECKPOINT_DELTA_MS, CHECKPOINT_MIN_GAP_MS),
+                dev_mode=dev_mode)
+            # Just for decode(): the same filtering as on the device.
+            reader = midi_reader.FastMidiReader(None, 0)
+            notes = 0
+            i = 0
+            try:
+                while True:
+                    now_ms = world.clock.ms
+                    now = clock.now()
+                    # Everything that's come in by now, a transfer's worth at a time.
+                    while i < len(events) and events[i][0] <= now_ms:
+                        buf = bytearray()
+                        while i < len(events) and events[i][0] <= now_ms and len(buf) < midi_reader.PACKET_BUFFER_SIZE:
+                            buf += events[i][1]
+                            i += 1
+                        n = reader.decode(buf, len(buf))
+                        for k in range(n):
+                            tracker.on_note(now, reader.notes[k], reader.velocities[k])
+                        notes += n
+                    tracker.tick(now)
+                    tracker.persist(now)
+
+                    # In a session, tick along; otherwise nothing happens till the next note.
+                    next_ms = events[i][0] if i < len(events) else end_ms
+                    if tracker.in_session or tracker.save_requested:
+                        next_ms = min(next_ms, now_ms + TICK_MS)
+                    world.clock.advance_ms(max(1, next_ms - now_ms))
+            except world.SimulationOver:
+                pass
+        wall = time.perf_counter() - start
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            practice_ms, play_ms = run.load_totals(dev_mode)
+        os.chdir(cwd)
+
+    wall = max(wall, 1e-6)
+    return {
+        "entry": TRACKER_ENTRY,
+        "sim_seconds": world.clock.ms / 1000,
+        "wall_seconds": round(wall, 3),
+        "speedup": round(world.clock.ms / 1000 / wall, 1),
+        "notes_sent": notes,
+        "events_sent": i,
+        "events_per_wall_second": round(i / wall),
+        "practice_saved_s": practice_ms // 1000,
+        "play_saved_s": play_ms // 1000,
+        "sessions": [(world.ticks_to_ms(start), length, practice) for start, length, practice in tracker.sessions],
+    }
+
+
+def replay(paths, gap_ms=60_000, tail_ms=120_000, entry=TRACKER_ENTRY, dev_mode=False, speed=None, verbose=False):
+    """Play the recordings one after another, gap_ms apart, and keep going tail_ms after the
+    last event (so the last session times out and gets saved). entry is TRACKER_ENTRY for the
+    fast path, or an entry point to run the whole of. Return the results dict."""
+    events = []
+    t = START_MS
+    for path in paths:
+        recording = read_recording(path)
+        if not recording:
+            continue
+        first = recording[0][0]
+        for ms, packet in recording:
+            events.append((t + ms - first, packet))
+        t = events[-1][0] + gap_ms
+    end_ms = (events[-1][0] if events else START_MS) + tail_ms
+
+    if entry == TRACKER_ENTRY:
+        results = replay_tracker(events, end_ms, dev_mode, speed, verbose)
+        results["recordings"] = len(paths)
+        return results
+
+    def setup():
+        keyboard = world.SimDevice(0x0582, 0x0127, "Replay", events)
+        world.bus.plug(keyboard, PLUG_MS)
+        return [keyboard]
+
+    results = run.simulate(entry, end_ms, setup, dev_mode, verbose, speed)
+    results["recordings"] = len(paths)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="+", help=".mid files or packet logs")
+    parser.add_argument("--gap", type=float, default=60, help="seconds between one recording and the next")
+    parser.add_argument("--tail", type=float, default=120, help="seconds to keep going after the last event")
+    parser.add_argument("--speed", type=float, default=None, help="times real time (default: as fast as possible)")
+    parser.add_argument("--entry", default=TRACKER_ENTRY,
+                        help="'tracker' for just the tracker (fast), or an entry point to run all of: midibit_2, prac_mon_feather")
+    parser.add_argument("--dev", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    results = replay(args.files, int(args.gap * 1000), int(args.tail * 1000), args.entry, args.dev,
+                     args.speed, args.verbose)
+    run.report(results)
+
+
+# ------------------------------------------------------------------------------
+
+def test(directory="."):
+    """Round-trip a note script through both file formats; they must come back the same
+    (to the millisecond, give or take the SMF's tick rounding). Then replay it both ways,
+    the fast path and the whole of midibit_2: the same totals and sessions."""
+    import os
+    from sim import script
+
+    notes = script.NoteScript(seed=3)
+    notes.play(0, 60_000)
+    notes.sequence(70_000, script.COMMAND_RESET)
+    events = notes.packets()
+
+    log_path = os.path.join(directory, "test_replay.log")
+    smf_path = os.path.join(directory, "test_replay.mid")
+    try:
+        write_packet_log(log_path, events)
+        assert read_packet_log(log_path) == events
+
+        write_smf(smf_path, events)
+        back = read_smf(smf_path)
+        assert len(back) == len(events), (len(back), len(events))
+        for (ms, packet), (ms2, packet2) in zip(events, back):
+            assert abs(ms - ms2) <= 1 and packet2[1:] == packet[1:], ((ms, packet), (ms2, packet2))
+        print("replay file formats OK")
+
+        fast = replay([log_path], tail_ms=30_000)
+        full = replay([log_path], tail_ms=30_000, entry="midibit_2")
+        for key in ("practice_saved_s", "play_saved_s"):
+            assert fast[key] == full[key], (key, fast[key], full[key])
+        assert len(fast["sessions"]) == len(full["sessions"]), (fast["sessions"], full["sessions"])
+        print(f"replay: tracker {fast['speedup']}x, midibit_2 {full['speedup']}x real time; same totals")
+    finally:
+        for path in (log_path, smf_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
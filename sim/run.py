@@ -0,0 +1,201 @@
+'''
+Run one of the entry points, unmodified, on simulated hardware, and say how it went.
+
+    python -m sim.run [--entry midibit_2] [--hours 4] [--keyboards 1] [--dev] [--seed 1] [--verbose] [--json]
+
+The scenario: a keyboard (and a hub that isn't MIDI) on the USB bus; a practice
+session every hour, with active sensing in between; the keyboard gets unplugged and
+plugged back in during the first session, and has a USB hiccup (reads failing for a
+moment) later on in it; the second session starts with the practice/play toggle command.
+
+With --keyboards N, N-1 more keyboards (synths running a MIDI clock the whole time) join
+in, playing through the second half of each session at the same time as the first one.
+
+Runs in a temporary directory (with a copy of fonts/), so the journal files don't land in the repo.
+'''
+
+import argparse
+import contextlib
+import importlib
+import importlib.util
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path:
+    sys.path.insert(0, REPO)
+
+import sim
+from sim import script, world
+
+
+HOUR_MS = 3600 * 1000
+
+# What each entry point finds on I2C: prac_mon_feather has the 128x64 OLED; midibit_2
+# finds nothing there, so it gets the TFT.
+I2C_ADDRESSES = {"prac_mon_feather": (0x3D,)}
+SESSION_MS = 20 * 60 * 1000
+
+
+def build_scenario(hours, seed=1, keyboards=1):
+    """Put the devices on the bus; return the keyboards, the first one's notes, and what we
+    expect the sessions to add up to."""
+    notes = script.NoteScript(seed)
+    sessions = []
+    end = hours * HOUR_MS
+    for hour in range(hours):
+        start = hour * HOUR_MS + 2 * 60 * 1000
+        if hour == 1:
+            start = notes.sequence(start, script.COMMAND_TOGGLE_PRAC_PLAY) + 500
+        last = notes.play(start, SESSION_MS)
+        sessions.append((start, last))
+    notes.active_sensing(3000, end)
+
+    keyboard = world.SimDevice(0x0582, 0x0127, "Digital Piano", notes.packets(), manufacturer="Roland")
+    hub = world.SimDevice(0x1A40, 0x0101, "USB 2.0 Hub")
+    world.bus.plug(hub, 0)
+    world.bus.plug(keyboard, 3000)
+    if hours > 0:
+        world.bus.unplug(keyboard, 12 * 60 * 1000)
+        world.bus.plug(keyboard, 12 * 60 * 1000 + 5000)
+        keyboard.glitch(16 * 60 * 1000, 30)
+
+    extra = []
+    for i in range(1, keyboards):
+        more = script.NoteScript(seed + i)
+        for start, last in sessions:
+            more.play(start + SESSION_MS // 2, SESSION_MS // 2, notes_per_second=12)
+        more.clock(5000, end)
+        # All the same model: they're told apart by where they're plugged in.
+        synth = world.SimDevice(0x0499, 0x1600, "Synth", more.packets(), manufacturer="Yamaha")
+        world.bus.plug(synth, 3000 + i * 1000)
+        extra.append(synth)
+    return [keyboard] + extra, notes, sessions
+
+
+def load_totals(dev_mode):
+    """What's been saved, read back the way the next boot would."""
+    if dev_mode:
+        import nvm_store
+        return nvm_store.NVMStore(world.nvm).load()
+    import practice_journal
+    return practice_journal.PracticeJournal().load()
+
+
+def simulate(entry, end_ms, setup, dev_mode=False, verbose=False, speed=None):
+    """Run the entry point until end_ms of sim time. setup() gets called once the new world
+    exists, to put devices on the bus, and returns the MIDI device(s) to count notes from.
+    Return a dict of results; 'sessions' is the session log, if the entry point has one,
+    as (start_ms, length_ms, practice) in sim time."""
+    import midibit_defines as DEF
+
+    sim.install(end_ms, mode=DEF.MAGIC_NUMBER_DEV_MODE if dev_mode else DEF.MAGIC_NUMBER_RUN_MODE, speed=speed)
+    world.i2c_addresses.extend(I2C_ADDRESSES.get(entry, ()))
+    keyboards = setup()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        # What the code reads off CIRCUITPY.
+        shutil.copytree(os.path.join(REPO, "fonts"), "fonts")
+        output = io.StringIO()
+        # Import it by hand, so we still have the module when SimulationOver comes out of it.
+        spec = importlib.util.find_spec(entry)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[entry] = module
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(sys.stdout if verbose else output):
+                spec.loader.exec_module(module)
+        except world.SimulationOver:
+            pass
+        wall = time.perf_counter() - start
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            practice_ms, play_ms = load_totals(dev_mode)
+        os.chdir(cwd)
+
+    packets = sum(k.bytes_read for k in keyboards) // 4
+    results = {
+        "entry": entry,
+        "sim_seconds": world.clock.ms / 1000,
+        "wall_seconds": round(wall, 3),
+        "speedup": round(world.clock.ms / 1000 / wall, 1),
+        "notes_sent": sum(k.notes_sent for k in keyboards),
+        "events_sent": packets,
+        "events_per_wall_second": round(packets / wall),
+        "usb_reads": sum(k.reads for k in keyboards),
+        "usb_reads_per_s": round(sum(k.reads for k in keyboards) / max(1, world.clock.ms / 1000), 1),
+        "display_refreshes": sum(d.refreshes for d in world.displays),
+        "display_bytes": sum(d.bus.bytes_sent for d in world.displays),
+        "label_updates": sum(l.updates for l in world.labels),
+        # Idle: how long the panel slept, and what was sent to it meanwhile.
+        "display_asleep_s": sum(d.bus.total_asleep_ms() for d in world.displays) // 1000,
+        "asleep_bytes_per_min": round(sum(d.bus.bytes_sent_asleep for d in world.displays)
+            / max(1, sum(d.bus.total_asleep_ms() for d in world.displays) / 60_000), 1),
+        "pixel_fills": sum(p.fills for p in world.pixels),
+        "practice_saved_s": practice_ms // 1000,
+        "play_saved_s": play_ms // 1000,
+    }
+
+    tracker = getattr(module, "tracker_", None)
+    if tracker is not None:
+        results["sessions"] = [(world.ticks_to_ms(start), length, practice) for start, length, practice in tracker.sessions]
+    inputs = getattr(module, "midi_inputs_", None)
+    if inputs is not None:
+        results["inputs"] = [(name, notes, played // 1000)
+                             for name, notes, played in zip(inputs.names, inputs.notes, inputs.played_ms) if name is not None]
+    return results
+
+
+def run(entry="midibit_2", hours=4, dev_mode=False, seed=1, verbose=False, keyboards=1):
+    """Simulate 'hours' hours of the given entry point; return a dict of results."""
+    played = []
+    def setup():
+        devices, notes, sessions = build_scenario(hours, seed, keyboards)
+        played.extend(sessions)
+        return devices
+    results = simulate(entry, hours * HOUR_MS, setup, dev_mode, verbose)
+    results["played_s"] = sum(last - first for first, last in played) // 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entry", default="midibit_2", help="module to run: midibit_2 or prac_mon_feather")
+    parser.add_argument("--hours", type=int, default=4, help="how much sim time to run")
+    parser.add_argument("--keyboards", type=int, default=1, help="how many MIDI keyboards on the bus")
+    parser.add_argument("--dev", action="store_true", help="start in dev mode")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="show what the code prints")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.entry, args.hours, args.dev, args.seed, args.verbose, args.keyboards)
+    if args.json:
+        import json
+        print(json.dumps(results))
+    else:
+        report(results)
+
+
+def report(results):
+    for name, value in results.items():
+        if name == "sessions":
+            print(f"{'sessions':24} {len(value)}")
+            for start, length, practice in value:
+                print(f"    at {start / 1000:10.1f} s: {length / 1000:8.1f} s {'practice' if practice else 'play'}")
+        elif name == "inputs":
+            print(f"{'inputs':24} {len(value)}")
+            for input_name, notes, played in value:
+                print(f"    {input_name:20} {notes:8} notes {played:8} s played")
+        else:
+            print(f"{name:24} {value}")
+
+
+if __name__ == "__main__":
+    main()
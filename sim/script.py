@@ -0,0 +1,78 @@
+'''
+Building what the simulated keyboard plays: a list of (time_ms, USB-MIDI packet)
+events, for a sim.world.SimDevice. Times are milliseconds of sim time since boot.
+'''
+
+import random
+
+
+# Keyboard "attention" sequence, and the commands, as in midibit_2.py.
+COMMAND_PREFIX = (67, 67, 67, 63, 65, 65, 65, 62)
+COMMAND_RESET = COMMAND_PREFIX + (60,)
+COMMAND_TOGGLE_BOOT = COMMAND_PREFIX + (62,)
+COMMAND_TOGGLE_PRAC_PLAY = COMMAND_PREFIX + (65,)
+
+
+def note_on(note, velocity=64, channel=0):
+    return bytes((0x09, 0x90 | channel, note, velocity))
+
+def note_off(note, channel=0):
+    return bytes((0x08, 0x80 | channel, note, 0))
+
+def control_change(control, value, channel=0):
+    return bytes((0x0B, 0xB0 | channel, control, value))
+
+def single_byte(b):
+    return bytes((0x0F, b, 0, 0))
+
+
+class NoteScript:
+
+    def __init__(self, seed=1):
+        self.events = []
+        self._random = random.Random(seed)
+        self.notes = 0
+
+    def note(self, at_ms, note, length_ms=100, velocity=64):
+        self.events.append((at_ms, note_on(note, velocity)))
+        self.events.append((at_ms + length_ms, note_off(note)))
+        self.notes += 1
+
+    def sequence(self, at_ms, notes, gap_ms=200):
+        """Play these notes one after another. Return when the last one starts."""
+        for n in notes:
+            self.note(at_ms, n, length_ms=gap_ms // 2)
+            at_ms += gap_ms
+        return at_ms - gap_ms
+
+    def play(self, at_ms, duration_ms, notes_per_second=8, pedal=True):
+        """Random notes (and some sustain pedal), like somebody practicing.
+        Return when the last one starts."""
+        gap = 1000 / notes_per_second
+        t = at_ms
+        end = at_ms + duration_ms
+        last = at_ms
+        while t < end:
+            note = self._random.randrange(36, 96)
+            self.note(int(t), note, length_ms=int(gap * 2), velocity=self._random.randrange(20, 127))
+            last = int(t)
+            if pedal and self._random.random() < 0.05:
+                self.events.append((int(t), control_change(64, self._random.choice((0, 127)))))
+            t += self._random.expovariate(1 / gap)
+        return last
+
+    def active_sensing(self, from_ms, to_ms, interval_ms=300):
+        """What a lot of keyboards send all the time they're on."""
+        for t in range(from_ms, to_ms, interval_ms):
+            self.events.append((t, single_byte(0xFE)))
+
+    def clock(self, from_ms, to_ms, bpm=120):
+        """MIDI timing clock, 24 per beat."""
+        interval = 60_000 / bpm / 24
+        t = from_ms
+        while t < to_ms:
+            self.events.append((int(t), single_byte(0xF8)))
+            t += interval
+
+    def packets(self):
+        return sorted(self.events, key=lambda e: e[0])
@@ -0,0 +1,267 @@
+'''
+The simulated world the stand-in modules in sim/fakes all share: the virtual clock,
+the USB bus and what's plugged into it, the NVM, and the displays and NeoPixels
+that got created, so the runner can look at them afterwards.
+'''
+
+import math
+import time
+
+# The real ones; sim.install() points the time module's at the virtual clock.
+_wall_clock = time.perf_counter
+_wall_sleep = time.sleep
+
+
+# Like supervisor.ticks_ms() on a real board, the tick counter starts out close to
+# wrapping around, so anything that gets the wrap wrong shows up early.
+TICKS_PERIOD = 1 << 29
+BOOT_TICKS = TICKS_PERIOD - 65_000
+
+NVM_SIZE = 4096
+
+# A USB full-speed bulk transfer.
+MAX_TRANSFER = 64
+
+
+class SimulationOver(Exception):
+    """Raised (once) when the virtual clock gets to the end of the run."""
+
+
+class VirtualClock:
+    """Simulated time, in integer nanoseconds since boot. Only moves when somebody
+    waits: a sleep, a USB read timing out, the event loop with nothing to do."""
+
+    def __init__(self, end_ms=None, boot_ticks=BOOT_TICKS, speed=None):
+        """If speed is given, don't let sim time run more than that many times faster than real time."""
+        self.ns = 0
+        self.end_ns = None if end_ms is None else end_ms * 1_000_000
+        self.boot_ticks = boot_ticks
+        self.over = False
+        self.speed = speed
+        self._wall_start = _wall_clock()
+
+    @property
+    def ms(self):
+        return self.ns // 1_000_000
+
+    def ticks_ms(self):
+        return (self.boot_ticks + self.ms) % TICKS_PERIOD
+
+    def monotonic(self):
+        return self.ns / 1_000_000_000
+
+    def advance_ns(self, ns):
+        """Move time along; raise SimulationOver the first time we go past the end."""
+        self.ns += max(0, int(ns))
+        if self.speed:
+            ahead = self.ns / 1e9 / self.speed - (_wall_clock() - self._wall_start)
+            if ahead > 0:
+                _wall_sleep(ahead)
+        if self.end_ns is not None and self.ns >= self.end_ns and not self.over:
+            self.over = True
+            raise SimulationOver(f"{self.ms} ms")
+
+    def advance_ms(self, ms):
+        self.advance_ns(ms * 1_000_000)
+
+    def sleep(self, seconds):
+        self.advance_ns(math.ceil(seconds * 1_000_000_000))
+
+    def until_end_ns(self):
+        if self.end_ns is None:
+            return None
+        return max(0, self.end_ns - self.ns)
+
+
+class SimDevice:
+    """A USB device on the simulated bus. If 'packets' is given it's a MIDI device, and
+    read() hands out those (time_ms, 4-byte USB-MIDI packet) events as their time comes;
+    the times are sim time since boot. Reads wait (in virtual time) like the real thing."""
+
+    def __init__(self, vendor, product_id, product, packets=None, manufacturer="Sim"):
+        self.idVendor = vendor
+        self.idProduct = product_id
+        self.product = product
+        self.manufacturer = manufacturer
+        self.serial_number = None
+        # Where it's plugged in: the USBBus gives it a hub port.
+        self.bus = 1
+        self.port_numbers = None
+        self.is_midi = packets is not None
+        self._packets = sorted(packets or (), key=lambda p: p[0])
+        self._next = 0
+        self.attached = False
+        self._glitches = []
+
+        self.reads = 0
+        self.bytes_read = 0
+        self.notes_sent = 0
+        self.descriptor_requests = 0
+
+    def glitch(self, at_ms, length_ms=20):
+        """Make reads fail for a while, without going anywhere - a transient USB error."""
+        self._glitches.append((at_ms, at_ms + length_ms))
+
+    def _glitching(self):
+        for start, end in self._glitches:
+            if start * 1_000_000 <= clock.ns < end * 1_000_000:
+                return True
+        return False
+
+    # The parts of usb.core.Device that adafruit_usb_host_midi and midi_reader use.
+
+    def set_configuration(self, configuration=None):
+        pass
+
+    def is_kernel_driver_active(self, interface):
+        return False
+
+    def detach_kernel_driver(self, interface):
+        pass
+
+    def read(self, endpoint, buf, timeout=None):
+        import usb.core
+
+        bus.update()
+        if not self.attached:
+            raise usb.core.USBError("No such device")
+        if self._glitching():
+            clock.advance_ms(1)
+            raise usb.core.USBError("Input/output error")
+        self.reads += 1
+
+        # Wait for the next packet, or the timeout.
+        due_ns = self._next_due_ns()
+        if due_ns is None or due_ns > clock.ns:
+            wait = clock.until_end_ns() if due_ns is None else due_ns - clock.ns
+            if timeout:
+                wait = min(wait, timeout * 1_000_000) if wait is not None else timeout * 1_000_000
+            clock.advance_ns(wait)
+            bus.update()
+            if not self.attached:
+                raise usb.core.USBError("No such device")
+            due_ns = self._next_due_ns()
+            if due_ns is None or due_ns > clock.ns:
+                raise usb.core.USBTimeoutError("timeout")
+
+        n = 0
+        packets = self._packets
+        while n + 4 <= min(len(buf), MAX_TRANSFER) and self._next < len(packets) \
+                and packets[self._next][0] * 1_000_000 <= clock.ns:
+            packet = packets[self._next][1]
+            buf[n:n+4] = packet
+            if packet[0] & 0x0F == 0x9 and packet[3] > 0:
+                self.notes_sent += 1
+            n += 4
+            self._next += 1
+        self.bytes_read += n
+        return n
+
+    def write(self, endpoint, data, timeout=None):
+        return len(data)
+
+    def ctrl_transfer(self, request_type, request, value, index, data=None, timeout=None):
+        """Just GET_DESCRIPTOR, for the configuration descriptor."""
+        import usb.core
+
+        bus.update()
+        if not self.attached:
+            raise usb.core.USBError("No such device")
+        if request != 6 or value >> 8 != 2:
+            raise usb.core.USBError("Pipe error")
+        self.descriptor_requests += 1
+        # A little time on the bus.
+        clock.advance_ms(1)
+        descriptor = self.configuration_descriptor()
+        n = min(len(data), len(descriptor))
+        data[0:n] = descriptor[0:n]
+        return n
+
+    def configuration_descriptor(self):
+        """A MIDI device: Audio Control interface 0, then MIDI Streaming interface 1 with
+        bulk endpoints 0x01 and 0x81. Anything else: a hub."""
+        if self.is_midi:
+            body = (bytes((9, 4, 0, 0, 0, 1, 1, 0, 0))
+                    + bytes((9, 4, 1, 0, 2, 1, 3, 0, 0))
+                    + bytes((9, 5, 0x01, 2, 64, 0, 0, 0, 0))
+                    + bytes((9, 5, 0x81, 2, 64, 0, 0, 0, 0)))
+            interfaces = 2
+        else:
+            body = bytes((9, 4, 0, 0, 1, 9, 0, 0, 0)) + bytes((7, 5, 0x81, 3, 1, 0, 12))
+            interfaces = 1
+        total = 9 + len(body)
+        return bytes((9, 2, total & 0xFF, total >> 8, interfaces, 1, 0, 0x80, 50)) + body
+
+    def _next_due_ns(self):
+        if self._next >= len(self._packets):
+            return None
+        return self._packets[self._next][0] * 1_000_000
+
+    def skip_to_now(self):
+        """Drop whatever got sent while we were unplugged."""
+        while self._next < len(self._packets) and self._packets[self._next][0] * 1_000_000 <= clock.ns:
+            self._next += 1
+
+
+class USBBus:
+    """What's plugged in, and when things get plugged in and out."""
+
+    def __init__(self):
+        self.devices = []
+        self._schedule = []
+
+    def plug(self, device, at_ms=0):
+        self._schedule.append((at_ms, device, True))
+        self._schedule.sort(key=lambda e: e[0])
+
+    def unplug(self, device, at_ms):
+        self._schedule.append((at_ms, device, False))
+        self._schedule.sort(key=lambda e: e[0])
+
+    def update(self):
+        """Apply any plug/unplug events that are due."""
+        while self._schedule and self._schedule[0][0] * 1_000_000 <= clock.ns:
+            at, device, attach = self._schedule.pop(0)
+            if attach and device not in self.devices:
+                # The lowest free port on the hub.
+                taken = [d.port_numbers for d in self.devices]
+                port = 1
+                while (port,) in taken:
+                    port += 1
+                device.port_numbers = (port,)
+                device.attached = True
+                device.skip_to_now()
+                self.devices.append(device)
+            elif not attach and device in self.devices:
+                device.attached = False
+                self.devices.remove(device)
+
+    def find(self):
+        self.update()
+        return list(self.devices)
+
+
+# The one world. reset() starts a new one.
+
+clock = VirtualClock()
+bus = USBBus()
+nvm = bytearray(b"\xff" * NVM_SIZE)
+displays = []
+pixels = []
+labels = []
+# What answers on the I2C bus: the OLEDs' addresses, if there's one plugged in.
+i2c_addresses = []
+
+def ticks_to_ms(ticks):
+    """A ticks_ms() value as sim time since boot (right for the first 6 days or so)."""
+    return (ticks - clock.boot_ticks) % TICKS_PERIOD
+
+def reset(end_ms=None, boot_ticks=BOOT_TICKS, speed=None):
+    global clock, bus, nvm
+    clock = VirtualClock(end_ms, boot_ticks, speed)
+    bus = USBBus()
+    nvm = bytearray(b"\xff" * NVM_SIZE)
+    displays.clear()
+    pixels.clear()
+    labels.clear()
+    i2c_addresses.clear()
@@ -0,0 +1,75 @@
+'''
+A status line that can show timed messages without anybody having to sleep.
+
+Each message has a priority and (optionally) a duration. The highest-priority
+message that hasn't expired is the one shown; when it expires, or is cleared,
+whatever was underneath it comes back. So the spinner (low priority, no duration)
+can't stomp on "DATA SAVED" (higher priority, 2 seconds), and "DATA SAVED" goes
+away by itself on the next tick() after its time is up.
+
+The display classes own one of these, and call tick() from the main loop's normal
+display update.
+'''
+
+from adafruit_ticks import ticks_add, ticks_diff, ticks_ms
+
+
+# Priorities, lowest first.
+PRIORITY_BACKGROUND = 0  # spinner, "Looking for MIDI" - stays until replaced
+PRIORITY_INFO = 1        # "Found ...", "Dev: True"
+PRIORITY_SAVE = 2        # save confirmations
+PRIORITY_ERROR = 3       # save failures
+PRIORITY_LEVELS = 4
+
+
+class StatusChannel:
+
+    def __init__(self, show):
+        """show is the function that actually puts text on the screen."""
+        self._show = show
+
+        # One slot per priority, so setting a message doesn't allocate anything.
+        self._texts = [""] * PRIORITY_LEVELS
+        self._deadlines = [None] * PRIORITY_LEVELS
+
+        self._shown = None
+
+    def set(self, text, duration=None, priority=PRIORITY_BACKGROUND):
+        """Show text at the given priority, replacing whatever else was at that priority.
+        If duration (in seconds) is given, the message goes away after that long."""
+        self._texts[priority] = text
+        if duration is None:
+            self._deadlines[priority] = None
+        else:
+            self._deadlines[priority] = ticks_add(ticks_ms(), int(duration * 1000))
+        self._update()
+
+    def clear(self):
+        """Forget all messages."""
+        for i in range(PRIORITY_LEVELS):
+            self._texts[i] = ""
+            self._deadlines[i] = None
+        self._update()
+
+    def tick(self):
+        """Drop any expired messages, and show whatever should be shown now."""
+        now = ticks_ms()
+        for i in range(PRIORITY_LEVELS):
+            deadline = self._deadlines[i]
+            if deadline is not None and ticks_diff(now, deadline) >= 0:
+                self._texts[i] = ""
+                self._deadlines[i] = None
+        self._update()
+
+    def current(self):
+        """The text that should be showing."""
+        for i in range(PRIORITY_LEVELS - 1, -1, -1):
+            if self._texts[i]:
+                return self._texts[i]
+        return ""
+
+    def _update(self):
+        text = self.current()
+        if text != self._shown:
+            self._shown = text
+            self._show(text)
@@ -20,13 +20,16 @@ import time
 import board
 import displayio
 
-import adafruit_imageload
-from adafruit_bitmap_font import bitmap_font
 from adafruit_display_text import label
 from adafruit_st7735r import ST7735R
 from fourwire import FourWire
 import terminalio
 
+import background
+import display_base
+from display_base import DisplayBase
+from hms_format import HMSCounter
+
 
 TEXT_COLOR_ACTIVE   = 0x00_00_00
 TEXT_COLOR_INACTIVE = 0x80_80_80
@@ -37,11 +40,26 @@ BLACK = 0x000000
 HEIGHT = 128
 WIDTH  = 128
 
-class TFT144Display():
+# ST7735 commands, for sleeping.
+DISPOFF = 0x28
+DISPON  = 0x29
+SLPIN   = 0x10
+SLPOUT  = 0x11
+
+
+class TFT144Display(DisplayBase):
     """Display based on Adafruit 1.44" TFT"""
 
-    def __init__(self, pin_cs, pin_dc, pin_reset):
-        """Construct a display object; indicate the 3 pins - in addition to SCK, MI, and MO - that are used."""
+    caps = display_base.CAP_TWO_TOTALS | display_base.CAP_MODE | display_base.CAP_COLOR
+
+    # The ST7735 wants 120 ms after SLPOUT before anything else.
+    WAKE_MS = 120
+
+    def __init__(self, pin_cs, pin_dc, pin_reset, defer_assets=False, background_strategy=None):
+        """Construct a display object; indicate the 3 pins - in addition to SCK, MI, and MO - that are used.
+        defer_assets True means start with a plain background and the built-in font, which is
+        quick, and leave the background and the big font for load_assets().
+        background_strategy is one of background.py's; None to pick one by the free RAM."""
         # Important!
         displayio.release_displays()
 
@@ -54,81 +72,47 @@ class TFT144Display():
         # 90 gets us top == side with EYESPI connector.
         display.rotation = 90
 
+        self._bus = display_bus
+        super().__init__(display)
 
-##################################### Using OnDiskBitmap
-
-        # bitmap = displayio.OnDiskBitmap("bmps/stones.bmp")
-
-        # # Create a TileGrid to hold the bitmap
-        # splash = displayio.TileGrid(bitmap, pixel_shader=bitmap.pixel_shader)
-
-        # # Create a Group to hold the TileGrid
-        # bg_group = displayio.Group()
-
-        # # Add the TileGrid to the Group
-        # bg_group.append(splash)
-
-        # # Add the Group to the Display
-        # display.root_group = bg_group
-
-
-##################################### Using ImageLoad
-
-
-        bitmap, palette = adafruit_imageload.load("background.bmp",
-                                                bitmap=displayio.Bitmap,
-                                                palette=displayio.Palette)
-
-        # Create a TileGrid to hold the bitmap
-        tile_grid = displayio.TileGrid(bitmap, pixel_shader=palette)
-
-        # Create a Group to hold the TileGrid
         group = displayio.Group()
-
-        # Add the TileGrid to the Group
-        group.append(tile_grid)
-
-        # Add the Group to the Display
         display.root_group = group
-
-
-##################################### Old start code - solid color
-
-        # # Make the display context
-        # splash = displayio.Group()
-        # display.root_group = splash
-
-        # color_bitmap = displayio.Bitmap(WIDTH, HEIGHT, 1)
-        # color_palette = displayio.Palette(1)
-        # color_palette[0] = BACKGROUND_COLOR
-
-        # bg_sprite = displayio.TileGrid(color_bitmap, pixel_shader=color_palette, x=0, y=0)
-        # splash.append(bg_sprite)
-
+        self._group = group
+
+        # The background (see background.py) and the big font - or for a fast boot,
+        # a solid color and the built-in font at double size, about the same size, for now.
+        self._background_strategy = background_strategy
+        self.background = None
+        if defer_assets:
+            group.append(background.make(background.SOLID, WIDTH, HEIGHT, BACKGROUND_COLOR))
+            big_font, big_scale = terminalio.FONT, 2
+        else:
+            group.append(self._make_background())
+            big_font, big_scale = self._load_big_font(), 1
+        self._assets_loaded = not defer_assets
 
         little_font = terminalio.FONT
-        big_font = bitmap_font.load_font("fonts/cmuntb22.bdf")
 
         y_height = 20
 
         tx = 2
         ty = 10
-        lab = label.Label(big_font, text="Practice", scale=1, color=BLACK, x=tx, y=ty)
+        lab = label.Label(big_font, text="Practice", scale=big_scale, color=BLACK, x=tx, y=ty)
         group.append(lab)
         self._label_1 = lab
 
         ty += y_height
-        text_area = label.Label(big_font, text="0:00:00", scale=1, color=BLACK, x=tx+5, y=ty)
+        text_area = label.Label(big_font, text="0:00:00", scale=big_scale, color=BLACK, x=tx+5, y=ty)
         group.append(text_area)
         self._text_area_1 = text_area
 
         ty += y_height + 5
-        lab = label.Label(big_font, text="Play", scale=1, color=BLACK, x=tx, y=ty)
+        lab = label.Label(big_font, text="Play", scale=big_scale, color=BLACK, x=tx, y=ty)
         group.append(lab)
         self._label_2 = lab
 
         ty += y_height
-        text_area = label.Label(big_font, text="0:00:00", scale=1, color=BLACK, x=tx+5, y=ty)
+        text_area = label.Label(big_font, text="0:00:00", scale=big_scale, color=BLACK, x=tx+5, y=ty)
         group.append(text_area)
         self._text_area_2 = text_area
 
@@ -144,22 +128,56 @@ class TFT144Display():
         group.append(text_area)
         self._text_area_4 = text_area
 
+        self._big_labels = (self._label_1, self._text_area_1, self._label_2, self._text_area_2)
+
         print(f"{__name__} OK!")
 
+    def _make_background(self):
+        # Choose now, when everything else has had its RAM.
+        strategy = self._background_strategy or background.choose()
+        self.background = strategy
+        return background.make(strategy, WIDTH, HEIGHT, BACKGROUND_COLOR)
+
+    def set_background(self, strategy):
+        """Change to another of background.py's ways (for comparing them)."""
+        # Let go of the old one first, so we don't have both at once.
+        self._group[0] = background.make(background.SOLID, WIDTH, HEIGHT, BACKGROUND_COLOR)
+        self._background_strategy = strategy
+        self._group[0] = self._make_background()
+        self._dirty = True
+
+    def _load_big_font(self):
+        # The precompiled glyph atlas, or failing that the BDF, which is slow.
+        return display_base.big_font()
+
+    def load_assets(self):
+        """If we were made with defer_assets, load the background image and the big font now,
+        and put them in place of the stand-ins. Return False if there was nothing to do."""
+        if self._assets_loaded:
+            return False
+        self._group[0] = self._make_background()
+        big_font = self._load_big_font()
+        for lab in self._big_labels:
+            lab.font = big_font
+            lab.scale = 1
+        self._assets_loaded = True
+        self._dirty = True
+        return True
+
 
     def set_text_1(self, text):
         # print(f"{__name__}: set_text_1 '{text}'")
-        self._text_area_1.text = text
+        self._set_label(self._text_area_1, text)
 
     def set_text_1_color(self, color):
-        self._text_area_1.color = color
+        self._set_color(self._text_area_1, color)
 
     def set_text_2(self, text):
         # print(f"{__name__}: set_text_2 '{text}'")
-        self._text_area_2.text = text
+        self._set_label(self._text_area_2, text)
 
     def set_text_2_color(self, color):
-        self._text_area_2.color = color
+        self._set_color(self._text_area_2, color)
 
     # def set_text_3(self, text):
     #     print(f"{__name__}: set_text_3 '{text}'")
@@ -167,7 +185,7 @@ class TFT144Display():
     
     # now set areas 3 and 4 via "status"
 
-    def set_text_status(self, text):
+    def _show_status(self, text):
         """Displays in area 3, with overflow to area 4 if needed. Max 20 chars each."""
         MAX_CHARS = 20
         t1 = text
@@ -175,16 +193,15 @@ class TFT144Display():
         if len(t1) > MAX_CHARS:
             t1 = text[0:MAX_CHARS]
             t2 = text[MAX_CHARS:MAX_CHARS*2]
-        self._text_area_3.text = t1
-        self._text_area_4.text = t2
+        self._set_label(self._text_area_3, t1)
+        self._set_label(self._text_area_4, t2)
 
     # label can only change color
     def set_label_1_color(self, color):
-        self._label_1.color = color
+        self._set_color(self._label_1, color)
 
     def set_label_2_color(self, color):
-        self._label_2.color = color
-
+        self._set_color(self._label_2, color)
 
     def set_display_practice_mode(self, practice_mode):
         """Toggle the display mode - setting active/inactive color."""
@@ -199,9 +216,17 @@ class TFT144Display():
             self.set_label_2_color(TEXT_COLOR_ACTIVE)
             self.set_text_2_color(TEXT_COLOR_ACTIVE)
 
-    def blank_screen(self):
-        # print("TFT144Display has no blank_screen - needed?")
-        pass
+    # No sleep() and wake() in the ST7735R driver; the commands, then.
+    # (The backlight's wired on, on this board, so that's as dark as it gets.)
+    def _panel_sleep(self):
+        self._bus.send(DISPOFF, b"")
+        self._bus.send(SLPIN, b"")
+
+    def _panel_wake(self):
+        self._bus.send(SLPOUT, b"")
+
+    def _panel_on(self):
+        self._bus.send(DISPON, b"")
 
 
 def test():
@@ -222,24 +247,8 @@ def test():
     # disp.set_display_practice_mode(True)
 
 
-    def increment_time(h, m, s):
-        """Return (h,m,s)"""
-        s += 1
-        if s == 60:
-            m += 1
-            s = 0
-        if m == 60:
-            h += 1
-            m = 0
-        return h, m, s
-
-    h_prac = 0
-    m_prac = 0
-    s_prac = 0
-
-    h_play = 0
-    m_play = 0
-    s_play = 0
+    prac = HMSCounter()
+    play = HMSCounter()
 
     practice = True
     while True:
@@ -247,11 +256,9 @@ def test():
         r = random.randint(15, 30)
         for i in range(r):
             if practice:
-                h_prac, m_prac, s_prac = increment_time(h_prac, m_prac, s_prac)
-                disp.set_text_1(f" {h_prac:01}:{m_prac:02}:{s_prac:02}")
+                disp.set_text_1(prac(prac.seconds + 1))
             else:
-                h_play, m_play, s_play = increment_time(h_play, m_play, s_play)
-                disp.set_text_2(f" {h_play:01}:{m_play:02}:{s_play:02}")
+                disp.set_text_2(play(play.seconds + 1))
             time.sleep(.1)
         practice = not practice
 
@@ -3,16 +3,18 @@
 import board
 import displayio
 import terminalio
-from adafruit_bitmap_font import bitmap_font
 from adafruit_display_text import label
 import adafruit_displayio_ssd1306
 
-# Our "FreeType-CMU Typewriter Text-Bold-R-Normal" bitmap
-FONT_PATH = "fonts/cmuntb22.bdf"
+import display_base
+from display_base import DisplayBase
 
 
-class two_line_oled:
-    '''Display on an Adafruit 128x64 OLED'''
+class two_line_oled(DisplayBase):
+    '''Display on an Adafruit 128x64 OLED: the practice total, and the status line under it.'''
+
+    caps = 0
+
     def __init__(self, i2c_addr, height):
 
         displayio.release_displays()
@@ -29,9 +31,10 @@ class two_line_oled:
         HEIGHT = height
         
         display = adafruit_displayio_ssd1306.SSD1306(display_bus, width=WIDTH, height=HEIGHT)
+        super().__init__(display)
 
-        # TODO: check for failure?
-        font_main = bitmap_font.load_font(FONT_PATH)
+        # Our "FreeType-CMU Typewriter Text-Bold-R-Normal", from the glyph atlas if there is one.
+        font_main = display_base.big_font()
 
         text_area_1 = label.Label(font_main, color=0xFFFFFF)
         text_area_1.x =  0
@@ -50,20 +53,17 @@ class two_line_oled:
         self.text_area_2 = text_area_2
 
     def set_text_1(self, text):
-        self.text_area_1.text = text
-        
-    def set_text_2(self, text):
-        self.text_area_2.text = text
+        self._set_label(self.text_area_1, text)
 
-    def blank_screen(self):
-        self.set_text_1("")
-        self.set_text_2("")
+    def _show_status(self, text):
+        """Line 2 is the status line."""
+        self._set_label(self.text_area_2, text)
 
 def test():
     print(f"\nTesting {__name__}....")
-    tlo = two_line_oled()
+    tlo = two_line_oled(display_base.OLED_128x64_ADDRESS, 64)
     tlo.set_text_1("00:23:34")
-    tlo.set_text_2("Test-a-roni! How wide?")
+    tlo.set_text_status("Test-a-roni! How wide?")
     print("Test done.")
     while True:
         pass